@@ -1,10 +1,15 @@
-from sqlalchemy import Select
+from msgspec import json
+from sqlalchemy import Select, insert
 from sqlalchemy import delete as sa_delete
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy_crud_plus import CRUDPlus
 
 from backend.app.admin.model import OperaLog
 from backend.app.admin.schema.opera_log import CreateOperaLogParam
+from backend.common.enums import DataBaseType, PrimaryKeyType
+from backend.core.conf import settings
+from backend.utils.snowflake import snowflake
+from backend.utils.timezone import timezone
 
 
 class CRUDOperaLogDao(CRUDPlus[OperaLog]):
@@ -42,13 +47,34 @@ class CRUDOperaLogDao(CRUDPlus[OperaLog]):
 
     async def bulk_create(self, db: AsyncSession, objs: list[CreateOperaLogParam]) -> None:
         """
-        批量创建操作日志
+        批量创建操作日志，PostgreSQL 使用 COPY 写入，MySQL 使用单条多行 INSERT
 
         :param db: 数据库会话
         :param objs: 操作日志创建参数列表
         :return:
         """
-        await self.create_models(db, objs)
+        now = timezone.now()
+        rows = [{**obj.model_dump(), 'created_time': now} for obj in objs]
+        if PrimaryKeyType.snowflake == settings.DATABASE_PK_MODE:
+            for row in rows:
+                row['id'] = snowflake.generate()
+
+        if DataBaseType.mysql == settings.DATABASE_TYPE:
+            await db.execute(insert(self.model).values(rows))
+            return
+
+        columns = list(rows[0])
+        conn = await db.connection()
+        raw_conn = await conn.get_raw_connection()
+        await raw_conn.driver_connection.copy_records_to_table(
+            self.model.__tablename__,
+            columns=columns,
+            # COPY 绕过 SQLAlchemy 类型处理，JSON 列需预先序列化
+            records=[
+                tuple(json.encode(row[c]).decode() if c == 'args' and row[c] is not None else row[c] for c in columns)
+                for row in rows
+            ],
+        )
 
     async def delete(self, db: AsyncSession, pks: list[int]) -> int:
         """
@@ -28,6 +28,7 @@ from backend.core.conf import settings
 from backend.database.db import uuid4_str
 from backend.database.redis import redis_client
 from backend.utils.dynamic_config import load_login_config
+from backend.utils.request_parse import parse_user_agent_info
 from backend.utils.timezone import timezone
 
 
@@ -114,6 +115,7 @@ class AuthService:
 
             await user_dao.update_login_time(db, obj.username)
             await db.refresh(user)
+            ua_info = parse_user_agent_info(ctx.user_agent)
             access_token_data = await create_access_token(
                 user.id,
                 multi_login=user.is_multi_login,
@@ -122,9 +124,9 @@ class AuthService:
                 nickname=user.nickname,
                 last_login_time=timezone.to_str(user.last_login_time),
                 ip=ctx.ip,
-                os=ctx.os,
-                browser=ctx.browser,
-                device=ctx.device,
+                os=ua_info.os,
+                browser=ua_info.browser,
+                device=ua_info.device,
             )
             refresh_token_data = await create_refresh_token(
                 access_token_data.session_uuid,
@@ -220,6 +222,7 @@ class AuthService:
             raise errors.AuthorizationError(msg='用户已被锁定, 请联系统管理员')
         if not user.is_multi_login and await redis_client.get_prefix(f'{settings.TOKEN_REDIS_PREFIX}:{user.id}:*'):
             raise errors.ForbiddenError(msg='此用户已在异地登录，请重新登录并及时修改密码')
+        ua_info = parse_user_agent_info(ctx.user_agent)
         new_token = await create_new_token(
             refresh_token,
             token_payload.session_uuid,
@@ -230,9 +233,9 @@ class AuthService:
             nickname=user.nickname,
             last_login_time=timezone.to_str(user.last_login_time),
             ip=ctx.ip,
-            os=ctx.os,
-            browser=ctx.browser,
-            device_type=ctx.device,
+            os=ua_info.os,
+            browser=ua_info.browser,
+            device_type=ua_info.device,
         )
         data = GetNewToken(
             access_token=new_token.new_access_token,
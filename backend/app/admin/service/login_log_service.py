@@ -9,6 +9,7 @@ from backend.common.context import ctx
 from backend.common.log import log
 from backend.common.pagination import paging_data
 from backend.database.db import async_db_session
+from backend.utils.request_parse import get_ip_info, parse_user_agent_info
 
 
 class LoginLogService:
@@ -48,18 +49,20 @@ class LoginLogService:
         :return:
         """
         try:
+            ip_info = await get_ip_info(ctx.ip)
+            ua_info = parse_user_agent_info(ctx.user_agent)
             obj = CreateLoginLogParam(
                 user_uuid=user_uuid,
                 username=username,
                 status=status,
                 ip=ctx.ip,
-                country=ctx.country,
-                region=ctx.region,
-                city=ctx.city,
+                country=ip_info.country,
+                region=ip_info.region,
+                city=ip_info.city,
                 user_agent=ctx.user_agent,
-                browser=ctx.browser,
-                os=ctx.os,
-                device=ctx.device,
+                browser=ua_info.browser,
+                os=ua_info.os,
+                device=ua_info.device,
                 msg=msg,
                 login_time=login_time,
             )
@@ -2,7 +2,7 @@
 
 from fastapi import APIRouter
 
-from backend.app.llm.api.v1 import api_keys, model_groups, models, providers, proxy, rate_limits, usage
+from backend.app.llm.api.v1 import api_keys, batches, model_groups, models, providers, proxy, rate_limits, usage
 from backend.core.conf import settings
 
 v1 = APIRouter(prefix=f'{settings.FASTAPI_API_V1_PATH}/llm')
@@ -25,5 +25,8 @@ v1.include_router(api_keys.router, prefix='/api-keys', tags=['LLM API Key 管理
 # 代理 API
 v1.include_router(proxy.router, prefix='/proxy', tags=['LLM 代理'])
 
+# 批处理
+v1.include_router(batches.router, prefix='/proxy/v1/batches', tags=['LLM 批处理'])
+
 # 用量统计
 v1.include_router(usage.router, prefix='/usage', tags=['LLM 用量统计'])
@@ -0,0 +1,71 @@
+"""批处理 API - OpenAI Batch API 兼容"""
+
+from typing import Annotated
+
+from fastapi import APIRouter, File, Form, Header, Path, Query, Request, UploadFile
+from fastapi.responses import FileResponse
+
+from backend.app.llm.schema.batch import GetBatchDetail, GetBatchList
+from backend.app.llm.service.batch_service import batch_service
+from backend.common.security.jwt import DependsJwtAuth
+from backend.database.db import CurrentSession
+
+router = APIRouter()
+
+
+@router.post(
+    '',
+    summary='创建批处理',
+    description='上传 JSONL 请求文件创建批处理，兼容 OpenAI Batch API 格式，需要 JWT 认证 + X-API-Key',
+    dependencies=[DependsJwtAuth],
+)
+async def create_batch(
+    db: CurrentSession,
+    file: Annotated[UploadFile, File(description='JSONL 请求文件')],
+    x_api_key: Annotated[str, Header(alias='x-api-key', description='LLM API Key (sk-cf-xxx)')],
+    endpoint: Annotated[str, Form(description='请求端点')] = '/v1/chat/completions',
+    completion_window: Annotated[str, Form(description='完成时间窗口')] = '24h',
+) -> GetBatchDetail:
+    return await batch_service.create(
+        db, api_key=x_api_key, file=file, endpoint=endpoint, completion_window=completion_window
+    )
+
+
+@router.get('', summary='获取批处理列表', dependencies=[DependsJwtAuth])
+async def get_batches(
+    request: Request,
+    db: CurrentSession,
+    limit: Annotated[int, Query(description='返回数量', ge=1, le=100)] = 20,
+    after: Annotated[str | None, Query(description='分页游标')] = None,
+) -> GetBatchList:
+    return await batch_service.get_list(db, request.user.id, limit=limit, after=after)
+
+
+@router.get('/{batch_id}', summary='获取批处理详情', dependencies=[DependsJwtAuth])
+async def get_batch(
+    request: Request, db: CurrentSession, batch_id: Annotated[str, Path(description='批处理 ID')]
+) -> GetBatchDetail:
+    return await batch_service.get(db, request.user.id, batch_id)
+
+
+@router.post('/{batch_id}/cancel', summary='取消批处理', dependencies=[DependsJwtAuth])
+async def cancel_batch(
+    request: Request, db: CurrentSession, batch_id: Annotated[str, Path(description='批处理 ID')]
+) -> GetBatchDetail:
+    return await batch_service.cancel(db, request.user.id, batch_id)
+
+
+@router.get('/{batch_id}/output', summary='下载批处理输出文件', dependencies=[DependsJwtAuth])
+async def get_batch_output(
+    request: Request, db: CurrentSession, batch_id: Annotated[str, Path(description='批处理 ID')]
+) -> FileResponse:
+    path = await batch_service.get_result_file(db, request.user.id, batch_id)
+    return FileResponse(path, media_type='application/jsonl', filename=path.name)
+
+
+@router.get('/{batch_id}/errors', summary='下载批处理错误文件', dependencies=[DependsJwtAuth])
+async def get_batch_errors(
+    request: Request, db: CurrentSession, batch_id: Annotated[str, Path(description='批处理 ID')]
+) -> FileResponse:
+    path = await batch_service.get_result_file(db, request.user.id, batch_id, error=True)
+    return FileResponse(path, media_type='application/jsonl', filename=path.name)
@@ -2,6 +2,9 @@
 @author Ysf
 """
 
+import contextlib
+
+from collections.abc import AsyncIterator
 from typing import Annotated
 
 from fastapi import APIRouter, Header, Request
@@ -12,10 +15,11 @@ from backend.app.llm.schema.proxy import (
     AnthropicMessageResponse,
     ChatCompletionRequest,
     ChatCompletionResponse,
+    EmbeddingRequest,
+    EmbeddingResponse,
 )
 from backend.app.llm.service.gateway_service import gateway_service
 from backend.common.security.jwt import DependsJwtAuth
-from backend.database.db import CurrentSession
 
 router = APIRouter()
 
@@ -28,6 +32,20 @@ def _get_client_ip(request: Request) -> str | None:
     return request.client.host if request.client else None
 
 
+async def _closing(stream: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    确保网关流随响应结束关闭
+
+    客户端断开时 StreamingResponse 取消发送任务，网关流随之关闭并取消上游调用，无需逐块检查连接状态
+
+    :param stream: SSE 流
+    :return:
+    """
+    async with contextlib.aclosing(stream):
+        async for chunk in stream:
+            yield chunk
+
+
 @router.post(
     '/v1/chat/completions',
     summary='OpenAI 兼容聊天补全',
@@ -38,7 +56,6 @@ def _get_client_ip(request: Request) -> str | None:
 )
 async def chat_completions(
     request: Request,
-    db: CurrentSession,
     body: ChatCompletionRequest,
     x_api_key: Annotated[str, Header(alias='x-api-key', description='LLM API Key (sk-cf-xxx)')],
 ) -> ChatCompletionResponse | StreamingResponse:
@@ -46,11 +63,12 @@ async def chat_completions(
 
     if body.stream:
         return StreamingResponse(
-            gateway_service.chat_completion_stream(
-                db,
-                api_key=x_api_key,
-                request=body,
-                ip_address=ip_address,
+            _closing(
+                gateway_service.chat_completion_stream(
+                    api_key=x_api_key,
+                    request=body,
+                    ip_address=ip_address,
+                ),
             ),
             media_type='text/event-stream',
             headers={
@@ -61,13 +79,30 @@ async def chat_completions(
         )
 
     return await gateway_service.chat_completion(
-        db,
         api_key=x_api_key,
         request=body,
         ip_address=ip_address,
     )
 
 
+@router.post(
+    '/v1/embeddings',
+    summary='OpenAI 兼容文本向量化',
+    description='兼容 OpenAI Embeddings API 格式，需要 JWT 认证 + X-API-Key',
+    dependencies=[DependsJwtAuth],
+)
+async def embeddings(
+    request: Request,
+    body: EmbeddingRequest,
+    x_api_key: Annotated[str, Header(alias='x-api-key', description='LLM API Key (sk-cf-xxx)')],
+) -> EmbeddingResponse:
+    return await gateway_service.embedding(
+        api_key=x_api_key,
+        request=body,
+        ip_address=_get_client_ip(request),
+    )
+
+
 @router.post(
     '/v1/messages',
     summary='Anthropic 兼容消息',
@@ -78,7 +113,6 @@ async def chat_completions(
 )
 async def anthropic_messages(
     request: Request,
-    db: CurrentSession,
     body: AnthropicMessageRequest,
     x_api_key: Annotated[str, Header(alias='x-api-key', description='LLM API Key (sk-cf-xxx)')],
 ) -> AnthropicMessageResponse | StreamingResponse:
@@ -86,11 +120,12 @@ async def anthropic_messages(
 
     if body.stream:
         return StreamingResponse(
-            gateway_service.anthropic_messages_stream(
-                db,
-                api_key=x_api_key,
-                request=body,
-                ip_address=ip_address,
+            _closing(
+                gateway_service.anthropic_messages_stream(
+                    api_key=x_api_key,
+                    request=body,
+                    ip_address=ip_address,
+                ),
             ),
             media_type='text/event-stream',
             headers={
@@ -101,7 +136,6 @@ async def anthropic_messages(
         )
 
     return await gateway_service.anthropic_messages(
-        db,
         api_key=x_api_key,
         request=body,
         ip_address=ip_address,
@@ -112,7 +112,7 @@ async def get_quota_info(
     api_key_record = await api_key_service.verify_api_key(db, api_key)
 
     # 获取速率限制
-    rate_limits = await api_key_service.get_rate_limits(db, api_key_record)
+    rate_limits = api_key_service.get_rate_limits(api_key_record)
 
     # 获取配额信息
     data = await usage_service.get_quota_info(
@@ -120,5 +120,6 @@ async def get_quota_info(
         rpm_limit=rate_limits['rpm_limit'],
         daily_limit=rate_limits['daily_token_limit'],
         monthly_limit=rate_limits['monthly_token_limit'],
+        algorithm=rate_limits['algorithm'],
     )
     return response_base.success(data=data)
@@ -0,0 +1,216 @@
+"""API Key 验证缓存"""
+
+import time
+import uuid
+
+from datetime import datetime
+from enum import Enum
+from typing import Any
+
+import cachebox
+
+from msgspec import DecodeError, Struct, ValidationError, json
+from redis.exceptions import ResponseError
+
+from backend.app.llm.crud.crud_user_api_key import user_api_key_dao
+from backend.common.cache.pubsub import cache_pubsub_manager
+from backend.common.log import log
+from backend.core.conf import settings
+from backend.database.db import async_db_session
+from backend.database.redis import redis_client
+from backend.utils.timezone import timezone
+
+# Redis 负缓存标记
+_NEGATIVE = '0'
+
+
+class ApiKeyCacheMarker(Enum):
+    """API Key 缓存标记"""
+
+    # 负缓存命中（Key 无效）
+    INVALID = 'invalid'
+
+
+class CachedApiKey(Struct):
+    """已解析的 API Key 及其生效限制"""
+
+    id: int
+    user_id: int
+    key_hash: str
+    status: str
+    expires_at: datetime | None
+    allowed_models: list[int] | None
+    rate_limits: dict[str, Any]
+    response_cache_ttl: int | None = None
+
+
+class ApiKeyCache:
+    """
+    API Key 两级缓存
+
+    L1 为进程内 TTL 缓存，L2 为 Redis；无效 Key 短时负缓存；
+    Key 或速率限制配置变更时删除 L2 并通过缓存 Pub/Sub 通道清空各节点 L1
+    """
+
+    def __init__(self) -> None:
+        self._local: cachebox.TTLCache = cachebox.TTLCache(
+            settings.LLM_API_KEY_CACHE_LOCAL_MAXSIZE, ttl=settings.LLM_API_KEY_CACHE_LOCAL_TTL
+        )
+        self._negative: cachebox.TTLCache = cachebox.TTLCache(
+            settings.LLM_API_KEY_CACHE_LOCAL_MAXSIZE, ttl=settings.LLM_API_KEY_NEGATIVE_CACHE_TTL
+        )
+
+    @staticmethod
+    def _redis_key(key_hash: str) -> str:
+        return f'{settings.LLM_API_KEY_CACHE_PREFIX}:{key_hash}'
+
+    async def get(self, key_hash: str) -> CachedApiKey | ApiKeyCacheMarker | None:
+        """
+        获取缓存
+
+        :param key_hash: API Key 哈希
+        :return: 命中返回 CachedApiKey，负缓存命中返回 ApiKeyCacheMarker.INVALID，未命中返回 None
+        """
+        cached = self._local.get(key_hash)
+        if cached is not None:
+            return cached
+        if key_hash in self._negative:
+            return ApiKeyCacheMarker.INVALID
+
+        try:
+            value = await redis_client.get(self._redis_key(key_hash))
+        except Exception as e:
+            log.warning(f'[LLM ApiKeyCache] GET error: {e}')
+            return None
+        if value is None:
+            return None
+        if value == _NEGATIVE:
+            self._negative[key_hash] = True
+            return ApiKeyCacheMarker.INVALID
+
+        try:
+            cached = json.decode(value, type=CachedApiKey)
+        except (DecodeError, ValidationError) as e:
+            # 结构变更前写入或已损坏的缓存按未命中处理并删除
+            log.warning(f'[LLM ApiKeyCache] DECODE error: {e}')
+            await self._delete(key_hash)
+            return None
+        self._local[key_hash] = cached
+        return cached
+
+    async def _delete(self, key_hash: str) -> None:
+        """
+        删除 Redis 缓存
+
+        :param key_hash: API Key 哈希
+        :return:
+        """
+        try:
+            await redis_client.delete(self._redis_key(key_hash))
+        except Exception as e:
+            log.warning(f'[LLM ApiKeyCache] DELETE error: {e}')
+
+    async def set(self, cached: CachedApiKey) -> None:
+        """
+        设置缓存
+
+        :param cached: 已解析的 API Key
+        :return:
+        """
+        self._local[cached.key_hash] = cached
+        try:
+            await redis_client.setex(
+                self._redis_key(cached.key_hash), settings.LLM_API_KEY_CACHE_TTL, json.encode(cached)
+            )
+        except Exception as e:
+            log.warning(f'[LLM ApiKeyCache] SET error: {e}')
+
+    async def set_negative(self, key_hash: str) -> None:
+        """
+        设置负缓存
+
+        :param key_hash: API Key 哈希
+        :return:
+        """
+        self._negative[key_hash] = True
+        try:
+            await redis_client.setex(self._redis_key(key_hash), settings.LLM_API_KEY_NEGATIVE_CACHE_TTL, _NEGATIVE)
+        except Exception as e:
+            log.warning(f'[LLM ApiKeyCache] SET error: {e}')
+
+    async def invalidate(self, key_hash: str | None = None) -> None:
+        """
+        失效缓存并通知其他节点
+
+        :param key_hash: API Key 哈希，为空时失效全部
+        :return:
+        """
+        self.clear_local()
+        try:
+            if key_hash is None:
+                await redis_client.delete_prefix(f'{settings.LLM_API_KEY_CACHE_PREFIX}:')
+            else:
+                await redis_client.delete(self._redis_key(key_hash))
+        except Exception as e:
+            log.error(f'[LLM ApiKeyCache] INVALIDATE error: {e}')
+        await cache_pubsub_manager.publish_invalidation(settings.LLM_API_KEY_CACHE_PREFIX, is_delete_prefix=True)
+
+    def clear_local(self) -> None:
+        """清空本地缓存"""
+        self._local.clear()
+        self._negative.clear()
+
+    async def _on_invalidation(self) -> None:
+        """Pub/Sub 失效回调"""
+        self.clear_local()
+
+    def register(self) -> None:
+        """注册 Pub/Sub 失效回调"""
+        cache_pubsub_manager.register_handler(settings.LLM_API_KEY_CACHE_PREFIX, self._on_invalidation)
+
+    @staticmethod
+    async def touch(api_key_id: int) -> None:
+        """
+        记录最后使用时间，由定时任务批量写入数据库
+
+        :param api_key_id: API Key ID
+        :return:
+        """
+        try:
+            await redis_client.hset(settings.LLM_API_KEY_LAST_USED_KEY, str(api_key_id), str(int(time.time())))
+        except Exception as e:
+            log.warning(f'[LLM ApiKeyCache] 记录最后使用时间失败: {e}')
+
+    @staticmethod
+    async def flush_last_used() -> int:
+        """
+        批量写入最后使用时间
+
+        :return: 写入数量
+        """
+        # 重命名为独立的键后再读取，避免与并发写入及其他刷新任务冲突
+        flushing_key = f'{settings.LLM_API_KEY_LAST_USED_KEY}:flushing:{uuid.uuid4().hex}'
+        try:
+            await redis_client.rename(settings.LLM_API_KEY_LAST_USED_KEY, flushing_key)
+        except ResponseError:
+            return 0
+
+        data = await redis_client.hgetall(flushing_key)
+        values = {int(pk): timezone.from_datetime(timezone.to_utc(int(ts))) for pk, ts in data.items()}
+        try:
+            async with async_db_session.begin() as db:
+                await user_api_key_dao.bulk_update_last_used(db, values)
+        except Exception:
+            # 写入失败时合并回原键等待下次重试，不覆盖期间写入的更新时间
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for pk, ts in data.items():
+                    pipe.hsetnx(settings.LLM_API_KEY_LAST_USED_KEY, pk, ts)
+                pipe.delete(flushing_key)
+                await pipe.execute()
+            raise
+        await redis_client.delete(flushing_key)
+        return len(values)
+
+
+# 创建全局 API Key 缓存实例
+api_key_cache = ApiKeyCache()
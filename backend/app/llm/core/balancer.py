@@ -0,0 +1,147 @@
+"""模型组负载均衡"""
+
+import dataclasses
+import random
+
+from backend.app.llm.core.routing import ModelRoute
+from backend.app.llm.enums import ModelSelectionStrategy
+from backend.core.conf import settings
+
+
+@dataclasses.dataclass
+class RouteStats:
+    """路由实时统计"""
+
+    in_flight: int = 0
+    ttfb_ewma: float | None = None
+    latency_ewma: float | None = None
+    error_ewma: float = 0.0
+
+    @staticmethod
+    def _ewma(current: float | None, value: float) -> float:
+        if current is None:
+            return value
+        alpha = settings.LLM_ROUTE_STATS_EWMA_ALPHA
+        return alpha * value + (1 - alpha) * current
+
+    @property
+    def cost(self) -> float:
+        """
+        选路代价
+
+        首字节延迟 EWMA × (进行中请求数 + 1)，按错误率放大；无样本时为 0，优先探测
+        """
+        if self.ttfb_ewma is None:
+            return 0.0
+        return self.ttfb_ewma * (self.in_flight + 1) / max(1 - self.error_ewma, 0.05)
+
+
+class LoadBalancer:
+    """
+    模型组负载均衡器
+
+    根据模型组选路策略决定首选路由及故障转移顺序，统计数据由请求调度器及网关实时上报
+    """
+
+    def __init__(self) -> None:
+        self._stats: dict[int, RouteStats] = {}
+
+    def get_stats(self, model_id: int) -> RouteStats:
+        """
+        获取路由统计
+
+        :param model_id: 模型 ID
+        :return:
+        """
+        stats = self._stats.get(model_id)
+        if stats is None:
+            stats = self._stats[model_id] = RouteStats()
+        return stats
+
+    def begin(self, model_id: int) -> None:
+        """
+        记录请求开始
+
+        :param model_id: 模型 ID
+        :return:
+        """
+        self.get_stats(model_id).in_flight += 1
+
+    def first_byte(self, model_id: int, ttfb_ms: float) -> None:
+        """
+        记录首字节延迟
+
+        :param model_id: 模型 ID
+        :param ttfb_ms: 首字节延迟（毫秒）
+        :return:
+        """
+        stats = self.get_stats(model_id)
+        stats.ttfb_ewma = stats._ewma(stats.ttfb_ewma, ttfb_ms)
+
+    def end(self, model_id: int, *, latency_ms: float | None = None, error: bool = False) -> None:
+        """
+        记录请求结束
+
+        :param model_id: 模型 ID
+        :param latency_ms: 总耗时（毫秒），取消的请求为空
+        :param error: 是否失败
+        :return:
+        """
+        stats = self.get_stats(model_id)
+        stats.in_flight = max(stats.in_flight - 1, 0)
+        if latency_ms is not None:
+            stats.latency_ewma = stats._ewma(stats.latency_ewma, latency_ms)
+            stats.error_ewma = stats._ewma(stats.error_ewma, 1.0 if error else 0.0)
+
+    def order(self, route: ModelRoute) -> list[ModelRoute]:
+        """
+        按选路策略排列候选路由
+
+        仅在模型组内与请求模型同名的部署之间负载均衡，其他模型只作为故障转移，按优先级排在其后
+
+        :param route: 请求的模型路由
+        :return: 首个为首选路由，其余为故障转移顺序
+        """
+        strategy = route.policy.selection_strategy
+        if not route.fallbacks or strategy == ModelSelectionStrategy.PRIORITY:
+            return [route, *route.fallbacks]
+
+        model_name = route.model_config.model_name
+        candidates = [route, *(c for c in route.fallbacks if c.model_config.model_name == model_name)]
+        failover = [c for c in route.fallbacks if c.model_config.model_name != model_name]
+        return [*self._balance(strategy, candidates), *failover]
+
+    def _balance(self, strategy: str, candidates: list[ModelRoute]) -> list[ModelRoute]:
+        """
+        按选路策略排列同一模型的部署
+
+        :param strategy: 选路策略
+        :param candidates: 候选路由，按优先级排序
+        :return:
+        """
+        if len(candidates) == 1:
+            return candidates
+
+        if strategy == ModelSelectionStrategy.WEIGHTED:
+            # 加权随机排列（Efraimidis-Spirakis）
+            return sorted(
+                candidates,
+                key=lambda c: random.random() ** (1 / c.weight) if c.weight > 0 else -1.0,
+                reverse=True,
+            )
+
+        if strategy == ModelSelectionStrategy.LEAST_IN_FLIGHT:
+            return sorted(candidates, key=lambda c: self.get_stats(c.model_config.id).in_flight)
+
+        if strategy == ModelSelectionStrategy.EWMA_P2C:
+            # 随机取两个候选，代价低者优先，其余保持优先级顺序
+            first, second = random.sample(candidates, 2)
+            if self.get_stats(second.model_config.id).cost < self.get_stats(first.model_config.id).cost:
+                first = second
+            return [first, *(c for c in candidates if c is not first)]
+
+        return candidates
+
+
+# 创建全局负载均衡器实例
+load_balancer = LoadBalancer()
@@ -0,0 +1,453 @@
+"""LLM 批处理执行器"""
+
+import asyncio
+import dataclasses
+import uuid
+
+from collections.abc import Iterator
+from datetime import timedelta
+from pathlib import Path
+from typing import Any
+
+from anyio import open_file
+from fastapi import HTTPException
+from msgspec import json
+from pydantic import ValidationError
+
+from backend.app.llm.core.api_key_cache import CachedApiKey
+from backend.app.llm.core.gateway import ProviderUnavailableError, llm_gateway
+from backend.app.llm.core.rate_limiter import RateLimitExceeded
+from backend.app.llm.core.routing import ModelRoute, llm_routing_table
+from backend.app.llm.crud.crud_batch import batch_dao
+from backend.app.llm.enums import BatchStatus
+from backend.app.llm.model.batch import Batch
+from backend.app.llm.schema.batch import BatchRequestInput
+from backend.app.llm.schema.proxy import ChatCompletionRequest
+from backend.app.llm.service.api_key_service import api_key_service
+from backend.common.exception import errors
+from backend.common.log import log
+from backend.core.conf import settings
+from backend.core.path_conf import LLM_BATCH_DIR
+from backend.database.db import async_db_session
+from backend.database.redis import redis_client
+from backend.utils.timezone import timezone
+
+# 批处理文件目录，Web 与 Celery Worker 需挂载同一共享存储
+BATCH_STORAGE_DIR = Path(settings.LLM_BATCH_STORAGE_DIR) if settings.LLM_BATCH_STORAGE_DIR else LLM_BATCH_DIR
+
+# 可能因 Worker 中断而停滞的状态
+_RECOVERABLE_STATUSES = [BatchStatus.VALIDATING, BatchStatus.IN_PROGRESS, BatchStatus.CANCELLING]
+
+
+class BatchValidationError(Exception):
+    """批处理输入文件校验失败"""
+
+    def __init__(self, message: str, line: int | None = None) -> None:
+        super().__init__(f'Line {line}: {message}' if line else message)
+
+
+@dataclasses.dataclass
+class _Progress:
+    """批处理执行进度"""
+
+    completed: int = 0
+    failed: int = 0
+    final_status: str | None = None
+
+
+class BatchRunner:
+    """
+    批处理执行器
+
+    在 Celery Worker 中校验输入文件后以有限并发逐行调用网关，成功结果写入输出文件，失败写入错误文件；
+    同一 Worker 进程内按供应商限制并发，触发 RPM/TPM 限流或供应商不可用时等待后重试；
+    周期性写入进度（心跳）并检查取消及过期，执行期间持有 Redis 锁避免重复执行；
+    Worker 中断后心跳停止，由定时任务重新投递，任务重新执行时跳过输出及错误文件中已有的请求
+    """
+
+    def __init__(self) -> None:
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+
+    def _get_semaphore(self, provider_name: str) -> asyncio.Semaphore:
+        """
+        获取供应商并发信号量
+
+        :param provider_name: 供应商名称
+        :return:
+        """
+        semaphore = self._semaphores.get(provider_name)
+        if semaphore is None:
+            semaphore = self._semaphores[provider_name] = asyncio.Semaphore(settings.LLM_BATCH_PROVIDER_CONCURRENCY)
+        return semaphore
+
+    @staticmethod
+    def _parse_input(path: Path, endpoint: str) -> list[tuple[str, ChatCompletionRequest]]:
+        """
+        解析并校验输入文件
+
+        :param path: 输入文件路径
+        :param endpoint: 批处理端点
+        :return: 自定义 ID 及请求参数列表
+        """
+        requests: list[tuple[str, ChatCompletionRequest]] = []
+        seen: set[str] = set()
+        with path.open('rb') as f:
+            for line_no, raw in enumerate(f, start=1):
+                if not raw.strip():
+                    continue
+                try:
+                    item = BatchRequestInput.model_validate_json(raw)
+                    request = ChatCompletionRequest.model_validate(item.body)
+                except ValidationError as e:
+                    raise BatchValidationError(f'Invalid request: {e.errors()[0]["msg"]}', line_no) from None
+                if item.url != endpoint:
+                    raise BatchValidationError(f'URL {item.url} does not match batch endpoint {endpoint}', line_no)
+                if request.stream:
+                    raise BatchValidationError('Streaming is not supported in batch requests', line_no)
+                if item.custom_id in seen:
+                    raise BatchValidationError(f'Duplicate custom_id: {item.custom_id}', line_no)
+                seen.add(item.custom_id)
+                requests.append((item.custom_id, request))
+                if len(requests) > settings.LLM_BATCH_MAX_REQUESTS:
+                    raise BatchValidationError(f'Too many requests, max {settings.LLM_BATCH_MAX_REQUESTS}')
+        if not requests:
+            raise BatchValidationError('Input file contains no requests')
+        return requests
+
+    @staticmethod
+    def _read_finished(path: Path) -> set[str]:
+        """
+        读取结果文件中已完成的自定义 ID
+
+        :param path: 结果文件路径
+        :return:
+        """
+        if not path.exists():
+            return set()
+        with path.open('rb') as f:
+            return {custom_id for raw in f if (custom_id := BatchRunner._decode_custom_id(raw)) is not None}
+
+    @staticmethod
+    def _decode_custom_id(raw: bytes) -> str | None:
+        """
+        解析结果行的自定义 ID
+
+        :param raw: 结果行
+        :return: 上次执行中断时写入的不完整行返回 None
+        """
+        try:
+            return json.decode(raw)['custom_id']
+        except Exception:
+            return None
+
+    @staticmethod
+    def _lock_key(batch_id: str) -> str:
+        return f'{settings.LLM_BATCH_LOCK_PREFIX}:{batch_id}:lock'
+
+    async def recover_stale(self) -> list[str]:
+        """
+        认领心跳超时的批处理（Worker 中断或任务丢失），由调用方重新投递
+
+        :return: 需要重新投递的批处理 ID
+        """
+        before = timezone.now() - timedelta(seconds=settings.LLM_BATCH_STALE_SECONDS)
+        async with async_db_session() as db:
+            stale = await batch_dao.get_stale(db, _RECOVERABLE_STATUSES, before)
+            # 刷新更新时间作为认领，避免下次检查前重复投递
+            return [batch.batch_id for batch in stale if await batch_dao.touch(db, batch.id, before)]
+
+    async def run(self, batch_id: str) -> str:
+        """
+        执行批处理
+
+        :param batch_id: 批处理 ID
+        :return:
+        """
+        lock_key = self._lock_key(batch_id)
+        token = uuid.uuid4().hex
+        try:
+            locked = await redis_client.set(lock_key, token, nx=True, px=settings.LLM_BATCH_STALE_SECONDS * 1000)
+        except Exception as e:
+            log.warning(f'[LLM Batch] 获取执行锁失败，继续执行: {e}')
+            locked = True
+        if not locked:
+            return f'Batch {batch_id} skipped: already running'
+        try:
+            return await self._run(batch_id, lock_key)
+        finally:
+            try:
+                if await redis_client.get(lock_key) == token:
+                    await redis_client.delete(lock_key)
+            except Exception as e:
+                log.warning(f'[LLM Batch] 释放执行锁失败: {e}')
+
+    async def _run(self, batch_id: str, lock_key: str) -> str:
+        """
+        持有执行锁时执行批处理
+
+        :param batch_id: 批处理 ID
+        :param lock_key: 执行锁键
+        :return:
+        """
+        async with async_db_session() as db:
+            batch = await batch_dao.get_by_batch_id(db, batch_id)
+            if batch is None:
+                return f'Batch {batch_id} not found'
+            if batch.status == BatchStatus.CANCELLING:
+                await batch_dao.transition(
+                    db,
+                    batch.id,
+                    [BatchStatus.CANCELLING],
+                    {'status': BatchStatus.CANCELLED, 'finished_at': timezone.now()},
+                )
+                return f'Batch {batch_id} cancelled'
+            if batch.status not in (BatchStatus.VALIDATING, BatchStatus.IN_PROGRESS):
+                return f'Batch {batch_id} skipped: {batch.status}'
+            if batch.expires_at and timezone.now() > batch.expires_at:
+                # 重新投递时已超出完成时间窗口
+                await batch_dao.transition(
+                    db,
+                    batch.id,
+                    [BatchStatus.VALIDATING, BatchStatus.IN_PROGRESS],
+                    {'status': BatchStatus.EXPIRED, 'finished_at': timezone.now()},
+                )
+                return f'Batch {batch_id} expired'
+
+            input_path = BATCH_STORAGE_DIR / batch.input_file
+            try:
+                if not input_path.exists():
+                    raise BatchValidationError(
+                        'Input file not found, web and worker must share the batch storage directory'
+                    )
+                requests = await asyncio.to_thread(self._parse_input, input_path, batch.endpoint)
+                api_key = await api_key_service.load_api_key(db, batch.api_key_id)
+            except (BatchValidationError, errors.AuthorizationError, OSError) as e:
+                message = e.msg if isinstance(e, errors.AuthorizationError) else str(e)
+                await batch_dao.update(
+                    db,
+                    batch.id,
+                    {'status': BatchStatus.FAILED, 'error_message': message, 'finished_at': timezone.now()},
+                )
+                return f'Batch {batch_id} failed: {message}'
+
+            output_file = f'{batch_id}_output.jsonl'
+            error_file = f'{batch_id}_error.jsonl'
+            started = await batch_dao.transition(
+                db,
+                batch.id,
+                [BatchStatus.VALIDATING, BatchStatus.IN_PROGRESS],
+                {
+                    'status': BatchStatus.IN_PROGRESS,
+                    'total_count': len(requests),
+                    'output_file': output_file,
+                    'error_file': error_file,
+                    'in_progress_at': batch.in_progress_at or timezone.now(),
+                },
+            )
+            if not started:
+                # 校验期间被取消
+                await batch_dao.transition(
+                    db,
+                    batch.id,
+                    [BatchStatus.CANCELLING],
+                    {'status': BatchStatus.CANCELLED, 'finished_at': timezone.now()},
+                )
+                return f'Batch {batch_id} cancelled'
+
+        if not llm_routing_table.ready:
+            await llm_routing_table.refresh()
+
+        output_path = BATCH_STORAGE_DIR / output_file
+        error_path = BATCH_STORAGE_DIR / error_file
+        succeeded = await asyncio.to_thread(self._read_finished, output_path)
+        failed = await asyncio.to_thread(self._read_finished, error_path)
+        progress = _Progress(completed=len(succeeded), failed=len(failed))
+        pending = iter([item for item in requests if item[0] not in succeeded and item[0] not in failed])
+        stop = asyncio.Event()
+
+        async with await open_file(output_path, 'ab') as out, await open_file(error_path, 'ab') as err:
+            monitor = asyncio.create_task(self._monitor(batch, progress, stop, out, err, lock_key))
+            try:
+                await asyncio.gather(
+                    *(
+                        self._worker(pending, api_key, progress, stop, out, err)
+                        for _ in range(settings.LLM_BATCH_CONCURRENCY)
+                    )
+                )
+            finally:
+                monitor.cancel()
+
+        counts = {'completed_count': progress.completed, 'failed_count': progress.failed}
+        async with async_db_session() as db:
+            # 执行期间收到的取消请求优先
+            if await batch_dao.transition(
+                db,
+                batch.id,
+                [BatchStatus.CANCELLING],
+                {'status': BatchStatus.CANCELLED, 'finished_at': timezone.now(), **counts},
+            ):
+                status = BatchStatus.CANCELLED
+            else:
+                status = progress.final_status or BatchStatus.COMPLETED
+                await batch_dao.transition(
+                    db, batch.id, [BatchStatus.IN_PROGRESS], {'status': status, 'finished_at': timezone.now(), **counts}
+                )
+        return f'Batch {batch_id} {status}: {progress.completed} completed, {progress.failed} failed'
+
+    async def _worker(
+        self,
+        pending: Iterator[tuple[str, ChatCompletionRequest]],
+        api_key: CachedApiKey,
+        progress: _Progress,
+        stop: asyncio.Event,
+        out: Any,
+        err: Any,
+    ) -> None:
+        """
+        逐个执行待处理请求
+
+        :param pending: 待处理请求（各 worker 共享）
+        :param api_key: 批处理所属 API Key
+        :param progress: 执行进度
+        :param stop: 停止信号
+        :param out: 输出文件
+        :param err: 错误文件
+        :return:
+        """
+        while not stop.is_set():
+            item = next(pending, None)
+            if item is None:
+                return
+            custom_id, request = item
+            response, error = await self._execute(request, api_key, stop)
+            if response is None and error is None:
+                # 已停止，未完成的请求不写入结果
+                return
+            line = json.encode({
+                'id': f'batch_req_{uuid.uuid4().hex}',
+                'custom_id': custom_id,
+                'response': response,
+                'error': error,
+            })
+            if error is None:
+                await out.write(line + b'\n')
+                progress.completed += 1
+            else:
+                await err.write(line + b'\n')
+                progress.failed += 1
+
+    async def _execute(
+        self, request: ChatCompletionRequest, api_key: CachedApiKey, stop: asyncio.Event
+    ) -> tuple[dict[str, Any] | None, dict[str, Any] | None]:
+        """
+        执行单个请求
+
+        :param request: 请求参数
+        :param api_key: 批处理所属 API Key
+        :param stop: 停止信号
+        :return: 响应及错误
+        """
+        try:
+            async with async_db_session() as db:
+                route = await llm_gateway.resolve_route(db, request.model)
+        except HTTPException as e:
+            return self._error_result(e.status_code, str(e.detail))
+        attempt = 0
+        while not stop.is_set():
+            result = await self._call(route, request, api_key)
+            if isinstance(result, tuple):
+                return result
+            if attempt >= settings.LLM_BATCH_MAX_RETRIES:
+                return self._error_result(result.status_code, str(result.detail))
+            attempt += 1
+            await asyncio.sleep(settings.LLM_BATCH_RETRY_DELAY)
+        return None, None
+
+    async def _call(
+        self, route: ModelRoute, request: ChatCompletionRequest, api_key: CachedApiKey
+    ) -> tuple[dict[str, Any] | None, dict[str, Any] | None] | HTTPException:
+        """
+        调用一次网关
+
+        :param route: 模型路由
+        :param request: 请求参数
+        :param api_key: 批处理所属 API Key
+        :return: 响应及错误，可重试时返回触发重试的异常
+        """
+        rate_limits = api_key.rate_limits
+        try:
+            async with self._get_semaphore(route.provider.name):
+                response = await llm_gateway.chat_completion(
+                    route,
+                    request=request,
+                    user_id=api_key.user_id,
+                    api_key_id=api_key.id,
+                    rpm_limit=rate_limits['rpm_limit'],
+                    daily_limit=rate_limits['daily_token_limit'],
+                    monthly_limit=rate_limits['monthly_token_limit'],
+                    tpm_limit=rate_limits['tpm_limit'],
+                    rate_limit_algorithm=rate_limits['algorithm'],
+                    response_cache_ttl=api_key.response_cache_ttl,
+                )
+        except (RateLimitExceeded, ProviderUnavailableError) as e:
+            if isinstance(e, RateLimitExceeded) and not e.retryable:
+                return self._error_result(e.status_code, str(e.detail))
+            return e
+        except HTTPException as e:
+            return self._error_result(e.status_code, str(e.detail))
+        except Exception as e:
+            log.error(f'[LLM Batch] 请求执行失败: {e}')
+            return None, {'code': 'internal_error', 'message': str(e)}
+        body = response.model_dump(mode='json', exclude_none=True)
+        return {'status_code': 200, 'request_id': response.id, 'body': body}, None
+
+    @staticmethod
+    def _error_result(status_code: int, message: str) -> tuple[dict[str, Any], dict[str, Any]]:
+        """
+        生成失败请求的响应及错误
+
+        :param status_code: HTTP 状态码
+        :param message: 错误信息
+        :return:
+        """
+        response = {'status_code': status_code, 'request_id': None, 'body': {'error': {'message': message}}}
+        return response, {'code': str(status_code), 'message': message}
+
+    @staticmethod
+    async def _monitor(
+        batch: Batch, progress: _Progress, stop: asyncio.Event, out: Any, err: Any, lock_key: str
+    ) -> None:
+        """
+        周期性写入进度（同时作为心跳刷新更新时间）、续期执行锁并检查取消及过期
+
+        :param batch: 批处理
+        :param progress: 执行进度
+        :param stop: 停止信号
+        :param out: 输出文件
+        :param err: 错误文件
+        :param lock_key: 执行锁键
+        :return:
+        """
+        while not stop.is_set():
+            await asyncio.sleep(settings.LLM_BATCH_PROGRESS_INTERVAL)
+            await out.flush()
+            await err.flush()
+            try:
+                await redis_client.pexpire(lock_key, settings.LLM_BATCH_STALE_SECONDS * 1000)
+                async with async_db_session() as db:
+                    await batch_dao.update(
+                        db, batch.id, {'completed_count': progress.completed, 'failed_count': progress.failed}
+                    )
+                    current = await batch_dao.get_by_batch_id(db, batch.batch_id)
+            except Exception as e:
+                log.warning(f'[LLM Batch] 进度写入失败: {e}')
+                continue
+            if current is None or current.status == BatchStatus.CANCELLING:
+                stop.set()
+            elif current.expires_at and timezone.now() > current.expires_at:
+                progress.final_status = BatchStatus.EXPIRED
+                stop.set()
+
+
+# 创建全局批处理执行器实例
+batch_runner = BatchRunner()
@@ -2,21 +2,109 @@
 
 import time
 
-from threading import Lock
+from redis.commands.core import AsyncScript
 
 from backend.app.llm.enums import CircuitState
+from backend.common.log import log
 from backend.core.conf import settings
+from backend.database.redis import redis_client
+
+# 熔断器状态存储在 Redis hash 中，字段：state / failures / successes / probes / opened_at / half_open_at
+# 所有脚本返回 {allowed, state, failures, opened_at}
+
+_ACQUIRE_LUA = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local recovery = tonumber(ARGV[2])
+local max_probes = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+
+local state = redis.call('HGET', key, 'state') or 'CLOSED'
+local failures = tonumber(redis.call('HGET', key, 'failures') or '0')
+local opened_at = tonumber(redis.call('HGET', key, 'opened_at') or '0')
+
+if state == 'CLOSED' then
+    return {1, state, failures, opened_at}
+end
+
+if state == 'OPEN' then
+    if now - opened_at < recovery then
+        return {0, state, failures, opened_at}
+    end
+    state = 'HALF_OPEN'
+    redis.call('HSET', key, 'state', state, 'probes', 0, 'successes', 0, 'half_open_at', now)
+    redis.call('PEXPIRE', key, ttl)
+end
+
+-- 半开：探测名额集群共享，长时间未完成的探测视为失效并重新发放
+local probes = tonumber(redis.call('HGET', key, 'probes') or '0')
+if probes >= max_probes then
+    local half_open_at = tonumber(redis.call('HGET', key, 'half_open_at') or '0')
+    if now - half_open_at < recovery then
+        return {0, state, failures, opened_at}
+    end
+    redis.call('HSET', key, 'probes', 0, 'successes', 0, 'half_open_at', now)
+end
+redis.call('HINCRBY', key, 'probes', 1)
+return {1, state, failures, opened_at}
+"""
+
+_SUCCESS_LUA = """
+local key = KEYS[1]
+local max_probes = tonumber(ARGV[1])
+local ttl = tonumber(ARGV[2])
+
+local state = redis.call('HGET', key, 'state') or 'CLOSED'
+local opened_at = tonumber(redis.call('HGET', key, 'opened_at') or '0')
+
+if state == 'HALF_OPEN' then
+    local successes = redis.call('HINCRBY', key, 'successes', 1)
+    if successes >= max_probes then
+        redis.call('HSET', key, 'state', 'CLOSED', 'failures', 0, 'successes', 0, 'probes', 0)
+        state = 'CLOSED'
+    end
+elseif state == 'CLOSED' then
+    redis.call('HSET', key, 'failures', 0)
+end
+redis.call('PEXPIRE', key, ttl)
+return {1, state, tonumber(redis.call('HGET', key, 'failures') or '0'), opened_at}
+"""
+
+_FAILURE_LUA = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local threshold = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+
+local state = redis.call('HGET', key, 'state') or 'CLOSED'
+local failures = redis.call('HINCRBY', key, 'failures', 1)
+
+if state == 'HALF_OPEN' or (state == 'CLOSED' and failures >= threshold) then
+    state = 'OPEN'
+    redis.call('HSET', key, 'state', state, 'opened_at', now, 'successes', 0, 'probes', 0)
+end
+redis.call('PEXPIRE', key, ttl)
+return {1, state, failures, tonumber(redis.call('HGET', key, 'opened_at') or '0')}
+"""
 
 
 class CircuitBreaker:
-    """熔断器"""
+    """
+    分布式熔断器
+
+    状态保存在 Redis，通过 Lua 脚本原子转换，各进程共享同一熔断决策；
+    本地缓存短时间内的状态快照，关闭状态及未到恢复时间的打开状态无需访问 Redis；
+    半开状态的探测名额由 Redis 统一发放，集群内同时最多放行 half_open_max_calls 个探测请求
+    """
+
+    _scripts: dict[str, AsyncScript] = {}
 
     def __init__(
         self,
         name: str,
         failure_threshold: int | None = None,
         recovery_timeout: int | None = None,
-        half_open_max_calls: int = 3,
+        half_open_max_calls: int | None = None,
     ) -> None:
         """
         初始化熔断器
@@ -27,109 +115,125 @@ class CircuitBreaker:
         :param half_open_max_calls: 半开状态最大调用次数
         """
         self.name = name
-        self.failure_threshold = failure_threshold or getattr(settings, 'LLM_CIRCUIT_BREAKER_THRESHOLD', 5)
-        self.recovery_timeout = recovery_timeout or getattr(settings, 'LLM_CIRCUIT_BREAKER_TIMEOUT', 30)
-        self.half_open_max_calls = half_open_max_calls
+        self.failure_threshold = failure_threshold or settings.LLM_CIRCUIT_BREAKER_THRESHOLD
+        self.recovery_timeout = recovery_timeout or settings.LLM_CIRCUIT_BREAKER_TIMEOUT
+        self.half_open_max_calls = half_open_max_calls or settings.LLM_CIRCUIT_BREAKER_HALF_OPEN_MAX_CALLS
+        self.redis_key = f'{settings.LLM_CIRCUIT_BREAKER_REDIS_PREFIX}:{name}'
 
+        # 本地状态快照
         self._state = CircuitState.CLOSED
         self._failure_count = 0
-        self._success_count = 0
-        self._last_failure_time: float = 0
-        self._half_open_calls = 0
-        self._lock = Lock()
+        self._opened_at: float = 0
+        self._synced_at: float = 0
 
     @property
     def state(self) -> CircuitState:
-        """获取当前状态"""
-        with self._lock:
-            self._check_state_transition()
-            return self._state
+        """获取当前状态（本地快照）"""
+        return self._state
 
     @property
     def failure_count(self) -> int:
-        """获取失败计数"""
+        """获取失败计数（本地快照）"""
         return self._failure_count
 
-    def _check_state_transition(self) -> None:
-        """检查并执行状态转换"""
-        if self._state == CircuitState.OPEN and time.time() - self._last_failure_time > self.recovery_timeout:
-            self._state = CircuitState.HALF_OPEN
-            self._half_open_calls = 0
-            self._success_count = 0
+    @property
+    def _ttl_ms(self) -> int:
+        """Redis 状态过期时间（毫秒）"""
+        return max(self.recovery_timeout * 10, 3600) * 1000
+
+    @classmethod
+    def _get_script(cls, lua: str) -> AsyncScript:
+        """延迟注册 Lua 脚本"""
+        script = cls._scripts.get(lua)
+        if script is None:
+            script = cls._scripts[lua] = redis_client.register_script(lua)
+        return script
+
+    def _sync(self, result: list) -> bool:
+        """
+        同步 Redis 返回的状态到本地快照
 
-    def allow_request(self) -> bool:
+        :param result: Lua 脚本返回值
+        :return: 是否允许请求
+        """
+        allowed, state, failures, opened_at = result
+        self._state = CircuitState(state)
+        self._failure_count = int(failures)
+        self._opened_at = int(opened_at) / 1000
+        self._synced_at = time.time()
+        return bool(int(allowed))
+
+    async def allow_request(self) -> bool:
         """
         检查是否允许请求
 
         :return: True 允许，False 拒绝
         """
-        with self._lock:
-            self._check_state_transition()
-
+        now = time.time()
+        if now - self._synced_at < settings.LLM_CIRCUIT_BREAKER_LOCAL_TTL:
             if self._state == CircuitState.CLOSED:
                 return True
-
-            if self._state == CircuitState.OPEN:
+            if self._state == CircuitState.OPEN and now - self._opened_at < self.recovery_timeout:
                 return False
 
-            # HALF_OPEN 状态
-            if self._half_open_calls < self.half_open_max_calls:
-                self._half_open_calls += 1
-                return True
-
-            return False
+        try:
+            result = await self._get_script(_ACQUIRE_LUA)(
+                keys=[self.redis_key],
+                args=[int(now * 1000), self.recovery_timeout * 1000, self.half_open_max_calls, self._ttl_ms],
+            )
+        except Exception as e:
+            log.warning(f'[CircuitBreaker] {self.name} 状态读取失败: {e}')
+            return self._state != CircuitState.OPEN
+        return self._sync(result)
 
-    def record_success(self) -> None:
+    async def record_success(self) -> None:
         """记录成功调用"""
-        with self._lock:
-            if self._state == CircuitState.HALF_OPEN:
-                self._success_count += 1
-                if self._success_count >= self.half_open_max_calls:
-                    self._state = CircuitState.CLOSED
-                    self._failure_count = 0
-                    self._success_count = 0
-            elif self._state == CircuitState.CLOSED:
-                # 成功时重置失败计数
-                self._failure_count = 0
-
-    def record_failure(self) -> None:
+        # 快照有效期内确认关闭且无失败计数时无需更新；快照过期时其他节点可能已累计失败，需同步清零
+        fresh = time.time() - self._synced_at < settings.LLM_CIRCUIT_BREAKER_LOCAL_TTL
+        if fresh and self._state == CircuitState.CLOSED and self._failure_count == 0:
+            return
+        try:
+            result = await self._get_script(_SUCCESS_LUA)(
+                keys=[self.redis_key], args=[self.half_open_max_calls, self._ttl_ms]
+            )
+        except Exception as e:
+            log.warning(f'[CircuitBreaker] {self.name} 状态更新失败: {e}')
+            return
+        self._sync(result)
+
+    async def record_failure(self) -> None:
         """记录失败调用"""
-        with self._lock:
+        try:
+            result = await self._get_script(_FAILURE_LUA)(
+                keys=[self.redis_key], args=[int(time.time() * 1000), self.failure_threshold, self._ttl_ms]
+            )
+        except Exception as e:
+            log.warning(f'[CircuitBreaker] {self.name} 状态更新失败: {e}')
             self._failure_count += 1
-            self._last_failure_time = time.time()
+            return
+        self._sync(result)
 
-            if self._state == CircuitState.HALF_OPEN:
-                # 半开状态下失败，立即回到打开状态
-                self._state = CircuitState.OPEN
-                self._success_count = 0
-            elif self._state == CircuitState.CLOSED:
-                if self._failure_count >= self.failure_threshold:
-                    self._state = CircuitState.OPEN
-
-    def reset(self) -> None:
+    async def reset(self) -> None:
         """重置熔断器"""
-        with self._lock:
-            self._state = CircuitState.CLOSED
-            self._failure_count = 0
-            self._success_count = 0
-            self._last_failure_time = 0
-            self._half_open_calls = 0
+        await redis_client.delete(self.redis_key)
+        self._state = CircuitState.CLOSED
+        self._failure_count = 0
+        self._opened_at = 0
+        self._synced_at = 0
 
     def get_status(self) -> dict:
-        """获取熔断器状态"""
-        with self._lock:
-            self._check_state_transition()
-            return {
-                'name': self.name,
-                'state': self._state.value,
-                'failure_count': self._failure_count,
-                'failure_threshold': self.failure_threshold,
-                'recovery_timeout': self.recovery_timeout,
-                'last_failure_time': self._last_failure_time,
-                'time_until_recovery': max(0, self.recovery_timeout - (time.time() - self._last_failure_time))
-                if self._state == CircuitState.OPEN
-                else 0,
-            }
+        """获取熔断器状态（本地快照）"""
+        return {
+            'name': self.name,
+            'state': self._state.value,
+            'failure_count': self._failure_count,
+            'failure_threshold': self.failure_threshold,
+            'recovery_timeout': self.recovery_timeout,
+            'last_failure_time': self._opened_at,
+            'time_until_recovery': max(0, self.recovery_timeout - (time.time() - self._opened_at))
+            if self._state == CircuitState.OPEN
+            else 0,
+        }
 
 
 class CircuitBreakerManager:
@@ -137,7 +241,6 @@ class CircuitBreakerManager:
 
     def __init__(self) -> None:
         self._breakers: dict[str, CircuitBreaker] = {}
-        self._lock = Lock()
 
     def get_breaker(self, name: str) -> CircuitBreaker:
         """
@@ -146,21 +249,19 @@ class CircuitBreakerManager:
         :param name: 熔断器名称
         :return: 熔断器实例
         """
-        with self._lock:
-            if name not in self._breakers:
-                self._breakers[name] = CircuitBreaker(name)
-            return self._breakers[name]
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = self._breakers[name] = CircuitBreaker(name)
+        return breaker
 
     def get_all_status(self) -> list[dict]:
         """获取所有熔断器状态"""
-        with self._lock:
-            return [breaker.get_status() for breaker in self._breakers.values()]
+        return [breaker.get_status() for breaker in self._breakers.values()]
 
-    def reset_all(self) -> None:
+    async def reset_all(self) -> None:
         """重置所有熔断器"""
-        with self._lock:
-            for breaker in self._breakers.values():
-                breaker.reset()
+        for breaker in self._breakers.values():
+            await breaker.reset()
 
 
 # 创建全局熔断器管理器
@@ -0,0 +1,318 @@
+"""LLM 请求调度器"""
+
+import asyncio
+import time
+
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import Any, Generic, TypeVar
+
+from backend.app.llm.core.balancer import load_balancer
+from backend.app.llm.core.circuit_breaker import CircuitBreaker, circuit_breaker_manager
+from backend.app.llm.core.routing import ModelRoute
+from backend.common.log import log
+from backend.core.conf import settings
+
+T = TypeVar('T')
+
+# 请求本身无效的上游状态码，换用其他路由也会失败
+_REQUEST_ERROR_STATUS_CODES = frozenset({400, 413, 422})
+
+
+def is_request_error(error: BaseException | None) -> bool:
+    """
+    是否为请求本身无效导致的上游错误（LiteLLM 异常及原生传输异常均通过 status_code 表示）
+
+    此类错误不重试、不故障转移，也不计入熔断
+
+    :param error: 异常
+    :return:
+    """
+    return getattr(error, 'status_code', None) in _REQUEST_ERROR_STATUS_CODES
+
+
+class DispatchUnavailableError(Exception):
+    """无可用路由"""
+
+    def __init__(self, provider_name: str) -> None:
+        super().__init__(f'Provider unavailable: {provider_name}')
+        self.provider_name = provider_name
+
+
+class LatencyTracker:
+    """路由延迟采样（用于计算对冲等待时间）"""
+
+    def __init__(self) -> None:
+        self._samples: dict[int, deque[float]] = {}
+
+    def record(self, model_id: int, latency_ms: float) -> None:
+        """
+        记录延迟
+
+        :param model_id: 模型 ID
+        :param latency_ms: 延迟（毫秒）
+        :return:
+        """
+        samples = self._samples.get(model_id)
+        if samples is None:
+            samples = self._samples[model_id] = deque(maxlen=settings.LLM_HEDGE_LATENCY_WINDOW)
+        samples.append(latency_ms)
+
+    def p95(self, model_id: int) -> float | None:
+        """
+        获取 P95 延迟
+
+        :param model_id: 模型 ID
+        :return: 样本不足时返回 None
+        """
+        samples = self._samples.get(model_id)
+        if not samples or len(samples) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class _DispatchState(Generic[T]):
+    """单次调度的状态"""
+
+    def __init__(
+        self,
+        route: ModelRoute,
+        plan: list[ModelRoute],
+        call: Callable[[ModelRoute], Awaitable[T]],
+        *,
+        discard: Callable[[T], Awaitable[Any]] | None,
+        hold: bool,
+    ) -> None:
+        self.plan = plan
+        self.call = call
+        self.discard = discard
+        self.hold = hold
+        self.timeout = route.policy.timeout_seconds
+        self.deadline = time.monotonic() + settings.LLM_DISPATCH_DEADLINE_SECONDS
+        self.pending: dict[asyncio.Task, ModelRoute] = {}
+        self.last_error: BaseException | None = None
+
+    def remaining(self) -> float:
+        """距总时限的剩余秒数"""
+        return self.deadline - time.monotonic()
+
+
+class RequestDispatcher:
+    """
+    请求调度器
+
+    按模型组选路策略排列候选路由，并按重试次数依次尝试，每次尝试受超时限制，全部尝试受总时限限制；
+    启用对冲时，当前尝试超过 P95 延迟仍未完成则并行发起下一个无进行中请求的供应商路由，取最先成功的结果并取消其余请求
+    """
+
+    def __init__(self) -> None:
+        self.latency = LatencyTracker()
+
+    @staticmethod
+    def _get_breaker(route: ModelRoute) -> CircuitBreaker:
+        return circuit_breaker_manager.get_breaker(route.provider.name)
+
+    @staticmethod
+    def _plan(route: ModelRoute) -> list[ModelRoute]:
+        """
+        生成尝试顺序
+
+        :param route: 首选路由
+        :return:
+        """
+        candidates = load_balancer.order(route)
+        attempts = max(route.policy.retry_count, 0) + 1
+        return [candidates[i % len(candidates)] for i in range(max(attempts, len(candidates)))]
+
+    def _hedge_delay(self, route: ModelRoute) -> float:
+        """
+        获取对冲等待时间（秒）
+
+        :param route: 当前路由
+        :return:
+        """
+        p95 = self.latency.p95(route.model_config.id)
+        return (p95 if p95 is not None else settings.LLM_HEDGE_DEFAULT_DELAY_MS) / 1000
+
+    async def _attempt(
+        self,
+        route: ModelRoute,
+        breaker: CircuitBreaker,
+        call: Callable[[ModelRoute], Awaitable[T]],
+        timeout: float | None,
+        *,
+        hold: bool,
+    ) -> T:
+        """
+        执行单次尝试
+
+        :param route: 路由
+        :param breaker: 熔断器
+        :param call: 调用函数
+        :param timeout: 超时秒数
+        :param hold: 成功后是否保持进行中计数，由调用方结束
+        :return:
+        """
+        model_id = route.model_config.id
+        load_balancer.begin(model_id)
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(call(route), timeout)
+        except asyncio.TimeoutError:
+            load_balancer.end(model_id, latency_ms=(time.perf_counter() - start) * 1000, error=True)
+            await breaker.record_failure()
+            raise TimeoutError(f'{route.provider.name} timed out after {timeout}s') from None
+        except Exception as e:
+            request_error = is_request_error(e)
+            load_balancer.end(model_id, latency_ms=(time.perf_counter() - start) * 1000, error=not request_error)
+            if not request_error:
+                await breaker.record_failure()
+            raise
+        except BaseException:
+            # 被对冲取消，不计入延迟及错误率
+            load_balancer.end(model_id)
+            raise
+        latency_ms = (time.perf_counter() - start) * 1000
+        load_balancer.first_byte(model_id, latency_ms)
+        if not hold:
+            load_balancer.end(model_id, latency_ms=latency_ms)
+        await breaker.record_success()
+        self.latency.record(model_id, latency_ms)
+        return result
+
+    @staticmethod
+    async def _discard(
+        route: ModelRoute, result: T, discard: Callable[[T], Awaitable[Any]] | None, *, hold: bool
+    ) -> None:
+        """
+        丢弃未被采用的成功结果
+
+        :param route: 路由
+        :param result: 结果
+        :param discard: 丢弃回调
+        :param hold: 是否保持了进行中计数
+        :return:
+        """
+        if hold:
+            load_balancer.end(route.model_config.id)
+        if discard is not None:
+            await discard(result)
+
+    async def _launch(self, state: _DispatchState[T]) -> ModelRoute | None:
+        """
+        按尝试顺序发起下一路由，跳过熔断及已有进行中请求的供应商
+
+        :param state: 调度状态
+        :return: 发起的路由，无可用路由或已超过总时限时返回 None
+        """
+        inflight = {candidate.provider.id for candidate in state.pending.values()}
+        # 跳过的路由保留在尝试顺序中，供进行中请求失败后重试
+        for candidate in [candidate for candidate in state.plan if candidate.provider.id not in inflight]:
+            remaining = state.remaining()
+            if remaining <= 0:
+                return None
+            state.plan.remove(candidate)
+            breaker = self._get_breaker(candidate)
+            if await breaker.allow_request():
+                timeout = min(state.timeout, remaining) if state.timeout else remaining
+                task = asyncio.create_task(self._attempt(candidate, breaker, state.call, timeout, hold=state.hold))
+                state.pending[task] = candidate
+                return candidate
+        return None
+
+    async def _collect(self, state: _DispatchState[T], done: set[asyncio.Task]) -> tuple[ModelRoute, T] | None:
+        """
+        收集已完成的尝试，取首个成功结果，其余成功结果交由 discard 释放
+
+        :param state: 调度状态
+        :param done: 已完成的任务
+        :return: 成功的路由及结果，全部失败时返回 None
+        :raises: 请求本身无效时直接抛出上游错误
+        """
+        winner = None
+        request_error = None
+        for task in done:
+            candidate = state.pending.pop(task)
+            if task.exception() is None:
+                if winner is None:
+                    winner = candidate, task.result()
+                else:
+                    await self._discard(candidate, task.result(), state.discard, hold=state.hold)
+            else:
+                state.last_error = task.exception()
+                log.warning(f'[LLM Dispatch] {candidate.model_config.model_name} 调用失败: {state.last_error}')
+                if is_request_error(state.last_error):
+                    request_error = state.last_error
+        if winner is None and request_error is not None:
+            raise request_error
+        return winner
+
+    async def _cancel(self, state: _DispatchState[T]) -> None:
+        """
+        取消未完成的尝试，已成功但未被采用的结果交由 discard 释放
+
+        :param state: 调度状态
+        :return:
+        """
+        if not state.pending:
+            return
+        for task in state.pending:
+            task.cancel()
+        results = await asyncio.gather(*state.pending, return_exceptions=True)
+        for candidate, result in zip(state.pending.values(), results):
+            if not isinstance(result, BaseException):
+                await self._discard(candidate, result, state.discard, hold=state.hold)
+        state.pending.clear()
+
+    async def dispatch(
+        self,
+        route: ModelRoute,
+        call: Callable[[ModelRoute], Awaitable[T]],
+        *,
+        discard: Callable[[T], Awaitable[Any]] | None = None,
+        hold: bool = False,
+    ) -> tuple[ModelRoute, T]:
+        """
+        调度请求
+
+        :param route: 首选路由
+        :param call: 调用函数，接收路由并返回结果
+        :param discard: 对冲模式下丢弃多余成功结果的回调（如关闭流）
+        :param hold: 成功后保持路由进行中计数（如流式响应），调用方结束时需调用 load_balancer.end
+        :return: 实际使用的路由及结果
+        """
+        state = _DispatchState(route, self._plan(route), call, discard=discard, hold=hold)
+        current = await self._launch(state)
+        if current is None:
+            raise DispatchUnavailableError(route.provider.name)
+
+        try:
+            while state.pending:
+                delay = None
+                if route.policy.hedge_enabled and current is not None:
+                    delay = min(self._hedge_delay(current), max(state.remaining(), 0))
+                done, _ = await asyncio.wait(state.pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+
+                # 对冲：等待超时仍未完成，并行发起下一路由
+                if not done:
+                    current = await self._launch(state)
+                    continue
+
+                winner = await self._collect(state, done)
+                if winner is not None:
+                    return winner
+
+                # 失败：立即尝试下一路由
+                if not state.pending:
+                    current = await self._launch(state)
+        finally:
+            await self._cancel(state)
+
+        if state.last_error is not None:
+            raise state.last_error
+        raise DispatchUnavailableError(route.provider.name)
+
+
+# 创建全局请求调度器实例
+request_dispatcher = RequestDispatcher()
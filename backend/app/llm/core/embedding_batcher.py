@@ -0,0 +1,174 @@
+"""Embedding 请求微批处理"""
+
+import asyncio
+import dataclasses
+
+from collections.abc import Awaitable, Callable, Hashable
+
+from backend.app.llm.core.dispatcher import is_request_error
+from backend.common.prometheus.instruments import PROMETHEUS_APP_NAME, PROMETHEUS_LLM_EMBEDDING_BATCH_SIZE_HISTOGRAM
+from backend.core.conf import settings
+
+
+@dataclasses.dataclass
+class EmbeddingBatchResult:
+    """上游批量调用结果"""
+
+    model: str
+    vectors: list[list[float]]
+    prompt_tokens: int
+
+
+@dataclasses.dataclass
+class _Waiter:
+    """等待结果的请求"""
+
+    start: int
+    end: int
+    weight: int
+    future: asyncio.Future
+
+
+@dataclasses.dataclass
+class _PendingBatch:
+    """待发送的批次"""
+
+    call: Callable[[list[str]], Awaitable[EmbeddingBatchResult]]
+    inputs: list[str] = dataclasses.field(default_factory=list)
+    waiters: list[_Waiter] = dataclasses.field(default_factory=list)
+    timer: asyncio.TimerHandle | None = None
+
+
+class EmbeddingBatcher:
+    """
+    Embedding 请求微批处理器
+
+    同一路由及参数的并发请求在等待窗口内合并，窗口结束或输入数达到上限时作为一次上游调用发送，
+    结果按输入位置拆分返回；上游用量按各请求预估 tokens 的比例分摊。
+    合并后的请求因请求无效被上游拒绝时，各请求单独重发，错误只返回给输入无效的请求
+    """
+
+    def __init__(self) -> None:
+        self._pending: dict[Hashable, _PendingBatch] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def embed(
+        self,
+        key: Hashable,
+        inputs: list[str],
+        *,
+        weight: int,
+        call: Callable[[list[str]], Awaitable[EmbeddingBatchResult]],
+    ) -> EmbeddingBatchResult:
+        """
+        获取输入的向量
+
+        :param key: 合并键，相同键的请求才会合并
+        :param inputs: 输入文本
+        :param weight: 预估输入 tokens（用于分摊用量）
+        :param call: 上游批量调用函数，同一批次使用首个请求的调用函数
+        :return: 本请求的向量及分摊的用量
+        """
+        max_size = settings.LLM_EMBEDDING_BATCH_MAX_SIZE
+        if not settings.LLM_EMBEDDING_BATCH_ENABLED or len(inputs) >= max_size:
+            return await call(inputs)
+
+        batch = self._pending.get(key)
+        if batch is not None and len(batch.inputs) + len(inputs) > max_size:
+            self._flush(key, batch)
+            batch = None
+        if batch is None:
+            batch = self._pending[key] = _PendingBatch(call=call)
+            batch.timer = asyncio.get_running_loop().call_later(
+                settings.LLM_EMBEDDING_BATCH_WINDOW_MS / 1000, self._flush, key, batch
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        start = len(batch.inputs)
+        batch.inputs.extend(inputs)
+        batch.waiters.append(_Waiter(start=start, end=len(batch.inputs), weight=weight, future=future))
+        if len(batch.inputs) >= max_size:
+            self._flush(key, batch)
+        return await future
+
+    def _flush(self, key: Hashable, batch: _PendingBatch) -> None:
+        """
+        发送批次
+
+        :param key: 合并键
+        :param batch: 批次
+        :return:
+        """
+        if self._pending.get(key) is batch:
+            del self._pending[key]
+        if batch.timer is not None:
+            batch.timer.cancel()
+            batch.timer = None
+        task = asyncio.create_task(self._execute(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    async def _execute_single(batch: _PendingBatch, waiter: _Waiter) -> None:
+        """
+        单独发送一个请求的输入
+
+        :param batch: 批次
+        :param waiter: 等待结果的请求
+        :return:
+        """
+        try:
+            result = await batch.call(batch.inputs[waiter.start : waiter.end])
+        except Exception as e:
+            if not waiter.future.done():
+                waiter.future.set_exception(e)
+            return
+        if not waiter.future.done():
+            waiter.future.set_result(
+                EmbeddingBatchResult(
+                    model=result.model, vectors=result.vectors, prompt_tokens=result.prompt_tokens or waiter.weight
+                )
+            )
+
+    @staticmethod
+    async def _execute(batch: _PendingBatch) -> None:
+        """
+        执行上游调用并分发结果
+
+        :param batch: 批次
+        :return:
+        """
+        # 等待期间全部取消的请求不再发送
+        waiters = [waiter for waiter in batch.waiters if not waiter.future.done()]
+        if not waiters:
+            return
+        PROMETHEUS_LLM_EMBEDDING_BATCH_SIZE_HISTOGRAM.labels(app_name=PROMETHEUS_APP_NAME).observe(len(batch.inputs))
+        try:
+            result = await batch.call(batch.inputs)
+        except Exception as e:
+            # 单个请求的无效输入不应导致同批其他请求失败
+            if is_request_error(e) and len(waiters) > 1:
+                await asyncio.gather(*(EmbeddingBatcher._execute_single(batch, waiter) for waiter in waiters))
+                return
+            for waiter in waiters:
+                if not waiter.future.done():
+                    waiter.future.set_exception(e)
+            return
+
+        total_weight = sum(waiter.weight for waiter in batch.waiters) or 1
+        for waiter in waiters:
+            if waiter.future.done():
+                continue
+            waiter.future.set_result(
+                EmbeddingBatchResult(
+                    model=result.model,
+                    vectors=result.vectors[waiter.start : waiter.end],
+                    prompt_tokens=round(result.prompt_tokens * waiter.weight / total_weight)
+                    if result.prompt_tokens
+                    else waiter.weight,
+                )
+            )
+
+
+# 创建全局 Embedding 微批处理器实例
+embedding_batcher = EmbeddingBatcher()
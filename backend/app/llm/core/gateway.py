@@ -2,35 +2,69 @@
 @author Ysf
 """
 
-import json
+import asyncio
+import base64
+import contextlib
+import functools
+import operator
+import struct
 import time
 
 from collections.abc import AsyncIterator
 from typing import Any
 
+from msgspec import json
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.app.llm.core.balancer import load_balancer
 from backend.app.llm.core.circuit_breaker import CircuitBreaker, circuit_breaker_manager
-from backend.app.llm.core.encryption import key_encryption
+from backend.app.llm.core.dispatcher import DispatchUnavailableError, is_request_error, request_dispatcher
+from backend.app.llm.core.embedding_batcher import EmbeddingBatchResult, embedding_batcher
 from backend.app.llm.core.rate_limiter import rate_limiter
+from backend.app.llm.core.response_cache import (
+    CachedCompletion,
+    CompletionRecorder,
+    request_digest,
+    response_cache,
+)
+from backend.app.llm.core.routing import ModelRoute, llm_routing_table
+from backend.app.llm.core.singleflight import singleflight
+from backend.app.llm.core.stream import (
+    StreamDelta,
+    StreamError,
+    StreamEvent,
+    StreamStart,
+    StreamUsage,
+    decode_event,
+    encode_event,
+    parse_tool_calls,
+)
+from backend.app.llm.core.tokenizer import token_counter
+from backend.app.llm.core.transport import native_transport
 from backend.app.llm.core.usage_tracker import RequestTimer, usage_tracker
 from backend.app.llm.crud.crud_model_config import model_config_dao
-from backend.app.llm.crud.crud_model_group import model_group_dao
 from backend.app.llm.crud.crud_provider import provider_dao
+from backend.app.llm.enums import ModelType, RateLimitAlgorithm, UsageLogStatus
 from backend.app.llm.model.model_config import ModelConfig
 from backend.app.llm.model.provider import ModelProvider
 from backend.app.llm.schema.proxy import (
     ChatCompletionChoice,
-    ChatCompletionChunk,
-    ChatCompletionChunkChoice,
-    ChatCompletionChunkDelta,
     ChatCompletionRequest,
     ChatCompletionResponse,
     ChatCompletionUsage,
     ChatMessage,
+    EmbeddingData,
+    EmbeddingRequest,
+    EmbeddingResponse,
+    EmbeddingUsage,
 )
 from backend.common.exception.errors import HTTPError
 from backend.common.log import log
+from backend.common.prometheus.instruments import (
+    PROMETHEUS_APP_NAME,
+    PROMETHEUS_LLM_STREAM_ABANDONED_COUNTER,
+    PROMETHEUS_LLM_STREAM_ABANDONED_TOKENS_COUNTER,
+)
 
 
 class LLMGatewayError(HTTPError):
@@ -59,6 +93,7 @@ class LLMGateway:
 
     def __init__(self) -> None:
         self._litellm = None
+        self._background_tasks: set[asyncio.Task] = set()
 
     @property
     def litellm(self):
@@ -88,39 +123,74 @@ class LLMGateway:
         """获取熔断器"""
         return circuit_breaker_manager.get_breaker(provider_name)
 
-    async def _get_fallback_models(
-        self, db: AsyncSession, model_type: str, exclude_model_id: int
-    ) -> list[tuple[ModelConfig, ModelProvider]]:
-        """获取故障转移模型列表"""
-        group = await model_group_dao.get_by_type(db, model_type)
-        if not group or not group.fallback_enabled:
-            return []
-
-        fallback_models = []
-        for model_id in group.model_ids:
-            if model_id == exclude_model_id:
-                continue
-            model = await model_config_dao.get(db, model_id)
-            if model and model.enabled:
-                provider = await provider_dao.get(db, model.provider_id)
-                if provider and provider.enabled:
-                    breaker = self._get_circuit_breaker(provider.name)
-                    if breaker.allow_request():
-                        fallback_models.append((model, provider))
-
-        return fallback_models
-
-    def _build_litellm_params(
-        self,
-        model_config: ModelConfig,
-        provider: ModelProvider,
-        request: ChatCompletionRequest,
-    ) -> dict[str, Any]:
+    async def resolve_route(self, db: AsyncSession, model_name: str) -> ModelRoute:
+        """
+        解析模型路由
+
+        优先命中进程内路由表，未命中时回源数据库；调用方应在发起上游调用前释放数据库会话
+
+        :param db: 数据库会话
+        :param model_name: 模型名称
+        :return:
+        """
+        route = llm_routing_table.get(model_name)
+        if route is not None:
+            return route
+        model_config = await self._get_model_config(db, model_name)
+        provider = await self._get_provider(db, model_config.provider_id)
+        return ModelRoute.build(model_config, provider)
+
+    async def _open_stream(self, route: ModelRoute, *, request: ChatCompletionRequest) -> tuple[Any, Any]:
+        """
+        发起流式请求并等待首个 chunk
+
+        :param route: 路由
+        :param request: 请求参数
+        :return: 流及首个 chunk
+        """
+        params = self._build_litellm_params(route, request)
+        params['stream'] = True
+        # 要求供应商在最后一个 chunk 返回精确用量，不支持的供应商由 LiteLLM 丢弃该参数
+        params['stream_options'] = {'include_usage': True}
+        if native_transport.supports(route):
+            stream = native_transport.stream(route, params)
+        else:
+            stream = aiter(await self.litellm.acompletion(**params))
+        return stream, await anext(stream, None)
+
+    @staticmethod
+    async def _close_stream(opened: tuple[Any, Any]) -> None:
+        """
+        关闭未被采用的流
+
+        :param opened: 流及首个 chunk
+        :return:
+        """
+        aclose = getattr(opened[0], 'aclose', None)
+        if aclose is not None:
+            with contextlib.suppress(Exception):
+                await aclose()
+
+    @staticmethod
+    async def _iter_stream(stream: Any, first_chunk: Any) -> AsyncIterator[Any]:
+        """
+        从首个 chunk 开始迭代流
+
+        :param stream: 流
+        :param first_chunk: 首个 chunk
+        :return:
+        """
+        if first_chunk is None:
+            return
+        yield first_chunk
+        async for chunk in stream:
+            yield chunk
+
+    def _build_litellm_params(self, route: ModelRoute, request: ChatCompletionRequest) -> dict[str, Any]:
         """构建 LiteLLM 调用参数"""
-        # 解密 API Key
-        api_key = None
-        if provider.api_key_encrypted:
-            api_key = key_encryption.decrypt(provider.api_key_encrypted)
+        model_config = route.model_config
+        provider = route.provider
+        api_key = route.api_key
 
         # 构建消息列表
         messages = [msg.model_dump(exclude_none=True) for msg in request.messages]
@@ -174,6 +244,244 @@ class LLMGateway:
 
         return params
 
+    @staticmethod
+    def _estimate_prompt_tokens(request: ChatCompletionRequest) -> int:
+        """预估输入 tokens（用于 TPM 预占及流式用量兜底），预估失败不影响请求"""
+        try:
+            return token_counter.count_messages(
+                request.model, [msg.model_dump(exclude_none=True) for msg in request.messages]
+            )
+        except Exception as e:
+            log.warning(f'[LLM Gateway] 输入 tokens 预估失败: {e}')
+            return 0
+
+    @staticmethod
+    def _upstream_error(error: Exception) -> LLMGatewayError:
+        """
+        转换上游调用异常
+
+        :param error: 异常
+        :return:
+        """
+        if isinstance(error, DispatchUnavailableError):
+            return ProviderUnavailableError(error.provider_name)
+        if is_request_error(error):
+            return LLMGatewayError(str(error), code=error.status_code)
+        return LLMGatewayError(str(error))
+
+    @staticmethod
+    def _coalesce_key(kind: str, request: ChatCompletionRequest, user_id: int) -> str | None:
+        """
+        获取请求合并键，仅合并同一用户的确定性请求（temperature=0 或指定 seed）
+
+        :param kind: 调用类型
+        :param request: 请求参数
+        :param user_id: 用户 ID
+        :return: 不合并时返回 None
+        """
+        if request.temperature != 0 and request.seed is None:
+            return None
+        return f'{kind}:{user_id}:{request_digest(request)}'
+
+    @staticmethod
+    async def _track_cache_hit(
+        route: ModelRoute,
+        cached: CachedCompletion,
+        *,
+        request_id: str,
+        user_id: int,
+        api_key_id: int,
+        reserved_tokens: int,
+        tpm_limit: int,
+        rate_limit_algorithm: str,
+        latency_ms: int,
+        is_streaming: bool,
+        ip_address: str | None,
+    ) -> None:
+        """
+        记录响应缓存命中：释放 TPM 预占额度，按零成本记录用量
+
+        命中不调用上游，不计入 TPM 及日/月 Token 配额，用量日志仍记录缓存结果的 tokens 并标记为缓存命中
+
+        :param route: 模型路由
+        :param cached: 缓存结果
+        :param request_id: 请求 ID
+        :param user_id: 用户 ID
+        :param api_key_id: API Key ID
+        :param reserved_tokens: 预占 tokens
+        :param tpm_limit: TPM 限制
+        :param rate_limit_algorithm: 限流算法
+        :param latency_ms: 延迟(毫秒)
+        :param is_streaming: 是否流式
+        :param ip_address: IP 地址
+        :return:
+        """
+        await rate_limiter.reconcile_tokens(
+            api_key_id,
+            reserved_tokens=reserved_tokens,
+            actual_tokens=0,
+            tpm_limit=tpm_limit,
+            algorithm=rate_limit_algorithm,
+            request_id=request_id,
+        )
+        await usage_tracker.track_success(
+            user_id=user_id,
+            api_key_id=api_key_id,
+            model_id=route.model_config.id,
+            provider_id=route.provider.id,
+            request_id=request_id,
+            model_name=route.model_config.model_name,
+            input_tokens=cached.input_tokens,
+            output_tokens=cached.output_tokens,
+            input_cost_per_1k=route.model_config.input_cost_per_1k,
+            output_cost_per_1k=route.model_config.output_cost_per_1k,
+            latency_ms=latency_ms,
+            is_streaming=is_streaming,
+            ip_address=ip_address,
+            cache_hit=True,
+        )
+
+    def _track_abandoned(
+        self,
+        route: ModelRoute,
+        *,
+        request_id: str,
+        user_id: int,
+        api_key_id: int,
+        reserved_tokens: int,
+        input_tokens: int,
+        output_tokens: int,
+        tpm_limit: int,
+        rate_limit_algorithm: str,
+        latency_ms: int,
+        ip_address: str | None,
+    ) -> None:
+        """
+        记录客户端中途断开的流式请求：按已生成内容计费并以 CANCELLED 状态记录用量
+
+        断开时上游尚未返回用量，输入 tokens 只能使用本地预估值，上游未开始响应时不计输入
+
+        :param route: 模型路由
+        :param request_id: 请求 ID
+        :param user_id: 用户 ID
+        :param api_key_id: API Key ID
+        :param reserved_tokens: 预占 tokens
+        :param input_tokens: 预估输入 tokens，上游未开始响应时为 0
+        :param output_tokens: 断开前已生成的输出 tokens
+        :param tpm_limit: TPM 限制
+        :param rate_limit_algorithm: 限流算法
+        :param latency_ms: 延迟(毫秒)
+        :param ip_address: IP 地址
+        :return:
+        """
+        model_config = route.model_config
+        labels = {'app_name': PROMETHEUS_APP_NAME, 'model': model_config.model_name}
+        PROMETHEUS_LLM_STREAM_ABANDONED_COUNTER.labels(**labels).inc()
+        PROMETHEUS_LLM_STREAM_ABANDONED_TOKENS_COUNTER.labels(**labels).inc(output_tokens)
+
+        async def track() -> None:
+            try:
+                await usage_tracker.track_success(
+                    user_id=user_id,
+                    api_key_id=api_key_id,
+                    model_id=model_config.id,
+                    provider_id=route.provider.id,
+                    request_id=request_id,
+                    model_name=model_config.model_name,
+                    input_tokens=input_tokens,
+                    output_tokens=output_tokens,
+                    input_cost_per_1k=model_config.input_cost_per_1k,
+                    output_cost_per_1k=model_config.output_cost_per_1k,
+                    latency_ms=latency_ms,
+                    is_streaming=True,
+                    ip_address=ip_address,
+                    status=UsageLogStatus.CANCELLED,
+                )
+                await rate_limiter.consume_tokens(api_key_id, input_tokens + output_tokens)
+                await rate_limiter.reconcile_tokens(
+                    api_key_id,
+                    reserved_tokens=reserved_tokens,
+                    actual_tokens=input_tokens + output_tokens,
+                    tpm_limit=tpm_limit,
+                    algorithm=rate_limit_algorithm,
+                    request_id=request_id,
+                )
+            except Exception as e:
+                log.error(f'[LLM Gateway] 断开请求用量记录失败: {e}')
+
+        self._spawn(track())
+
+    def _spawn(self, coro: Any) -> None:
+        """
+        创建后台任务并持有引用，避免任务被提前回收
+
+        :param coro: 协程
+        :return:
+        """
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _track_stream_success(
+        self,
+        route: ModelRoute,
+        *,
+        request_id: str,
+        user_id: int,
+        api_key_id: int,
+        reserved_tokens: int,
+        input_tokens: int,
+        output_tokens: int,
+        tpm_limit: int,
+        rate_limit_algorithm: str,
+        latency_ms: int,
+        ip_address: str | None,
+    ) -> None:
+        """
+        记录流式请求成功用量并结算 TPM 预占额度
+
+        :param route: 模型路由
+        :param request_id: 请求 ID
+        :param user_id: 用户 ID
+        :param api_key_id: API Key ID
+        :param reserved_tokens: 预占 tokens
+        :param input_tokens: 输入 tokens
+        :param output_tokens: 输出 tokens
+        :param tpm_limit: TPM 限制
+        :param rate_limit_algorithm: 限流算法
+        :param latency_ms: 延迟(毫秒)
+        :param ip_address: IP 地址
+        :return:
+        """
+        model_config = route.model_config
+        try:
+            await usage_tracker.track_success(
+                user_id=user_id,
+                api_key_id=api_key_id,
+                model_id=model_config.id,
+                provider_id=route.provider.id,
+                request_id=request_id,
+                model_name=model_config.model_name,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                input_cost_per_1k=model_config.input_cost_per_1k,
+                output_cost_per_1k=model_config.output_cost_per_1k,
+                latency_ms=latency_ms,
+                is_streaming=True,
+                ip_address=ip_address,
+            )
+            await rate_limiter.consume_tokens(api_key_id, input_tokens + output_tokens)
+            await rate_limiter.reconcile_tokens(
+                api_key_id,
+                reserved_tokens=reserved_tokens,
+                actual_tokens=input_tokens + output_tokens,
+                tpm_limit=tpm_limit,
+                algorithm=rate_limit_algorithm,
+                request_id=request_id,
+            )
+        except Exception as e:
+            log.error(f'[LLM Gateway] 流式请求用量记录失败: {e}')
+
     def _build_model_name(self, model_name: str, provider_type: str, force_prefix: bool = False) -> str:
         """
         根据 provider_type 构建 LiteLLM 模型名称
@@ -200,9 +508,110 @@ class LLMGateway:
         # 其他供应商或强制前缀时，添加 provider_type 前缀
         return f'{provider_type}/{model_name}'
 
+    @staticmethod
+    def _build_choices(response: Any) -> list[ChatCompletionChoice]:
+        """
+        构建响应选项
+
+        :param response: LiteLLM 响应
+        :return:
+        """
+        choices = []
+        for i, choice in enumerate(response.get('choices', [])):
+            message = choice.get('message', {})
+            choices.append(
+                ChatCompletionChoice(
+                    index=i,
+                    message=ChatMessage(
+                        role=message.get('role', 'assistant'),
+                        content=message.get('content'),
+                        tool_calls=message.get('tool_calls'),
+                    ),
+                    finish_reason=choice.get('finish_reason'),
+                )
+            )
+        return choices
+
+    async def _acompletion(self, route: ModelRoute, *, request: ChatCompletionRequest) -> Any:
+        """
+        发起非流式请求，OpenAI 兼容供应商优先使用原生传输
+
+        :param route: 路由
+        :param request: 请求参数
+        :return:
+        """
+        params = self._build_litellm_params(route, request)
+        if native_transport.supports(route):
+            return await native_transport.completion(route, params)
+        return await self.litellm.acompletion(**params)
+
+    async def _complete_upstream(
+        self,
+        route: ModelRoute,
+        request: ChatCompletionRequest,
+        *,
+        cache_key: str | None,
+        cache_ttl: int,
+    ) -> tuple[str, Any]:
+        """
+        上游非流式调用，由请求合并层共享给所有等待者
+
+        :param route: 请求的模型路由
+        :param request: 请求参数
+        :param cache_key: 响应缓存键
+        :param cache_ttl: 响应缓存秒数
+        :return: 实际使用的模型名称及 LiteLLM 响应
+        """
+        route, response = await request_dispatcher.dispatch(
+            route, functools.partial(self._acompletion, request=request)
+        )
+        model_name = route.model_config.model_name
+
+        # 写入响应缓存（多模态内容不缓存）
+        choices = self._build_choices(response)
+        if cache_key is not None and len(choices) == 1 and not isinstance(choices[0].message.content, list):
+            usage = response.get('usage', {})
+            await response_cache.set(
+                cache_key,
+                CachedCompletion(
+                    model=model_name,
+                    content=choices[0].message.content,
+                    tool_calls=choices[0].message.tool_calls,
+                    finish_reason=choices[0].finish_reason,
+                    input_tokens=usage.get('prompt_tokens', 0),
+                    output_tokens=usage.get('completion_tokens', 0),
+                ),
+                cache_ttl,
+            )
+        return model_name, response
+
+    @staticmethod
+    def _encode_completion(result: tuple[str, Any]) -> str:
+        """
+        序列化上游响应（集群请求合并）
+
+        :param result: 模型名称及 LiteLLM 响应
+        :return:
+        """
+        model_name, response = result
+        if hasattr(response, 'model_dump'):
+            response = response.model_dump(exclude_none=True)
+        return json.encode([model_name, response]).decode()
+
+    @staticmethod
+    def _decode_completion(data: str) -> tuple[str, Any]:
+        """
+        反序列化上游响应（集群请求合并）
+
+        :param data: 序列化数据
+        :return:
+        """
+        model_name, response = json.decode(data)
+        return model_name, response
+
     async def chat_completion(
         self,
-        db: AsyncSession,
+        route: ModelRoute,
         *,
         request: ChatCompletionRequest,
         user_id: int,
@@ -210,53 +619,92 @@ class LLMGateway:
         rpm_limit: int,
         daily_limit: int,
         monthly_limit: int,
+        tpm_limit: int = 0,
+        rate_limit_algorithm: str = RateLimitAlgorithm.FIXED_WINDOW,
         ip_address: str | None = None,
+        response_cache_ttl: int | None = None,
     ) -> ChatCompletionResponse:
         """
         聊天补全（非流式）
 
-        :param db: 数据库会话
+        :param route: 模型路由
         :param request: 请求参数
         :param user_id: 用户 ID
         :param api_key_id: API Key ID
         :param rpm_limit: RPM 限制
         :param daily_limit: 日 Token 限制
         :param monthly_limit: 月 Token 限制
+        :param tpm_limit: TPM 限制，0 表示不限制
+        :param rate_limit_algorithm: 限流算法
         :param ip_address: IP 地址
+        :param response_cache_ttl: API Key 配置的响应缓存秒数，为空时沿用模型配置
         :return: 聊天补全响应
         """
-        # 检查速率限制
+        # 检查速率限制，并按预估输入 tokens 预占 TPM 额度
+        request_id = usage_tracker.generate_request_id()
+        reserved_tokens = self._estimate_prompt_tokens(request)
         await rate_limiter.check_all(
             api_key_id,
             rpm_limit=rpm_limit,
             daily_limit=daily_limit,
             monthly_limit=monthly_limit,
+            tpm_limit=tpm_limit,
+            algorithm=rate_limit_algorithm,
+            reserve_tokens=reserved_tokens,
+            request_id=request_id,
         )
 
-        # 获取模型配置
-        model_config = await self._get_model_config(db, request.model)
-        provider = await self._get_provider(db, model_config.provider_id)
+        model_config = route.model_config
+        provider = route.provider
+        timer = RequestTimer().start()
 
-        # 检查熔断器
-        breaker = self._get_circuit_breaker(provider.name)
-        if not breaker.allow_request():
-            # 尝试故障转移
-            fallback_models = await self._get_fallback_models(db, model_config.model_type, model_config.id)
-            if not fallback_models:
-                raise ProviderUnavailableError(provider.name)
-            model_config, provider = fallback_models[0]
-            breaker = self._get_circuit_breaker(provider.name)
-
-        # 构建请求参数
-        params = self._build_litellm_params(model_config, provider, request)
-        request_id = usage_tracker.generate_request_id()
+        # 响应缓存
+        cache_ttl = response_cache.resolve_ttl(route, request, response_cache_ttl)
+        cache_key = response_cache.build_key(request, user_id) if cache_ttl else None
+        if cache_key is not None and (cached := await response_cache.get(cache_key, model_config.model_name)):
+            await self._track_cache_hit(
+                route,
+                cached,
+                request_id=request_id,
+                user_id=user_id,
+                api_key_id=api_key_id,
+                reserved_tokens=reserved_tokens,
+                tpm_limit=tpm_limit,
+                rate_limit_algorithm=rate_limit_algorithm,
+                latency_ms=timer.stop().elapsed_ms,
+                is_streaming=False,
+                ip_address=ip_address,
+            )
+            return ChatCompletionResponse(
+                id=request_id,
+                created=int(time.time()),
+                model=cached.model,
+                choices=[
+                    ChatCompletionChoice(
+                        index=0,
+                        message=ChatMessage(role='assistant', content=cached.content, tool_calls=cached.tool_calls),
+                        finish_reason=cached.finish_reason,
+                    )
+                ],
+                usage=ChatCompletionUsage(
+                    prompt_tokens=cached.input_tokens,
+                    completion_tokens=cached.output_tokens,
+                    total_tokens=cached.input_tokens + cached.output_tokens,
+                ),
+            )
 
-        # 调用 LiteLLM
-        timer = RequestTimer().start()
+        # 按模型组策略调度 LiteLLM 调用，同一用户的相同确定性请求合并为一次上游调用，各请求按自身 API Key 计费
         try:
-            response = await self.litellm.acompletion(**params)
+            served_model, response = await singleflight.do(
+                self._coalesce_key('chat', request, user_id),
+                functools.partial(self._complete_upstream, route, request, cache_key=cache_key, cache_ttl=cache_ttl),
+                encode=self._encode_completion,
+                decode=self._decode_completion,
+            )
             timer.stop()
-            breaker.record_success()
+            route = llm_routing_table.get(served_model) or route
+            model_config = route.model_config
+            provider = route.provider
 
             # 提取用量信息
             usage = response.get('usage', {})
@@ -265,7 +713,6 @@ class LLMGateway:
 
             # 记录用量
             await usage_tracker.track_success(
-                db,
                 user_id=user_id,
                 api_key_id=api_key_id,
                 model_id=model_config.id,
@@ -283,22 +730,17 @@ class LLMGateway:
 
             # 消费 tokens
             await rate_limiter.consume_tokens(api_key_id, input_tokens + output_tokens)
+            await rate_limiter.reconcile_tokens(
+                api_key_id,
+                reserved_tokens=reserved_tokens,
+                actual_tokens=input_tokens + output_tokens,
+                tpm_limit=tpm_limit,
+                algorithm=rate_limit_algorithm,
+                request_id=request_id,
+            )
 
             # 构建响应
-            choices = []
-            for i, choice in enumerate(response.get('choices', [])):
-                message = choice.get('message', {})
-                choices.append(
-                    ChatCompletionChoice(
-                        index=i,
-                        message=ChatMessage(
-                            role=message.get('role', 'assistant'),
-                            content=message.get('content'),
-                            tool_calls=message.get('tool_calls'),
-                        ),
-                        finish_reason=choice.get('finish_reason'),
-                    )
-                )
+            choices = self._build_choices(response)
 
             return ChatCompletionResponse(
                 id=request_id,
@@ -314,11 +756,18 @@ class LLMGateway:
 
         except Exception as e:
             timer.stop()
-            breaker.record_failure()
+
+            # 释放 TPM 预占额度
+            await rate_limiter.release_tokens(
+                api_key_id,
+                reserved_tokens=reserved_tokens,
+                tpm_limit=tpm_limit,
+                algorithm=rate_limit_algorithm,
+                request_id=request_id,
+            )
 
             # 记录错误
             await usage_tracker.track_error(
-                db,
                 user_id=user_id,
                 api_key_id=api_key_id,
                 model_id=model_config.id,
@@ -331,11 +780,11 @@ class LLMGateway:
                 ip_address=ip_address,
             )
 
-            raise LLMGatewayError(str(e))
+            raise self._upstream_error(e)
 
-    async def chat_completion_stream(
+    async def chat_completion_events(  # noqa: C901
         self,
-        db: AsyncSession,
+        route: ModelRoute,
         *,
         request: ChatCompletionRequest,
         user_id: int,
@@ -343,98 +792,397 @@ class LLMGateway:
         rpm_limit: int,
         daily_limit: int,
         monthly_limit: int,
+        tpm_limit: int = 0,
+        rate_limit_algorithm: str = RateLimitAlgorithm.FIXED_WINDOW,
         ip_address: str | None = None,
-    ) -> AsyncIterator[str]:
+        response_cache_ttl: int | None = None,
+    ) -> AsyncIterator[StreamEvent]:
         """
-        聊天补全（流式）
+        聊天补全（流式），输出与协议无关的流式事件，由各协议编码器编码
 
-        :param db: 数据库会话
+        :param route: 模型路由
         :param request: 请求参数
         :param user_id: 用户 ID
         :param api_key_id: API Key ID
         :param rpm_limit: RPM 限制
         :param daily_limit: 日 Token 限制
         :param monthly_limit: 月 Token 限制
+        :param tpm_limit: TPM 限制，0 表示不限制
+        :param rate_limit_algorithm: 限流算法
         :param ip_address: IP 地址
-        :return: SSE 流
+        :param response_cache_ttl: API Key 配置的响应缓存秒数，为空时沿用模型配置
+        :return: 流式事件
         """
-        # 检查速率限制
+        # 检查速率限制，并按预估输入 tokens 预占 TPM 额度
+        request_id = usage_tracker.generate_request_id()
+        reserved_tokens = self._estimate_prompt_tokens(request)
         await rate_limiter.check_all(
             api_key_id,
             rpm_limit=rpm_limit,
             daily_limit=daily_limit,
             monthly_limit=monthly_limit,
+            tpm_limit=tpm_limit,
+            algorithm=rate_limit_algorithm,
+            reserve_tokens=reserved_tokens,
+            request_id=request_id,
         )
 
-        # 获取模型配置
-        model_config = await self._get_model_config(db, request.model)
-        provider = await self._get_provider(db, model_config.provider_id)
+        model_config = route.model_config
+        provider = route.provider
 
-        # 检查熔断器
-        breaker = self._get_circuit_breaker(provider.name)
-        if not breaker.allow_request():
-            fallback_models = await self._get_fallback_models(db, model_config.model_type, model_config.id)
-            if not fallback_models:
-                raise ProviderUnavailableError(provider.name)
-            model_config, provider = fallback_models[0]
-            breaker = self._get_circuit_breaker(provider.name)
-
-        # 构建请求参数
-        params = self._build_litellm_params(model_config, provider, request)
-        params['stream'] = True
-        request_id = usage_tracker.generate_request_id()
+        timer = RequestTimer().start()
+
+        # 响应缓存命中时按流式事件回放
+        cache_ttl = response_cache.resolve_ttl(route, request, response_cache_ttl)
+        cache_key = response_cache.build_key(request, user_id) if cache_ttl else None
+        if cache_key is not None and (cached := await response_cache.get(cache_key, model_config.model_name)):
+            await self._track_cache_hit(
+                route,
+                cached,
+                request_id=request_id,
+                user_id=user_id,
+                api_key_id=api_key_id,
+                reserved_tokens=reserved_tokens,
+                tpm_limit=tpm_limit,
+                rate_limit_algorithm=rate_limit_algorithm,
+                latency_ms=timer.stop().elapsed_ms,
+                is_streaming=True,
+                ip_address=ip_address,
+            )
+            yield StreamStart(
+                id=request_id, model=cached.model, created=int(time.time()), input_tokens=cached.input_tokens
+            )
+            for event in cached.replay():
+                yield event
+            yield StreamUsage(input_tokens=cached.input_tokens, output_tokens=cached.output_tokens)
+            return
+
+        usage = None
+        recorder = CompletionRecorder()
+        # 上游是否已开始响应；用量是否已交由后台任务记录（保证每个请求只计费一次）
+        started = False
+        accounted = False
+
+        try:
+            # 同一用户的相同确定性请求合并为一次上游调用，各请求按自身 API Key 计费；
+            # 客户端断开时关闭订阅，最后一个订阅者离开后取消上游调用
+            events = singleflight.stream(
+                self._coalesce_key('stream', request, user_id),
+                functools.partial(
+                    self._stream_upstream,
+                    route,
+                    request,
+                    reserved_tokens=reserved_tokens,
+                    cache_key=cache_key,
+                    cache_ttl=cache_ttl,
+                ),
+                encode=encode_event,
+                decode=decode_event,
+            )
+            async with contextlib.aclosing(events):
+                async for event in events:
+                    if isinstance(event, StreamStart):
+                        started = True
+                        route = llm_routing_table.get(event.model) or route
+                        model_config = route.model_config
+                        provider = route.provider
+                        yield StreamStart(
+                            id=request_id, model=event.model, created=event.created, input_tokens=reserved_tokens
+                        )
+                    elif isinstance(event, StreamUsage):
+                        usage = event
+                    else:
+                        if isinstance(event, StreamDelta):
+                            recorder.add(event)
+                        yield event
+
+            timer.stop()
+            if usage is None:
+                raise LLMGatewayError('Upstream stream ended unexpectedly')
+            input_tokens = usage.input_tokens
+            output_tokens = usage.output_tokens
+
+            # 先结束流再计费，计费由后台任务完成，客户端在结束后断开也不会漏记
+            accounted = True
+            self._spawn(
+                self._track_stream_success(
+                    route,
+                    request_id=request_id,
+                    user_id=user_id,
+                    api_key_id=api_key_id,
+                    reserved_tokens=reserved_tokens,
+                    input_tokens=input_tokens,
+                    output_tokens=output_tokens,
+                    tpm_limit=tpm_limit,
+                    rate_limit_algorithm=rate_limit_algorithm,
+                    latency_ms=timer.elapsed_ms,
+                    ip_address=ip_address,
+                )
+            )
+
+        except (asyncio.CancelledError, GeneratorExit):
+            # 客户端断开：按已生成内容计费，取消状态下无法等待，由后台任务完成
+            if not accounted:
+                self._track_abandoned(
+                    route,
+                    request_id=request_id,
+                    user_id=user_id,
+                    api_key_id=api_key_id,
+                    reserved_tokens=reserved_tokens,
+                    input_tokens=reserved_tokens if started else 0,
+                    output_tokens=token_counter.count_text(model_config.model_name, recorder.content),
+                    tpm_limit=tpm_limit,
+                    rate_limit_algorithm=rate_limit_algorithm,
+                    latency_ms=timer.stop().elapsed_ms,
+                    ip_address=ip_address,
+                )
+            raise
+
+        except Exception as e:
+            timer.stop()
+
+            # 释放 TPM 预占额度
+            await rate_limiter.release_tokens(
+                api_key_id,
+                reserved_tokens=reserved_tokens,
+                tpm_limit=tpm_limit,
+                algorithm=rate_limit_algorithm,
+                request_id=request_id,
+            )
+
+            # 记录错误
+            await usage_tracker.track_error(
+                user_id=user_id,
+                api_key_id=api_key_id,
+                model_id=model_config.id,
+                provider_id=provider.id,
+                request_id=request_id,
+                model_name=model_config.model_name,
+                error_message=str(e),
+                latency_ms=timer.elapsed_ms,
+                is_streaming=True,
+                ip_address=ip_address,
+            )
 
+            yield StreamError(message=str(e))
+            return
+
+        yield StreamUsage(input_tokens=input_tokens, output_tokens=output_tokens)
+
+    async def _stream_upstream(
+        self,
+        route: ModelRoute,
+        request: ChatCompletionRequest,
+        *,
+        reserved_tokens: int,
+        cache_key: str | None,
+        cache_ttl: int,
+    ) -> AsyncIterator[StreamEvent]:
+        """
+        上游流式调用，输出开始事件、内容增量及最终用量，由请求合并层广播给所有订阅者
+
+        :param route: 请求的模型路由
+        :param request: 请求参数
+        :param reserved_tokens: 预估输入 tokens
+        :param cache_key: 响应缓存键
+        :param cache_ttl: 响应缓存秒数
+        :return:
+        """
         timer = RequestTimer().start()
-        total_tokens = 0
-        content_buffer = ''
+
+        # 按模型组策略调度，首个 chunk 到达前可重试、故障转移或对冲
+        route, (stream, first_chunk) = await request_dispatcher.dispatch(
+            route,
+            functools.partial(self._open_stream, request=request),
+            discard=self._close_stream,
+            hold=True,
+        )
+        model_config = route.model_config
+        recorder = CompletionRecorder()
+        usage = None
+        error = False
+        cancelled = False
 
         try:
-            response = await self.litellm.acompletion(**params)
+            # id 由各订阅者替换为自身请求 ID
+            yield StreamStart(id='', model=model_config.model_name, created=int(time.time()))
+
+            async for chunk in self._iter_stream(stream, first_chunk):
+                if chunk_usage := chunk.get('usage'):
+                    usage = chunk_usage
 
-            async for chunk in response:
                 choices = chunk.get('choices', [])
                 if not choices:
                     continue
 
                 delta = choices[0].get('delta', {})
-                content = delta.get('content', '')
-                if content:
-                    content_buffer += content
-                    total_tokens += 1  # 简单估算
-
-                # 构建 SSE 数据
-                chunk_data = ChatCompletionChunk(
-                    id=request_id,
-                    created=int(time.time()),
-                    model=model_config.model_name,
-                    choices=[
-                        ChatCompletionChunkChoice(
-                            index=0,
-                            delta=ChatCompletionChunkDelta(
-                                role=delta.get('role'),
-                                content=content,
-                                tool_calls=delta.get('tool_calls'),
-                            ),
-                            finish_reason=choices[0].get('finish_reason'),
-                        )
-                    ],
+                event = StreamDelta(
+                    role=delta.get('role'),
+                    content=delta.get('content', ''),
+                    tool_calls=parse_tool_calls(delta.get('tool_calls')),
+                    finish_reason=choices[0].get('finish_reason'),
+                    raw=chunk,
+                )
+                recorder.add(event)
+                yield event
+
+            # 优先使用供应商返回的用量，否则使用 tokenizer 计数
+            if usage and usage.get('completion_tokens') is not None:
+                input_tokens = usage.get('prompt_tokens') or reserved_tokens
+                output_tokens = usage.get('completion_tokens')
+            else:
+                input_tokens = reserved_tokens
+                output_tokens = token_counter.count_text(model_config.model_name, recorder.content)
+
+            # 写入响应缓存
+            if cache_key is not None:
+                await response_cache.set(
+                    cache_key,
+                    recorder.build(model_config.model_name, input_tokens=input_tokens, output_tokens=output_tokens),
+                    cache_ttl,
                 )
 
-                yield f'data: {chunk_data.model_dump_json()}\n\n'
+            yield StreamUsage(input_tokens=input_tokens, output_tokens=output_tokens)
 
-            # 发送结束标记
-            yield 'data: [DONE]\n\n'
+        except Exception:
+            error = True
+            # 首个 chunk 之后的失败不经过调度器，需单独记录熔断
+            await self._get_circuit_breaker(route.provider.name).record_failure()
+            raise
 
-            timer.stop()
-            breaker.record_success()
+        except (asyncio.CancelledError, GeneratorExit):
+            cancelled = True
+            raise
 
-            # 估算 tokens（流式响应可能没有精确的 token 计数）
-            input_tokens = len(str(request.messages)) // 4  # 粗略估算
-            output_tokens = len(content_buffer) // 4
+        finally:
+            # 关闭上游流，取消时供应商随连接关闭停止生成
+            await self._close_stream((stream, first_chunk))
+            # 流结束（含取消）时释放路由进行中计数，取消的请求不计入延迟及错误率
+            load_balancer.end(model_config.id, latency_ms=None if cancelled else timer.elapsed_ms, error=error)
+
+    def _build_embedding_params(self, route: ModelRoute, inputs: list[str], dimensions: int | None) -> dict[str, Any]:
+        """构建 LiteLLM Embedding 调用参数"""
+        provider = route.provider
+        params = {
+            'model': self._build_model_name(
+                route.model_config.model_name, provider.provider_type, force_prefix=bool(provider.api_base_url)
+            ),
+            'input': inputs,
+            'api_key': route.api_key,
+        }
+        if provider.api_base_url:
+            params['api_base'] = provider.api_base_url
+        if dimensions is not None:
+            params['dimensions'] = dimensions
+        return params
+
+    async def _aembedding(self, route: ModelRoute, *, inputs: list[str], dimensions: int | None) -> Any:
+        """
+        发起 Embedding 请求，OpenAI 兼容供应商优先使用原生传输
+
+        :param route: 路由
+        :param inputs: 输入文本
+        :param dimensions: 向量维度
+        :return:
+        """
+        params = self._build_embedding_params(route, inputs, dimensions)
+        if native_transport.supports(route):
+            return await native_transport.embedding(route, params)
+        return await self.litellm.aembedding(**params)
+
+    async def _embed_upstream(
+        self, route: ModelRoute, inputs: list[str], *, dimensions: int | None
+    ) -> EmbeddingBatchResult:
+        """
+        上游 Embedding 调用，由微批处理器合并多个请求的输入
+
+        :param route: 请求的模型路由
+        :param inputs: 合并后的输入
+        :param dimensions: 向量维度
+        :return:
+        """
+        route, response = await request_dispatcher.dispatch(
+            route, functools.partial(self._aembedding, inputs=inputs, dimensions=dimensions)
+        )
+        data = sorted(response.get('data') or [], key=operator.itemgetter('index'))
+        if len(data) != len(inputs):
+            raise LLMGatewayError(f'Embedding count mismatch: expected {len(inputs)}, got {len(data)}')
+        usage = response.get('usage') or {}
+        return EmbeddingBatchResult(
+            model=route.model_config.model_name,
+            vectors=[item['embedding'] for item in data],
+            prompt_tokens=usage.get('prompt_tokens') or 0,
+        )
+
+    async def embedding(
+        self,
+        route: ModelRoute,
+        *,
+        request: EmbeddingRequest,
+        user_id: int,
+        api_key_id: int,
+        rpm_limit: int,
+        daily_limit: int,
+        monthly_limit: int,
+        tpm_limit: int = 0,
+        rate_limit_algorithm: str = RateLimitAlgorithm.FIXED_WINDOW,
+        ip_address: str | None = None,
+    ) -> EmbeddingResponse:
+        """
+        文本向量化
+
+        :param route: 模型路由
+        :param request: 请求参数
+        :param user_id: 用户 ID
+        :param api_key_id: API Key ID
+        :param rpm_limit: RPM 限制
+        :param daily_limit: 日 Token 限制
+        :param monthly_limit: 月 Token 限制
+        :param tpm_limit: TPM 限制，0 表示不限制
+        :param rate_limit_algorithm: 限流算法
+        :param ip_address: IP 地址
+        :return: Embedding 响应
+        """
+        inputs = [request.input] if isinstance(request.input, str) else request.input
+        if not inputs:
+            raise LLMGatewayError('Input must not be empty', code=400)
+        model_config = route.model_config
+        provider = route.provider
+        if model_config.model_type != ModelType.EMBEDDING:
+            raise LLMGatewayError(f'Model {request.model} does not support embeddings', code=400)
+
+        # 检查速率限制，并按预估输入 tokens 预占 TPM 额度
+        request_id = usage_tracker.generate_request_id()
+        reserved_tokens = sum(token_counter.count_text(request.model, text) for text in inputs)
+        await rate_limiter.check_all(
+            api_key_id,
+            rpm_limit=rpm_limit,
+            daily_limit=daily_limit,
+            monthly_limit=monthly_limit,
+            tpm_limit=tpm_limit,
+            algorithm=rate_limit_algorithm,
+            reserve_tokens=reserved_tokens,
+            request_id=request_id,
+        )
+
+        timer = RequestTimer().start()
+
+        # 同一路由（模型及供应商）及维度的并发请求合并为一次上游调用，各请求按自身 API Key 计费
+        settled = False
+        try:
+            result = await embedding_batcher.embed(
+                (model_config.id, provider.id, request.dimensions),
+                inputs,
+                weight=reserved_tokens,
+                call=functools.partial(self._embed_upstream, route, dimensions=request.dimensions),
+            )
+            timer.stop()
+            route = llm_routing_table.get(result.model) or route
+            model_config = route.model_config
+            provider = route.provider
+            input_tokens = result.prompt_tokens
 
-            # 记录用量
             await usage_tracker.track_success(
-                db,
                 user_id=user_id,
                 api_key_id=api_key_id,
                 model_id=model_config.id,
@@ -442,24 +1190,53 @@ class LLMGateway:
                 request_id=request_id,
                 model_name=model_config.model_name,
                 input_tokens=input_tokens,
-                output_tokens=output_tokens,
+                output_tokens=0,
                 input_cost_per_1k=model_config.input_cost_per_1k,
                 output_cost_per_1k=model_config.output_cost_per_1k,
                 latency_ms=timer.elapsed_ms,
-                is_streaming=True,
+                is_streaming=False,
                 ip_address=ip_address,
             )
+            await rate_limiter.consume_tokens(api_key_id, input_tokens)
+            await rate_limiter.reconcile_tokens(
+                api_key_id,
+                reserved_tokens=reserved_tokens,
+                actual_tokens=input_tokens,
+                tpm_limit=tpm_limit,
+                algorithm=rate_limit_algorithm,
+                request_id=request_id,
+            )
+            settled = True
 
-            # 消费 tokens
-            await rate_limiter.consume_tokens(api_key_id, input_tokens + output_tokens)
+            return EmbeddingResponse(
+                data=[
+                    EmbeddingData(
+                        index=i,
+                        embedding=base64.b64encode(struct.pack(f'<{len(vector)}f', *vector)).decode()
+                        if request.encoding_format == 'base64'
+                        else vector,
+                    )
+                    for i, vector in enumerate(result.vectors)
+                ],
+                model=model_config.model_name,
+                usage=EmbeddingUsage(prompt_tokens=input_tokens, total_tokens=input_tokens),
+            )
 
         except Exception as e:
             timer.stop()
-            breaker.record_failure()
+            settled = True
+
+            # 释放 TPM 预占额度
+            await rate_limiter.release_tokens(
+                api_key_id,
+                reserved_tokens=reserved_tokens,
+                tpm_limit=tpm_limit,
+                algorithm=rate_limit_algorithm,
+                request_id=request_id,
+            )
 
             # 记录错误
             await usage_tracker.track_error(
-                db,
                 user_id=user_id,
                 api_key_id=api_key_id,
                 model_id=model_config.id,
@@ -468,13 +1245,24 @@ class LLMGateway:
                 model_name=model_config.model_name,
                 error_message=str(e),
                 latency_ms=timer.elapsed_ms,
-                is_streaming=True,
+                is_streaming=False,
                 ip_address=ip_address,
             )
 
-            # 发送错误
-            error_data = {'error': {'message': str(e), 'type': 'gateway_error'}}
-            yield f'data: {json.dumps(error_data)}\n\n'
+            raise self._upstream_error(e)
+
+        finally:
+            if not settled:
+                # 等待合并结果期间被取消：释放 TPM 预占额度，取消状态下无法等待，由后台任务完成
+                self._spawn(
+                    rate_limiter.release_tokens(
+                        api_key_id,
+                        reserved_tokens=reserved_tokens,
+                        tpm_limit=tpm_limit,
+                        algorithm=rate_limit_algorithm,
+                        request_id=request_id,
+                    )
+                )
 
 
 # 创建全局网关实例
@@ -1,41 +1,246 @@
 """速率限制器实现"""
 
+import uuid
+
 from datetime import date
 
+from redis.commands.core import AsyncScript
+
+from backend.app.llm.enums import RateLimitAlgorithm
 from backend.common.exception.errors import HTTPError
+from backend.common.log import log
 from backend.database.redis import redis_client
 
+# 滑动日志算法单个 key 保留的最大记录数
+_SLIDING_LOG_MAX_ENTRIES = 1000
+
+# 限流算法公共函数
+# 所有算法统一为 usage(key, sum_key, limit) 查询窗口内已用量、adjust(key, sum_key, delta, limit, member) 修正额度，
+# 调用方以 usage + weight <= limit 判断是否放行；sum_key 仅滑动日志算法使用，脚本访问的 key 均由 KEYS 传入
+_LIMITER_LUA_LIB = f"""
+local SLIDING_LOG_MAX_ENTRIES = {_SLIDING_LOG_MAX_ENTRIES}
+local now_t = redis.call('TIME')
+local now = tonumber(now_t[1]) * 1000 + math.floor(tonumber(now_t[2]) / 1000)
+local algorithm = ARGV[1]
+local window = tonumber(ARGV[2])
+
+local function log_weight(members)
+    local total = 0
+    for _, member in ipairs(members) do
+        total = total + tonumber(string.match(member, ':(-?%d+)$'))
+    end
+    return total
+end
+
+-- 滑动日志：窗口内总量维护在 sum_key 中，每次只处理过期的记录
+local function log_usage(key, sum_key)
+    local total = redis.call('GET', sum_key)
+    if not total then
+        redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+        total = log_weight(redis.call('ZRANGE', key, 0, -1))
+        redis.call('SET', sum_key, total, 'PX', window)
+        return total
+    end
+    local expired = redis.call('ZRANGEBYSCORE', key, '-inf', now - window)
+    if #expired > 0 then
+        redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+        return redis.call('DECRBY', sum_key, log_weight(expired))
+    end
+    return tonumber(total)
+end
+
+-- 滑动日志：记录数超出上限时，将最早的记录合并为一条，时间取其中最新的记录（合并后只会更晚过期）
+local function log_compact(key)
+    local overflow = redis.call('ZCARD', key) - SLIDING_LOG_MAX_ENTRIES
+    if overflow <= 0 then
+        return
+    end
+    local oldest = redis.call('ZRANGE', key, 0, overflow, 'WITHSCORES')
+    local members = {{}}
+    for i = 1, #oldest, 2 do
+        members[#members + 1] = oldest[i]
+    end
+    redis.call('ZREMRANGEBYRANK', key, 0, overflow)
+    redis.call('ZADD', key, oldest[#oldest], members[#members] .. '+:' .. log_weight(members))
+end
+
+-- 滑动窗口：当前与上一窗口的计数保存在同一 hash 的 index / current / previous 字段中
+local function window_counts(key)
+    local index = math.floor(now / window)
+    local state = redis.call('HMGET', key, 'index', 'current', 'previous')
+    local last = tonumber(state[1] or '-1')
+    if last == index then
+        return index, tonumber(state[2]), tonumber(state[3])
+    elseif last == index - 1 then
+        return index, 0, tonumber(state[2])
+    end
+    return index, 0, 0
+end
+
+local function usage(key, sum_key, limit)
+    if algorithm == 'SLIDING_LOG' then
+        return log_usage(key, sum_key)
+    elseif algorithm == 'SLIDING_WINDOW' then
+        local _, current, previous = window_counts(key)
+        return math.floor(previous * (1 - (now % window) / window) + current)
+    elseif algorithm == 'TOKEN_BUCKET' then
+        local tat = tonumber(redis.call('GET', key) or '0')
+        if tat <= now then
+            return 0
+        end
+        return math.ceil((tat - now) * limit / window)
+    end
+    return tonumber(redis.call('GET', key) or '0')
+end
+
+local function adjust(key, sum_key, delta, limit, member)
+    if algorithm == 'SLIDING_LOG' then
+        log_usage(key, sum_key)
+        redis.call('ZADD', key, now, member .. ':' .. delta)
+        redis.call('INCRBY', sum_key, delta)
+        log_compact(key)
+        redis.call('PEXPIRE', key, window)
+        redis.call('PEXPIRE', sum_key, window)
+    elseif algorithm == 'SLIDING_WINDOW' then
+        local index, current, previous = window_counts(key)
+        redis.call('HSET', key, 'index', index, 'current', current + delta, 'previous', previous)
+        redis.call('PEXPIRE', key, window * 2)
+    elseif algorithm == 'TOKEN_BUCKET' then
+        local tat = tonumber(redis.call('GET', key) or '0')
+        if tat < now then
+            tat = now
+        end
+        tat = math.max(now, tat + delta * window / limit)
+        redis.call('SET', key, string.format('%d', tat), 'PX', math.max(1, math.ceil(tat - now)))
+    else
+        redis.call('INCRBY', key, delta)
+        if redis.call('PTTL', key) < 0 then
+            redis.call('PEXPIRE', key, window)
+        end
+    end
+end
+"""
+
+# 原子检查 RPM / TPM / 日 / 月限制，全部通过后才占用 RPM 与 TPM 额度
+# KEYS: rpm_key, rpm_sum_key, tpm_key, tpm_sum_key, daily_key, monthly_key
+# ARGV: algorithm, window_ms, rpm_limit, tpm_limit, tpm_reserve, daily_limit, monthly_limit, member
+# 返回: {状态码, 当前值}，0 通过，1 RPM 超限，2 日限制超限，3 月限制超限，4 TPM 超限
+_CHECK_ALL_LUA = (
+    _LIMITER_LUA_LIB
+    + """
+local rpm_limit = tonumber(ARGV[3])
+local tpm_limit = tonumber(ARGV[4])
+local tpm_reserve = tonumber(ARGV[5])
+local member = ARGV[8]
+
+local daily = tonumber(redis.call('GET', KEYS[5]) or '0')
+if daily >= tonumber(ARGV[6]) then
+    return {2, daily}
+end
+local monthly = tonumber(redis.call('GET', KEYS[6]) or '0')
+if monthly >= tonumber(ARGV[7]) then
+    return {3, monthly}
+end
+
+local rpm = usage(KEYS[1], KEYS[2], rpm_limit)
+if rpm + 1 > rpm_limit then
+    return {1, rpm}
+end
+if tpm_limit > 0 then
+    local tpm = usage(KEYS[3], KEYS[4], tpm_limit)
+    if tpm + tpm_reserve > tpm_limit then
+        return {4, tpm}
+    end
+    if tpm_reserve > 0 then
+        adjust(KEYS[3], KEYS[4], tpm_reserve, tpm_limit, member)
+    end
+end
+adjust(KEYS[1], KEYS[2], 1, rpm_limit, member)
+return {0, rpm + 1}
+"""
+)
+
+# 修正 TPM 预占额度
+# KEYS: tpm_key, tpm_sum_key
+# ARGV: algorithm, window_ms, tpm_limit, delta, member
+_ADJUST_LUA = (
+    _LIMITER_LUA_LIB
+    + """
+adjust(KEYS[1], KEYS[2], tonumber(ARGV[4]), tonumber(ARGV[3]), ARGV[5])
+return 0
+"""
+)
+
+# 查询窗口内已用量
+# KEYS: key, sum_key
+# ARGV: algorithm, window_ms, limit
+_USAGE_LUA = (
+    _LIMITER_LUA_LIB
+    + """
+return usage(KEYS[1], KEYS[2], tonumber(ARGV[3]))
+"""
+)
+
 
 class RateLimitExceeded(HTTPError):
     """速率限制超出异常"""
 
-    def __init__(self, message: str = 'Rate limit exceeded') -> None:
+    def __init__(self, message: str = 'Rate limit exceeded', *, retryable: bool = False) -> None:
+        """
+        :param message: 错误信息
+        :param retryable: 是否可在窗口滑过后重试（RPM / TPM），日/月额度超出不可重试
+        """
         super().__init__(code=429, msg=message)
+        self.retryable = retryable
 
 
 class RateLimiter:
     """基于 Redis 的速率限制器"""
 
+    # 限流窗口（毫秒）
+    window_ms: int = 60 * 1000
+
     def __init__(self, redis_prefix: str = 'fba:llm') -> None:
         self.redis_prefix = redis_prefix
+        self._scripts: dict[str, AsyncScript] = {}
+
+    def _get_script(self, lua: str) -> AsyncScript:
+        """延迟注册 Lua 脚本（首次调用时通过 EVALSHA 加载，之后复用）"""
+        script = self._scripts.get(lua)
+        if script is None:
+            script = self._scripts[lua] = redis_client.register_script(lua)
+        return script
+
+    def _get_tag(self, api_key_id: int) -> str:
+        """获取 Redis key 的 hash tag，同一 API Key 的限流 key 位于同一 slot，可在同一脚本中访问"""
+        return f'{{{self.redis_prefix}:{api_key_id}}}'
 
-    def _get_rpm_key(self, api_key_id: int) -> str:
+    def _get_rpm_key(self, api_key_id: int, algorithm: str = RateLimitAlgorithm.FIXED_WINDOW) -> str:
         """获取 RPM 限制的 Redis key"""
-        return f'{self.redis_prefix}:rpm:{api_key_id}'
+        if algorithm == RateLimitAlgorithm.FIXED_WINDOW:
+            return f'{self._get_tag(api_key_id)}:rpm'
+        return f'{self._get_tag(api_key_id)}:rpm:{algorithm.lower()}'
 
-    def _get_tpm_key(self, api_key_id: int) -> str:
+    def _get_tpm_key(self, api_key_id: int, algorithm: str = RateLimitAlgorithm.FIXED_WINDOW) -> str:
         """获取 TPM 限制的 Redis key"""
-        return f'{self.redis_prefix}:tpm:{api_key_id}'
+        if algorithm == RateLimitAlgorithm.FIXED_WINDOW:
+            return f'{self._get_tag(api_key_id)}:tpm'
+        return f'{self._get_tag(api_key_id)}:tpm:{algorithm.lower()}'
+
+    @staticmethod
+    def _get_sum_key(key: str) -> str:
+        """获取滑动日志窗口总量的 Redis key"""
+        return f'{key}:sum'
 
     def _get_daily_key(self, api_key_id: int) -> str:
         """获取日限制的 Redis key"""
         today = date.today().isoformat()
-        return f'{self.redis_prefix}:daily:{api_key_id}:{today}'
+        return f'{self._get_tag(api_key_id)}:daily:{today}'
 
     def _get_monthly_key(self, api_key_id: int) -> str:
         """获取月限制的 Redis key"""
         month = date.today().strftime('%Y-%m')
-        return f'{self.redis_prefix}:monthly:{api_key_id}:{month}'
+        return f'{self._get_tag(api_key_id)}:monthly:{month}'
 
     async def check_rpm(self, api_key_id: int, rpm_limit: int) -> bool:
         """
@@ -53,7 +258,7 @@ class RateLimiter:
             await redis_client.expire(key, 60)
 
         if count > rpm_limit:
-            raise RateLimitExceeded(f'RPM limit exceeded: {count}/{rpm_limit}')
+            raise RateLimitExceeded(f'RPM limit exceeded: {count}/{rpm_limit}', retryable=True)
 
         return True
 
@@ -98,22 +303,120 @@ class RateLimiter:
         rpm_limit: int,
         daily_limit: int,
         monthly_limit: int,
+        tpm_limit: int = 0,
+        algorithm: str = RateLimitAlgorithm.FIXED_WINDOW,
+        reserve_tokens: int = 0,
+        request_id: str = '',
     ) -> bool:
         """
         检查所有限制
 
+        单次往返原子完成日/月 Token 检查，以及按所选算法的 RPM 计数和 TPM 预占
+
         :param api_key_id: API Key ID
         :param rpm_limit: RPM 限制
         :param daily_limit: 日 Token 限制
         :param monthly_limit: 月 Token 限制
+        :param tpm_limit: TPM 限制，0 表示不限制
+        :param algorithm: 限流算法
+        :param reserve_tokens: TPM 预占 tokens（通常为预估的输入 tokens）
+        :param request_id: 请求 ID，滑动日志算法用于区分窗口内的记录
         :return: True 通过
         :raises RateLimitExceeded: 超出任一限制时抛出
         """
-        await self.check_rpm(api_key_id, rpm_limit)
-        await self.check_daily_tokens(api_key_id, daily_limit)
-        await self.check_monthly_tokens(api_key_id, monthly_limit)
+        rpm_key = self._get_rpm_key(api_key_id, algorithm)
+        tpm_key = self._get_tpm_key(api_key_id, algorithm)
+        code, value = await self._get_script(_CHECK_ALL_LUA)(
+            keys=[
+                rpm_key,
+                self._get_sum_key(rpm_key),
+                tpm_key,
+                self._get_sum_key(tpm_key),
+                self._get_daily_key(api_key_id),
+                self._get_monthly_key(api_key_id),
+            ],
+            args=[
+                algorithm,
+                self.window_ms,
+                rpm_limit,
+                tpm_limit,
+                reserve_tokens,
+                daily_limit,
+                monthly_limit,
+                request_id or uuid.uuid4().hex,
+            ],
+        )
+
+        if code == 1:
+            raise RateLimitExceeded(f'RPM limit exceeded: {value}/{rpm_limit}', retryable=True)
+        if code == 2:
+            raise RateLimitExceeded(f'Daily token limit exceeded: {value}/{daily_limit}')
+        if code == 3:
+            raise RateLimitExceeded(f'Monthly token limit exceeded: {value}/{monthly_limit}')
+        if code == 4:
+            raise RateLimitExceeded(f'TPM limit exceeded: {value}/{tpm_limit}', retryable=True)
+
         return True
 
+    async def reconcile_tokens(
+        self,
+        api_key_id: int,
+        *,
+        reserved_tokens: int,
+        actual_tokens: int,
+        tpm_limit: int,
+        algorithm: str = RateLimitAlgorithm.FIXED_WINDOW,
+        request_id: str = '',
+    ) -> None:
+        """
+        按实际用量修正 TPM 预占额度
+
+        :param api_key_id: API Key ID
+        :param reserved_tokens: 预占 tokens
+        :param actual_tokens: 实际 tokens
+        :param tpm_limit: TPM 限制，0 表示不限制
+        :param algorithm: 限流算法
+        :param request_id: 请求 ID
+        """
+        delta = actual_tokens - reserved_tokens
+        if tpm_limit <= 0 or delta == 0:
+            return
+        tpm_key = self._get_tpm_key(api_key_id, algorithm)
+        await self._get_script(_ADJUST_LUA)(
+            keys=[tpm_key, self._get_sum_key(tpm_key)],
+            args=[algorithm, self.window_ms, tpm_limit, delta, f'{request_id}:adj'],
+        )
+
+    async def release_tokens(
+        self,
+        api_key_id: int,
+        *,
+        reserved_tokens: int,
+        tpm_limit: int,
+        algorithm: str = RateLimitAlgorithm.FIXED_WINDOW,
+        request_id: str = '',
+    ) -> None:
+        """
+        释放 TPM 预占额度，用于请求失败路径，释放失败只记录日志，避免掩盖原始异常
+
+        :param api_key_id: API Key ID
+        :param reserved_tokens: 预占 tokens
+        :param tpm_limit: TPM 限制，0 表示不限制
+        :param algorithm: 限流算法
+        :param request_id: 请求 ID
+        """
+        try:
+            await self.reconcile_tokens(
+                api_key_id,
+                reserved_tokens=reserved_tokens,
+                actual_tokens=0,
+                tpm_limit=tpm_limit,
+                algorithm=algorithm,
+                request_id=request_id,
+            )
+        except Exception as e:
+            log.warning(f'[LLM RateLimit] TPM 预占额度释放失败: {e}')
+
     async def consume_tokens(self, api_key_id: int, tokens: int) -> None:
         """
         消费 tokens
@@ -121,20 +424,30 @@ class RateLimiter:
         :param api_key_id: API Key ID
         :param tokens: 消费的 tokens 数量
         """
-        # 更新日计数
         daily_key = self._get_daily_key(api_key_id)
-        await redis_client.incrby(daily_key, tokens)
-        await redis_client.expire(daily_key, 86400 * 2)  # 2 天过期
-
-        # 更新月计数
         monthly_key = self._get_monthly_key(api_key_id)
-        await redis_client.incrby(monthly_key, tokens)
-        await redis_client.expire(monthly_key, 86400 * 35)  # 35 天过期
 
-    async def get_current_rpm(self, api_key_id: int) -> int:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            # 更新日计数
+            pipe.incrby(daily_key, tokens)
+            pipe.expire(daily_key, 86400 * 2)  # 2 天过期
+            # 更新月计数
+            pipe.incrby(monthly_key, tokens)
+            pipe.expire(monthly_key, 86400 * 35)  # 35 天过期
+            await pipe.execute()
+
+    async def get_current_rpm(
+        self, api_key_id: int, *, rpm_limit: int = 0, algorithm: str = RateLimitAlgorithm.FIXED_WINDOW
+    ) -> int:
         """获取当前 RPM"""
-        key = self._get_rpm_key(api_key_id)
-        return int(await redis_client.get(key) or 0)
+        key = self._get_rpm_key(api_key_id, algorithm)
+        if algorithm == RateLimitAlgorithm.FIXED_WINDOW:
+            return int(await redis_client.get(key) or 0)
+        return int(
+            await self._get_script(_USAGE_LUA)(
+                keys=[key, self._get_sum_key(key)], args=[algorithm, self.window_ms, max(rpm_limit, 1)]
+            )
+        )
 
     async def get_daily_tokens(self, api_key_id: int) -> int:
         """获取今日已用 tokens"""
@@ -153,6 +466,7 @@ class RateLimiter:
         rpm_limit: int,
         daily_limit: int,
         monthly_limit: int,
+        algorithm: str = RateLimitAlgorithm.FIXED_WINDOW,
     ) -> dict:
         """
         获取使用情况
@@ -161,11 +475,17 @@ class RateLimiter:
         :param rpm_limit: RPM 限制
         :param daily_limit: 日 Token 限制
         :param monthly_limit: 月 Token 限制
+        :param algorithm: 限流算法
         :return: 使用情况字典
         """
-        current_rpm = await self.get_current_rpm(api_key_id)
-        daily_tokens = await self.get_daily_tokens(api_key_id)
-        monthly_tokens = await self.get_monthly_tokens(api_key_id)
+        values = await redis_client.mget(
+            self._get_rpm_key(api_key_id),
+            self._get_daily_key(api_key_id),
+            self._get_monthly_key(api_key_id),
+        )
+        current_rpm, daily_tokens, monthly_tokens = (int(v or 0) for v in values)
+        if algorithm != RateLimitAlgorithm.FIXED_WINDOW:
+            current_rpm = await self.get_current_rpm(api_key_id, rpm_limit=rpm_limit, algorithm=algorithm)
 
         return {
             'rpm_limit': rpm_limit,
@@ -0,0 +1,215 @@
+"""LLM 响应缓存"""
+
+import base64
+import hashlib
+import zlib
+
+from typing import Any
+
+from msgspec import Struct, json
+
+from backend.app.llm.core.routing import ModelRoute
+from backend.app.llm.core.stream import StreamDelta, StreamEvent, ToolCallDelta
+from backend.app.llm.schema.proxy import ChatCompletionRequest
+from backend.common.log import log
+from backend.common.prometheus.instruments import (
+    PROMETHEUS_APP_NAME,
+    PROMETHEUS_LLM_RESPONSE_CACHE_BYTES_SAVED_COUNTER,
+    PROMETHEUS_LLM_RESPONSE_CACHE_COUNTER,
+)
+from backend.core.conf import settings
+from backend.database.redis import redis_client
+
+# 不影响响应内容的请求字段
+_KEY_EXCLUDE = {'stream', 'stream_options', 'user'}
+
+
+def request_digest(request: ChatCompletionRequest) -> str:
+    """
+    计算请求的规范化哈希
+
+    :param request: 请求参数
+    :return:
+    """
+    payload = request.model_dump(exclude=_KEY_EXCLUDE, exclude_none=True)
+    return hashlib.sha256(json.encode(payload, order='sorted')).hexdigest()
+
+
+class CachedCompletion(Struct):
+    """缓存的聊天补全结果"""
+
+    model: str
+    content: str | None
+    tool_calls: list[dict[str, Any]] | None
+    finish_reason: str | None
+    input_tokens: int
+    output_tokens: int
+
+    def replay(self) -> list[StreamEvent]:
+        """
+        回放为流式事件（不含开始及用量事件）
+
+        :return:
+        """
+        tool_calls = None
+        if self.tool_calls:
+            tool_calls = [
+                ToolCallDelta(
+                    index=i,
+                    id=call.get('id'),
+                    name=call.get('function', {}).get('name'),
+                    arguments=call.get('function', {}).get('arguments'),
+                )
+                for i, call in enumerate(self.tool_calls)
+            ]
+        return [
+            StreamDelta(role='assistant', content=self.content, tool_calls=tool_calls),
+            StreamDelta(finish_reason=self.finish_reason or 'stop'),
+        ]
+
+
+class CompletionRecorder:
+    """流式响应记录器，将内容增量合并为完整结果"""
+
+    def __init__(self) -> None:
+        self.content_parts: list[str] = []
+        self._tool_calls: dict[int, dict[str, Any]] = {}
+        self._finish_reason: str | None = None
+
+    @property
+    def content(self) -> str:
+        """已接收的文本内容"""
+        return ''.join(self.content_parts)
+
+    def add(self, delta: StreamDelta) -> None:
+        """
+        记录内容增量
+
+        :param delta: 内容增量事件
+        :return:
+        """
+        if delta.content:
+            self.content_parts.append(delta.content)
+        for call in delta.tool_calls or ():
+            item = self._tool_calls.setdefault(
+                call.index, {'id': None, 'type': 'function', 'function': {'name': '', 'arguments': ''}}
+            )
+            if call.id is not None:
+                item['id'] = call.id
+            if call.name:
+                item['function']['name'] += call.name
+            if call.arguments:
+                item['function']['arguments'] += call.arguments
+        if delta.finish_reason:
+            self._finish_reason = delta.finish_reason
+
+    def build(self, model: str, *, input_tokens: int, output_tokens: int) -> CachedCompletion:
+        """
+        生成缓存结果
+
+        :param model: 模型名称
+        :param input_tokens: 输入 tokens
+        :param output_tokens: 输出 tokens
+        :return:
+        """
+        return CachedCompletion(
+            model=model,
+            content=self.content or None,
+            tool_calls=[self._tool_calls[i] for i in sorted(self._tool_calls)] or None,
+            finish_reason=self._finish_reason,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+        )
+
+
+class ResponseCache:
+    """
+    精确匹配响应缓存
+
+    以用户（租户）及模型、消息、采样参数、工具定义的规范化哈希为键，压缩后存入 Redis，不同用户之间互不共享；
+    按模型或 API Key 配置开启，仅缓存确定性请求（temperature=0 或指定 seed）。
+    命中的请求不调用上游，按零成本记录用量，不计入 TPM 及日/月 Token 配额
+    """
+
+    @staticmethod
+    def resolve_ttl(route: ModelRoute, request: ChatCompletionRequest, api_key_ttl: int | None = None) -> int:
+        """
+        获取请求的缓存时间
+
+        :param route: 请求的模型路由
+        :param request: 请求参数
+        :param api_key_ttl: API Key 配置的缓存秒数，为空时沿用模型配置
+        :return: 缓存秒数，0 表示不缓存
+        """
+        ttl = api_key_ttl if api_key_ttl is not None else route.model_config.response_cache_ttl
+        if not ttl or (request.n or 1) > 1:
+            return 0
+        if settings.LLM_RESPONSE_CACHE_DETERMINISTIC_ONLY and request.temperature != 0 and request.seed is None:
+            return 0
+        return ttl
+
+    @staticmethod
+    def build_key(request: ChatCompletionRequest, user_id: int) -> str:
+        """
+        生成缓存键
+
+        :param request: 请求参数
+        :param user_id: 用户 ID
+        :return:
+        """
+        return f'{settings.LLM_RESPONSE_CACHE_PREFIX}:{user_id}:{request_digest(request)}'
+
+    @staticmethod
+    async def get(key: str, model: str) -> CachedCompletion | None:
+        """
+        获取缓存
+
+        :param key: 缓存键
+        :param model: 模型名称（用于指标）
+        :return:
+        """
+        try:
+            value = await redis_client.get(key)
+        except Exception as e:
+            log.warning(f'[LLM ResponseCache] GET error: {e}')
+            return None
+        if value is None:
+            PROMETHEUS_LLM_RESPONSE_CACHE_COUNTER.labels(app_name=PROMETHEUS_APP_NAME, model=model, result='miss').inc()
+            return None
+
+        try:
+            raw = zlib.decompress(base64.b64decode(value))
+            cached = json.decode(raw, type=CachedCompletion)
+        except Exception as e:
+            log.warning(f'[LLM ResponseCache] 缓存数据损坏: {e}')
+            PROMETHEUS_LLM_RESPONSE_CACHE_COUNTER.labels(app_name=PROMETHEUS_APP_NAME, model=model, result='miss').inc()
+            return None
+        PROMETHEUS_LLM_RESPONSE_CACHE_COUNTER.labels(app_name=PROMETHEUS_APP_NAME, model=model, result='hit').inc()
+        PROMETHEUS_LLM_RESPONSE_CACHE_BYTES_SAVED_COUNTER.labels(app_name=PROMETHEUS_APP_NAME, model=model).inc(
+            len(raw)
+        )
+        return cached
+
+    @staticmethod
+    async def set(key: str, cached: CachedCompletion, ttl: int) -> None:
+        """
+        设置缓存
+
+        :param key: 缓存键
+        :param cached: 缓存结果
+        :param ttl: 缓存秒数
+        :return:
+        """
+        value = base64.b64encode(
+            zlib.compress(json.encode(cached), settings.LLM_RESPONSE_CACHE_COMPRESS_LEVEL)
+        ).decode()
+        if len(value) > settings.LLM_RESPONSE_CACHE_MAX_BYTES:
+            return
+        try:
+            await redis_client.setex(key, ttl, value)
+        except Exception as e:
+            log.warning(f'[LLM ResponseCache] SET error: {e}')
+
+
+# 创建全局响应缓存实例
+response_cache = ResponseCache()
@@ -0,0 +1,194 @@
+"""LLM 路由表实现"""
+
+import asyncio
+import dataclasses
+
+from collections.abc import Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.app.llm.core.encryption import key_encryption
+from backend.app.llm.crud.crud_model_config import model_config_dao
+from backend.app.llm.crud.crud_model_group import model_group_dao
+from backend.app.llm.crud.crud_provider import provider_dao
+from backend.app.llm.enums import ModelSelectionStrategy
+from backend.app.llm.model.model_config import ModelConfig
+from backend.app.llm.model.provider import ModelProvider
+from backend.common.cache.pubsub import cache_pubsub_manager
+from backend.common.log import log
+from backend.core.conf import settings
+from backend.database.db import async_db_session
+
+
+@dataclasses.dataclass(frozen=True)
+class DispatchPolicy:
+    """调度策略（来自模型组配置）"""
+
+    retry_count: int = 0
+    timeout_seconds: float | None = None
+    hedge_enabled: bool = False
+    selection_strategy: str = ModelSelectionStrategy.PRIORITY
+
+
+@dataclasses.dataclass
+class ModelRoute:
+    """模型路由"""
+
+    model_config: ModelConfig
+    provider: ModelProvider
+    api_key: str | None
+    fallbacks: tuple['ModelRoute', ...] = ()
+    policy: DispatchPolicy = DispatchPolicy()
+    weight: int = 1
+
+    @classmethod
+    def build(cls, model_config: ModelConfig, provider: ModelProvider) -> 'ModelRoute':
+        """
+        构建模型路由
+
+        :param model_config: 模型配置
+        :param provider: 供应商
+        :return:
+        """
+        api_key = None
+        if provider.api_key_encrypted:
+            api_key = key_encryption.decrypt(provider.api_key_encrypted)
+        return cls(model_config=model_config, provider=provider, api_key=api_key)
+
+
+class RoutingTable:
+    """
+    进程内模型路由表
+
+    启动时全量加载，供应商/模型/模型组变更时通过缓存 Pub/Sub 通道通知各节点重建
+    """
+
+    def __init__(self) -> None:
+        self._routes: dict[str, ModelRoute] = {}
+        self._version = 0
+        self._lock = asyncio.Lock()
+        self._listeners: list[Callable[[list[ModelRoute]], None]] = []
+
+    @property
+    def version(self) -> int:
+        """路由表版本"""
+        return self._version
+
+    @property
+    def ready(self) -> bool:
+        """路由表是否已加载"""
+        return self._version > 0
+
+    def routes(self) -> list[ModelRoute]:
+        """获取全部路由"""
+        return list(self._routes.values())
+
+    def get(self, model_name: str) -> ModelRoute | None:
+        """
+        获取模型路由
+
+        :param model_name: 模型名称
+        :return:
+        """
+        return self._routes.get(model_name)
+
+    @staticmethod
+    async def _load(db: AsyncSession) -> dict[str, ModelRoute]:
+        """
+        从数据库加载路由
+
+        :param db: 数据库会话
+        :return:
+        """
+        providers = {p.id: p for p in await provider_dao.get_all_enabled(db)}
+        models = await model_config_dao.get_all_enabled(db)
+        groups = await model_group_dao.get_all_enabled(db)
+
+        routes_by_id: dict[int, ModelRoute] = {}
+        routes: dict[str, ModelRoute] = {}
+        for model in models:
+            provider = providers.get(model.provider_id)
+            if provider is None:
+                continue
+            route = ModelRoute.build(model, provider)
+            routes_by_id[model.id] = route
+            routes.setdefault(model.model_name, route)
+
+        # 与 model_group_dao.get_by_type 保持一致：同类型取第一个启用的模型组
+        group_chains: dict[str, list[int]] = {}
+        group_policies: dict[str, DispatchPolicy] = {}
+        group_weights: dict[str, dict[int, int]] = {}
+        for group in groups:
+            if group.model_type not in group_chains:
+                group_chains[group.model_type] = group.model_ids if group.fallback_enabled else []
+                group_policies[group.model_type] = DispatchPolicy(
+                    retry_count=group.retry_count,
+                    timeout_seconds=group.timeout_seconds or None,
+                    hedge_enabled=group.hedge_enabled,
+                    selection_strategy=group.selection_strategy,
+                )
+                # JSON 键为字符串
+                group_weights[group.model_type] = {int(k): v for k, v in (group.model_weights or {}).items()}
+
+        for route in routes_by_id.values():
+            chain = group_chains.get(route.model_config.model_type, [])
+            route.policy = group_policies.get(route.model_config.model_type, DispatchPolicy())
+            route.weight = max(group_weights.get(route.model_config.model_type, {}).get(route.model_config.id, 1), 0)
+            route.fallbacks = tuple(
+                routes_by_id[model_id]
+                for model_id in chain
+                if model_id != route.model_config.id and model_id in routes_by_id
+            )
+
+        return routes
+
+    async def refresh(self) -> None:
+        """重建路由表"""
+        async with self._lock:
+            try:
+                async with async_db_session() as db:
+                    routes = await self._load(db)
+            except Exception as e:
+                log.error(f'[LLM Routing] 路由表重建失败: {e}')
+                return
+            self._routes = routes
+            self._version += 1
+            log.info(f'[LLM Routing] 路由表已重建: version={self._version}, models={len(routes)}')
+            for listener in self._listeners:
+                self._notify(listener, list(routes.values()))
+
+    @staticmethod
+    def _notify(listener: Callable[[list[ModelRoute]], None], routes: list[ModelRoute]) -> None:
+        """
+        调用路由表重建回调，回调异常不影响其他回调
+
+        :param listener: 回调函数
+        :param routes: 重建后的全部路由
+        :return:
+        """
+        try:
+            listener(routes)
+        except Exception as e:
+            log.warning(f'[LLM Routing] 路由表重建回调失败: {e}')
+
+    async def invalidate(self) -> None:
+        """重建本地路由表并通知其他节点（本节点不会再收到自己的通知）"""
+        await self.refresh()
+        await cache_pubsub_manager.publish_invalidation(settings.LLM_ROUTING_PUBSUB_KEY, is_delete_prefix=False)
+
+    def register(self) -> None:
+        """注册 Pub/Sub 重建回调"""
+        cache_pubsub_manager.register_handler(settings.LLM_ROUTING_PUBSUB_KEY, self.refresh)
+
+    def add_listener(self, listener: Callable[[list[ModelRoute]], None]) -> None:
+        """
+        注册路由表重建回调（同步调用，耗时操作需自行放入后台任务）
+
+        :param listener: 回调函数，接收重建后的全部路由
+        :return:
+        """
+        self._listeners.append(listener)
+
+
+# 创建全局路由表实例
+llm_routing_table = RoutingTable()
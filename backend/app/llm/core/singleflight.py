@@ -0,0 +1,401 @@
+"""相同请求合并（singleflight）"""
+
+import asyncio
+import contextlib
+import uuid
+
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any, Generic, TypeVar
+
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from backend.common.log import log
+from backend.core.conf import settings
+from backend.database.redis import redis_client
+
+T = TypeVar('T')
+
+
+class SingleFlightError(Exception):
+    """其他节点的合并调用失败"""
+
+    def __init__(self, message: str, status_code: int | None = None) -> None:
+        """
+        初始化异常
+
+        :param message: 错误信息
+        :param status_code: 上游错误状态码，与 LiteLLM 异常的 status_code 约定一致
+        :return:
+        """
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _Flight(Generic[T]):
+    """进行中的调用，按顺序广播结果给所有订阅者"""
+
+    def __init__(self) -> None:
+        self.items: list[T] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish(self, item: T) -> None:
+        """
+        广播结果
+
+        :param item: 结果
+        :return:
+        """
+        self.items.append(item)
+        self._notify()
+
+    def _raise_error(self) -> None:
+        """为每个订阅者抛出独立的异常实例，避免并发抛出同一实例时互相改写回溯"""
+        error = self.error
+        try:
+            fresh = type(error).__new__(type(error), *error.args)
+            fresh.__dict__.update(vars(error))
+        except Exception:
+            fresh = SingleFlightError(str(error), getattr(error, 'status_code', None))
+        raise fresh from error
+
+    def finish(self, error: BaseException | None = None) -> None:
+        """
+        结束调用
+
+        :param error: 调用异常
+        :return:
+        """
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def subscribe(self) -> AsyncIterator[T]:
+        """从头订阅结果，迟到的订阅者先回放已有结果"""
+        index = 0
+        while True:
+            while index < len(self.items):
+                yield self.items[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    self._raise_error()
+                return
+            await self._changed.wait()
+
+
+class SingleFlight:
+    """
+    相同请求合并
+
+    同一键同时只有一个调用（leader）访问上游，其余请求（follower）订阅 leader 的结果广播；
+    调用在后台任务中执行，所有订阅者断开后取消；合并键为空或未启用时直接调用；
+    启用集群模式时通过 Redis 锁选举集群内唯一 leader，结果经 Redis Stream 广播给其他节点
+    """
+
+    def __init__(self) -> None:
+        self._flights: dict[str, _Flight] = {}
+
+    async def stream(
+        self,
+        key: str | None,
+        fn: Callable[[], AsyncIterator[T]],
+        *,
+        encode: Callable[[T], str],
+        decode: Callable[[str], T],
+    ) -> AsyncIterator[T]:
+        """
+        合并流式调用
+
+        :param key: 合并键，为空时不合并
+        :param fn: 调用函数
+        :param encode: 结果序列化函数（集群模式）
+        :param decode: 结果反序列化函数（集群模式）
+        :return:
+        """
+        if key is None or not settings.LLM_SINGLEFLIGHT_ENABLED:
+            async for item in fn():
+                yield item
+            return
+
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.create_task(self._run(key, flight, fn, encode, decode))
+        flight.subscribers += 1
+        try:
+            async for item in flight.subscribe():
+                yield item
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                flight.task.cancel()
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    async def do(
+        self,
+        key: str | None,
+        fn: Callable[[], Awaitable[T]],
+        *,
+        encode: Callable[[T], str],
+        decode: Callable[[str], T],
+    ) -> T:
+        """
+        合并单次调用
+
+        :param key: 合并键，为空时不合并
+        :param fn: 调用函数
+        :param encode: 结果序列化函数（集群模式）
+        :param decode: 结果反序列化函数（集群模式）
+        :return:
+        """
+
+        async def once() -> AsyncIterator[T]:
+            yield await fn()
+
+        async with contextlib.aclosing(self.stream(key, once, encode=encode, decode=decode)) as results:
+            async for item in results:
+                return item
+        raise SingleFlightError('No result')
+
+    async def _run(
+        self,
+        key: str,
+        flight: _Flight,
+        fn: Callable[[], AsyncIterator[T]],
+        encode: Callable[[T], str],
+        decode: Callable[[str], T],
+    ) -> None:
+        """
+        执行调用并广播结果
+
+        :param key: 合并键
+        :param flight: 进行中的调用
+        :param fn: 调用函数
+        :param encode: 结果序列化函数
+        :param decode: 结果反序列化函数
+        :return:
+        """
+        source = self._cluster(key, fn, encode, decode) if settings.LLM_SINGLEFLIGHT_CLUSTER_ENABLED else fn()
+        try:
+            async for item in source:
+                flight.publish(item)
+        except Exception as e:
+            flight.finish(e)
+        else:
+            flight.finish()
+        finally:
+            if not flight.done:
+                flight.finish(asyncio.CancelledError())
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def _cluster(
+        self,
+        key: str,
+        fn: Callable[[], AsyncIterator[T]],
+        encode: Callable[[T], str],
+        decode: Callable[[str], T],
+    ) -> AsyncIterator[T]:
+        """
+        集群内合并
+
+        :param key: 合并键
+        :param fn: 调用函数
+        :param encode: 结果序列化函数
+        :param decode: 结果反序列化函数
+        :return:
+        """
+        lock_key = f'{settings.LLM_SINGLEFLIGHT_REDIS_PREFIX}:{key}'
+        token = uuid.uuid4().hex
+        try:
+            if await redis_client.set(lock_key, token, nx=True, px=settings.LLM_SINGLEFLIGHT_LOCK_TTL_MS):
+                leader_token = token
+            else:
+                leader_token = await redis_client.get(lock_key)
+        except Exception as e:
+            log.warning(f'[LLM SingleFlight] 集群协调失败，退化为本地合并: {e}')
+            leader_token = None
+
+        if leader_token is None:
+            # Redis 不可用或 leader 刚结束
+            async for item in fn():
+                yield item
+        elif leader_token == token:
+            async for item in self._lead(lock_key, token, fn, encode):
+                yield item
+        else:
+            async for item in self._follow(lock_key, leader_token, fn, decode):
+                yield item
+
+    @staticmethod
+    async def _renew(lock_key: str, token: str) -> bool:
+        """
+        续期 leader 锁及结果 Stream
+
+        :param lock_key: 锁键
+        :param token: 本次调用标识
+        :return: 是否仍持有锁
+        """
+        ttl = settings.LLM_SINGLEFLIGHT_LOCK_TTL_MS
+        try:
+            if await redis_client.get(lock_key) != token:
+                return False
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.pexpire(lock_key, ttl)
+                pipe.pexpire(f'{lock_key}:{token}', ttl)
+                await pipe.execute()
+        except Exception as e:
+            log.warning(f'[LLM SingleFlight] 锁续期失败: {e}')
+        return True
+
+    @staticmethod
+    async def _heartbeat(lock_key: str, token: str) -> None:
+        """
+        调用期间定期续期 leader 锁，直到被取消或锁已不属于本次调用
+
+        :param lock_key: 锁键
+        :param token: 本次调用标识
+        :return:
+        """
+        while True:
+            await asyncio.sleep(settings.LLM_SINGLEFLIGHT_LOCK_TTL_MS / 3000)
+            if not await SingleFlight._renew(lock_key, token):
+                return
+
+    @staticmethod
+    def _error_fields(error: Exception) -> dict[str, str]:
+        """
+        错误事件，附带上游错误状态码，使 follower 返回与 leader 相同的状态码
+
+        :param error: 调用异常
+        :return:
+        """
+        fields = {'error': str(error)}
+        status_code = getattr(error, 'status_code', None)
+        if isinstance(status_code, int):
+            fields['status_code'] = str(status_code)
+        return fields
+
+    @staticmethod
+    async def _lead(
+        lock_key: str, token: str, fn: Callable[[], AsyncIterator[T]], encode: Callable[[T], str]
+    ) -> AsyncIterator[T]:
+        """
+        作为集群 leader 执行调用，结果写入 Redis Stream
+
+        :param lock_key: 锁键
+        :param token: 本次调用标识
+        :param fn: 调用函数
+        :param encode: 结果序列化函数
+        :return:
+        """
+        events_key = f'{lock_key}:{token}'
+        ttl = settings.LLM_SINGLEFLIGHT_LOCK_TTL_MS
+        broadcasting = True
+
+        async def broadcast(fields: dict[str, str]) -> None:
+            nonlocal broadcasting
+            if not broadcasting:
+                return
+            try:
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    pipe.xadd(events_key, fields)
+                    pipe.pexpire(events_key, ttl)
+                    pipe.pexpire(lock_key, ttl)
+                    await pipe.execute()
+            except Exception as e:
+                broadcasting = False
+                log.warning(f'[LLM SingleFlight] 结果广播失败: {e}')
+
+        # 调用耗时超过锁有效期时持续续期，避免 follower 误判 leader 失联或产生第二个 leader
+        renewing = asyncio.create_task(SingleFlight._heartbeat(lock_key, token))
+        try:
+            async for item in fn():
+                await broadcast({'data': encode(item)})
+                yield item
+        except Exception as e:
+            await broadcast(SingleFlight._error_fields(e))
+            raise
+        except BaseException:
+            # 被取消或订阅者全部断开：通知 follower 自行调用或结束
+            await broadcast({'cancel': '1'})
+            raise
+        else:
+            await broadcast({'end': '1'})
+        finally:
+            renewing.cancel()
+            with contextlib.suppress(Exception):
+                if await redis_client.get(lock_key) == token:
+                    await redis_client.delete(lock_key)
+
+    @staticmethod
+    async def _events(lock_key: str, token: str) -> AsyncIterator[dict[str, str]]:
+        """
+        读取 leader 广播的事件，leader 失联时以 cancel 事件结束
+
+        :param lock_key: 锁键
+        :param token: leader 调用标识
+        :return:
+        """
+        events_key = f'{lock_key}:{token}'
+        last_id = '0'
+        # 阻塞时间需小于 Redis 读超时，否则连接会在等待期间超时
+        block = max(min(settings.LLM_SINGLEFLIGHT_CLUSTER_WAIT_MS, settings.REDIS_TIMEOUT * 1000 // 2), 1)
+        while True:
+            try:
+                response: Any = await redis_client.xread({events_key: last_id}, count=100, block=block)
+            except RedisTimeoutError:
+                response = None
+            if not response:
+                if await redis_client.get(lock_key) == token:
+                    continue
+                yield {'cancel': 'lost'}
+                return
+            for entry_id, fields in response[0][1]:
+                last_id = entry_id
+                yield fields
+
+    @staticmethod
+    async def _follow(
+        lock_key: str, token: str, fn: Callable[[], AsyncIterator[T]], decode: Callable[[str], T]
+    ) -> AsyncIterator[T]:
+        """
+        作为集群 follower 订阅其他节点的结果
+
+        :param lock_key: 锁键
+        :param token: leader 调用标识
+        :param fn: 调用函数（leader 未产生结果即失联或被取消时自行调用）
+        :param decode: 结果反序列化函数
+        :return:
+        """
+        received = False
+        async with contextlib.aclosing(SingleFlight._events(lock_key, token)) as events:
+            async for fields in events:
+                if 'data' in fields:
+                    received = True
+                    yield decode(fields['data'])
+                elif 'error' in fields:
+                    status_code = fields.get('status_code')
+                    raise SingleFlightError(fields['error'], int(status_code) if status_code else None)
+                elif 'cancel' not in fields:
+                    return
+                elif received:
+                    raise SingleFlightError('Coalesced request leader lost')
+                else:
+                    break
+
+        async for item in fn():
+            yield item
+
+
+# 创建全局请求合并实例
+singleflight = SingleFlight()
@@ -0,0 +1,310 @@
+"""SSE 流式响应编码器"""
+
+import time
+
+from typing import Any
+
+from msgspec import Struct, json
+
+from backend.app.llm.core.stream import StreamDelta, StreamError, StreamEvent, StreamStart, StreamUsage, ToolCallDelta
+
+
+def _enc_hook(obj: Any) -> Any:
+    """
+    msgspec 编码回调，兼容 LiteLLM 返回的 pydantic 对象
+
+    :param obj: 待编码对象
+    :return:
+    """
+    if hasattr(obj, 'model_dump'):
+        return obj.model_dump(exclude_none=True)
+    raise NotImplementedError(f'Objects of type {type(obj)} are not supported')
+
+
+_encoder = json.Encoder(enc_hook=_enc_hook)
+
+
+class _ChunkDelta(Struct):
+    """流式响应增量"""
+
+    role: str | None = None
+    content: str | None = None
+    tool_calls: list[Any] | None = None
+
+
+class ChatChunkEncoder:
+    """
+    OpenAI 格式流式响应块编码器
+
+    同一个流中 id/created/model 不变，预先编码为固定前缀，每个 chunk 只编码增量部分，
+    输出与 ChatCompletionChunk.model_dump_json 一致
+    """
+
+    __slots__ = ('_head', '_prefix')
+
+    def __init__(self, *, chunk_id: str, model: str, created: int | None = None) -> None:
+        """
+        :param chunk_id: 响应 ID
+        :param model: 模型名称
+        :param created: 创建时间戳，默认当前时间
+        :return:
+        """
+        if created is None:
+            created = int(time.time())
+        self._head = (
+            f'data: {{"id":{_encoder.encode(chunk_id).decode()},"object":"chat.completion.chunk",'
+            f'"created":{created},"model":{_encoder.encode(model).decode()},'
+        )
+        self._prefix = f'{self._head}"choices":[{{"index":0,"delta":'
+
+    def encode(
+        self,
+        *,
+        role: str | None = None,
+        content: str | None = None,
+        tool_calls: list[Any] | None = None,
+        finish_reason: str | None = None,
+    ) -> str:
+        """
+        编码单个流式响应块
+
+        :param role: 角色
+        :param content: 内容增量
+        :param tool_calls: 工具调用增量
+        :param finish_reason: 结束原因
+        :return: SSE 数据行
+        """
+        delta = _encoder.encode(_ChunkDelta(role=role, content=content, tool_calls=tool_calls)).decode()
+        finish = 'null' if finish_reason is None else _encoder.encode(finish_reason).decode()
+        return f'{self._prefix}{delta},"finish_reason":{finish}}}],"system_fingerprint":null}}\n\n'
+
+    def encode_usage(self, *, input_tokens: int, output_tokens: int) -> str:
+        """
+        编码用量块（stream_options.include_usage）
+
+        :param input_tokens: 输入 tokens
+        :param output_tokens: 输出 tokens
+        :return: SSE 数据行
+        """
+        return (
+            f'{self._head}"choices":[],"usage":{{"prompt_tokens":{input_tokens},'
+            f'"completion_tokens":{output_tokens},"total_tokens":{input_tokens + output_tokens}}}}}\n\n'
+        )
+
+    @staticmethod
+    def passthrough(chunk: Any) -> str:
+        """
+        透传供应商响应块
+
+        :param chunk: LiteLLM 响应块
+        :return: SSE 数据行
+        """
+        return f'data: {_encoder.encode(chunk).decode()}\n\n'
+
+
+def _openai_tool_calls(tool_calls: list[ToolCallDelta] | None) -> list[dict[str, Any]] | None:
+    """
+    转换为 OpenAI 工具调用增量格式
+
+    :param tool_calls: 工具调用增量列表
+    :return:
+    """
+    if not tool_calls:
+        return None
+    result = []
+    for call in tool_calls:
+        item: dict[str, Any] = {'index': call.index}
+        if call.id is not None:
+            item['id'] = call.id
+            item['type'] = 'function'
+        function = {}
+        if call.name is not None:
+            function['name'] = call.name
+        if call.arguments is not None:
+            function['arguments'] = call.arguments
+        if function:
+            item['function'] = function
+        result.append(item)
+    return result
+
+
+class OpenAIStreamEncoder:
+    """OpenAI Chat Completions 流式协议编码器"""
+
+    def __init__(self, *, include_usage: bool = False, passthrough: bool = False) -> None:
+        """
+        :param include_usage: 是否在结束前输出用量块
+        :param passthrough: 是否透传供应商响应块
+        :return:
+        """
+        self._include_usage = include_usage
+        self._passthrough = passthrough
+        self._chunk: ChatChunkEncoder | None = None
+
+    def encode(self, event: StreamEvent) -> str:
+        """
+        编码流式事件
+
+        :param event: 流式事件
+        :return: SSE 数据
+        """
+        if isinstance(event, StreamDelta):
+            if self._passthrough and event.raw is not None:
+                return ChatChunkEncoder.passthrough(event.raw)
+            return self._chunk.encode(
+                role=event.role,
+                content=event.content,
+                tool_calls=_openai_tool_calls(event.tool_calls),
+                finish_reason=event.finish_reason,
+            )
+        if isinstance(event, StreamStart):
+            self._chunk = ChatChunkEncoder(chunk_id=event.id, model=event.model, created=event.created)
+            return ''
+        if isinstance(event, StreamUsage):
+            if self._include_usage and self._chunk is not None:
+                usage = self._chunk.encode_usage(input_tokens=event.input_tokens, output_tokens=event.output_tokens)
+                return f'{usage}data: [DONE]\n\n'
+            return 'data: [DONE]\n\n'
+        if isinstance(event, StreamError):
+            error = _encoder.encode({'error': {'message': event.message, 'type': 'gateway_error'}}).decode()
+            return f'data: {error}\n\n'
+        return ''
+
+
+# OpenAI finish_reason 到 Anthropic stop_reason 的映射
+ANTHROPIC_STOP_REASONS = {
+    'stop': 'end_turn',
+    'length': 'max_tokens',
+    'tool_calls': 'tool_use',
+    'function_call': 'tool_use',
+    'content_filter': 'end_turn',
+}
+
+
+def _anthropic_event(event_type: str, data: dict[str, Any]) -> str:
+    """
+    编码 Anthropic SSE 事件
+
+    :param event_type: 事件类型
+    :param data: 事件数据
+    :return:
+    """
+    return f'event: {event_type}\ndata: {_encoder.encode({"type": event_type, **data}).decode()}\n\n'
+
+
+class AnthropicStreamEncoder:
+    """
+    Anthropic Messages 流式协议编码器
+
+    文本与工具调用分别映射为 text / tool_use 内容块，工具调用参数以 input_json_delta 增量输出
+    """
+
+    def __init__(self) -> None:
+        self._next_index = 0
+        self._text_index: int | None = None
+        self._tool_blocks: dict[int, int] = {}
+        self._stop_reason: str | None = None
+
+    def _start_block(self, content_block: dict[str, Any]) -> tuple[int, str]:
+        """
+        开始新的内容块
+
+        :param content_block: 内容块
+        :return: 内容块索引及 SSE 数据
+        """
+        index = self._next_index
+        self._next_index += 1
+        return index, _anthropic_event('content_block_start', {'index': index, 'content_block': content_block})
+
+    def _stop_text_block(self) -> str:
+        """结束当前文本内容块"""
+        if self._text_index is None:
+            return ''
+        index, self._text_index = self._text_index, None
+        return _anthropic_event('content_block_stop', {'index': index})
+
+    def _stop_blocks(self) -> str:
+        """结束所有未结束的内容块"""
+        output = self._stop_text_block()
+        for index in sorted(self._tool_blocks.values()):
+            output += _anthropic_event('content_block_stop', {'index': index})
+        self._tool_blocks.clear()
+        return output
+
+    def _encode_delta(self, event: StreamDelta) -> str:
+        """
+        编码内容增量
+
+        上游可能交错输出多个工具调用的参数，每个工具调用对应的 tool_use 内容块保持打开直到消息结束，
+        参数增量始终写入其所属的内容块
+
+        :param event: 内容增量事件
+        :return:
+        """
+        output = ''
+        if event.content:
+            if self._text_index is None:
+                self._text_index, started = self._start_block({'type': 'text', 'text': ''})
+                output += started
+            output += _anthropic_event(
+                'content_block_delta',
+                {'index': self._text_index, 'delta': {'type': 'text_delta', 'text': event.content}},
+            )
+        for call in event.tool_calls or ():
+            if call.index not in self._tool_blocks:
+                output += self._stop_text_block()
+                self._tool_blocks[call.index], started = self._start_block({
+                    'type': 'tool_use',
+                    'id': call.id or f'toolu_{call.index}',
+                    'name': call.name or '',
+                    'input': {},
+                })
+                output += started
+            if call.arguments:
+                output += _anthropic_event(
+                    'content_block_delta',
+                    {
+                        'index': self._tool_blocks[call.index],
+                        'delta': {'type': 'input_json_delta', 'partial_json': call.arguments},
+                    },
+                )
+        if event.finish_reason:
+            self._stop_reason = ANTHROPIC_STOP_REASONS.get(event.finish_reason, 'end_turn')
+        return output
+
+    def encode(self, event: StreamEvent) -> str:
+        """
+        编码流式事件
+
+        :param event: 流式事件
+        :return: SSE 数据
+        """
+        if isinstance(event, StreamDelta):
+            return self._encode_delta(event)
+        if isinstance(event, StreamStart):
+            message = {
+                'id': event.id,
+                'type': 'message',
+                'role': 'assistant',
+                'content': [],
+                'model': event.model,
+                'stop_reason': None,
+                'stop_sequence': None,
+                'usage': {'input_tokens': event.input_tokens, 'output_tokens': 0},
+            }
+            return _anthropic_event('message_start', {'message': message})
+        if isinstance(event, StreamUsage):
+            return (
+                self._stop_blocks()
+                + _anthropic_event(
+                    'message_delta',
+                    {
+                        'delta': {'stop_reason': self._stop_reason or 'end_turn', 'stop_sequence': None},
+                        'usage': {'input_tokens': event.input_tokens, 'output_tokens': event.output_tokens},
+                    },
+                )
+                + _anthropic_event('message_stop', {})
+            )
+        if isinstance(event, StreamError):
+            return _anthropic_event('error', {'error': {'type': 'api_error', 'message': event.message}})
+        return ''
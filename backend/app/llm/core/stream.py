@@ -0,0 +1,109 @@
+"""流式响应内部事件
+
+网关将供应商响应块归一化为以下事件，再由各协议编码器（OpenAI / Anthropic）直接编码输出
+"""
+
+from typing import Any
+
+from msgspec import Struct, json, structs
+
+
+class StreamStart(Struct, tag=True):
+    """流开始"""
+
+    id: str
+    model: str
+    created: int
+    input_tokens: int = 0
+
+
+class ToolCallDelta(Struct):
+    """工具调用增量"""
+
+    index: int
+    id: str | None = None
+    name: str | None = None
+    arguments: str | None = None
+
+
+class StreamDelta(Struct, tag=True):
+    """内容增量"""
+
+    role: str | None = None
+    content: str | None = None
+    tool_calls: list[ToolCallDelta] | None = None
+    finish_reason: str | None = None
+    raw: Any = None
+
+
+class StreamUsage(Struct, tag=True):
+    """流结束及用量"""
+
+    input_tokens: int
+    output_tokens: int
+
+
+class StreamError(Struct, tag=True):
+    """流错误"""
+
+    message: str
+
+
+StreamEvent = StreamStart | StreamDelta | StreamUsage | StreamError
+
+_event_decoder = json.Decoder(StreamEvent)
+
+
+def encode_event(event: StreamEvent) -> str:
+    """
+    序列化流式事件（用于跨进程广播，不含原始响应块）
+
+    :param event: 流式事件
+    :return:
+    """
+    if isinstance(event, StreamDelta) and event.raw is not None:
+        event = structs.replace(event, raw=None)
+    return json.encode(event).decode()
+
+
+def decode_event(data: str) -> StreamEvent:
+    """
+    反序列化流式事件
+
+    :param data: 序列化数据
+    :return:
+    """
+    return _event_decoder.decode(data)
+
+
+def _get(obj: Any, key: str) -> Any:
+    """兼容字典与对象取值"""
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(key)
+    return getattr(obj, key, None)
+
+
+def parse_tool_calls(tool_calls: list[Any] | None) -> list[ToolCallDelta] | None:
+    """
+    解析供应商工具调用增量
+
+    :param tool_calls: LiteLLM 工具调用增量列表
+    :return:
+    """
+    if not tool_calls:
+        return None
+    result = []
+    for position, call in enumerate(tool_calls):
+        function = _get(call, 'function')
+        index = _get(call, 'index')
+        result.append(
+            ToolCallDelta(
+                index=position if index is None else index,
+                id=_get(call, 'id'),
+                name=_get(function, 'name'),
+                arguments=_get(function, 'arguments'),
+            )
+        )
+    return result
@@ -0,0 +1,152 @@
+"""Token 计数器实现"""
+
+import asyncio
+import re
+
+from functools import lru_cache
+from typing import Any
+
+from backend.common.log import log
+
+# OpenAI 消息格式开销（参考 tiktoken 官方计数方式）
+_TOKENS_PER_MESSAGE = 3
+_TOKENS_PER_REPLY = 3
+
+# CJK 字符通常一个字符对应约一个 token
+_CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+
+
+@lru_cache(maxsize=1)
+def _load_tiktoken() -> Any:
+    """延迟加载 tiktoken（可选依赖）"""
+    try:
+        import tiktoken
+    except ImportError:
+        log.warning('[LLM Tokenizer] 未安装 tiktoken，token 计数将使用启发式估算')
+        return None
+    return tiktoken
+
+
+# 启动时预加载的编码（首次加载可能需要下载 BPE 文件）
+_PRELOAD_ENCODINGS = ('o200k_base', 'cl100k_base')
+_PRELOAD_TIMEOUT = 30
+
+_encodings: dict[str, Any] = {}
+
+
+def _load_encoding(tiktoken: Any, name: str) -> None:
+    """
+    加载单个编码
+
+    :param tiktoken: tiktoken 模块
+    :param name: 编码名称
+    :return:
+    """
+    try:
+        _encodings[name] = tiktoken.get_encoding(name)
+    except Exception as e:
+        log.warning(f'[LLM Tokenizer] tiktoken 编码 {name} 加载失败，将使用启发式估算: {e}')
+
+
+def preload_encodings() -> None:
+    """加载 tiktoken 编码（阻塞调用，需在线程中执行）"""
+    tiktoken = _load_tiktoken()
+    if tiktoken is None:
+        return
+    for name in _PRELOAD_ENCODINGS:
+        _load_encoding(tiktoken, name)
+    _get_encoding.cache_clear()
+
+
+@lru_cache(maxsize=256)
+def _get_encoding(model_name: str) -> Any:
+    """
+    获取模型编码器，仅使用已预加载的编码，避免在事件循环中下载 BPE 文件
+
+    :param model_name: 模型名称
+    :return:
+    """
+    if not _encodings:
+        return None
+    tiktoken = _load_tiktoken()
+    # 兼容 provider/model 形式的模型名称
+    name = model_name.rsplit('/', 1)[-1]
+    try:
+        encoding_name = tiktoken.model.encoding_name_for_model(name)
+    except Exception:
+        encoding_name = 'o200k_base' if name.startswith(('gpt-4o', 'o1', 'o3', 'o4')) else 'cl100k_base'
+    return _encodings.get(encoding_name) or _encodings.get('cl100k_base')
+
+
+class TokenCounter:
+    """
+    Token 计数器
+
+    优先使用启动时预加载的 tiktoken 编码按模型计数，编码器按模型名 LRU 缓存；
+    tiktoken 不可用、编码未加载或计数失败时退化为区分 CJK 字符的启发式估算
+    """
+
+    @staticmethod
+    async def preload() -> None:
+        """预加载 tiktoken 编码，超时后在后台继续加载，加载完成前使用启发式估算"""
+        try:
+            await asyncio.wait_for(asyncio.to_thread(preload_encodings), timeout=_PRELOAD_TIMEOUT)
+        except asyncio.TimeoutError:
+            log.warning('[LLM Tokenizer] tiktoken 编码加载超时，加载完成前使用启发式估算')
+
+    @staticmethod
+    def _estimate(text: str) -> int:
+        """
+        启发式估算 tokens
+
+        :param text: 文本
+        :return:
+        """
+        cjk = len(_CJK_PATTERN.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+
+    def count_text(self, model_name: str, text: str) -> int:
+        """
+        计算文本 tokens
+
+        :param model_name: 模型名称
+        :param text: 文本
+        :return:
+        """
+        if not text:
+            return 0
+        encoding = _get_encoding(model_name)
+        if encoding is None:
+            return self._estimate(text)
+        try:
+            return len(encoding.encode(text, disallowed_special=()))
+        except Exception as e:
+            log.warning(f'[LLM Tokenizer] tiktoken 计数失败，使用启发式估算: {e}')
+            return self._estimate(text)
+
+    def count_messages(self, model_name: str, messages: list[dict[str, Any]]) -> int:
+        """
+        计算消息列表 tokens
+
+        :param model_name: 模型名称
+        :param messages: 消息列表
+        :return:
+        """
+        total = _TOKENS_PER_REPLY
+        for message in messages:
+            total += _TOKENS_PER_MESSAGE
+            for key, value in message.items():
+                if isinstance(value, str):
+                    total += self.count_text(model_name, value)
+                elif key == 'content' and isinstance(value, list):
+                    # 多模态内容只计算文本部分
+                    for part in value:
+                        if isinstance(part, dict) and part.get('type') == 'text':
+                            total += self.count_text(model_name, part.get('text', ''))
+                elif value is not None:
+                    total += self.count_text(model_name, str(value))
+        return total
+
+
+# 创建全局 token 计数器实例
+token_counter = TokenCounter()
@@ -0,0 +1,308 @@
+"""OpenAI 兼容供应商原生传输"""
+
+import asyncio
+import contextlib
+import dataclasses
+
+from collections.abc import AsyncGenerator, AsyncIterator
+from importlib.util import find_spec
+from typing import Any
+
+import httpx
+
+from msgspec import json
+
+from backend.app.llm.core.routing import ModelRoute
+from backend.app.llm.model.provider import ModelProvider
+from backend.common.log import log
+from backend.core.conf import settings
+
+# HTTP/2 依赖 h2，未安装时退化为 HTTP/1.1
+_HTTP2_AVAILABLE = find_spec('h2') is not None
+
+# 仅供 LiteLLM 使用的调用参数
+_LITELLM_ONLY_PARAMS = {'api_key', 'api_base'}
+
+
+class NativeTransportError(Exception):
+    """
+    上游请求失败
+
+    与 LiteLLM 异常一致通过 status_code 表示错误类型：上游返回的错误状态码，连接失败时为 502；
+    超时抛出 TimeoutError，由调度器按超时处理
+    """
+
+    def __init__(self, status_code: int, message: str) -> None:
+        super().__init__(f'Upstream error {status_code}: {message}')
+        self.status_code = status_code
+
+
+@dataclasses.dataclass
+class _ClientEntry:
+    """供应商客户端及其引用计数"""
+
+    base_url: str
+    client: httpx.AsyncClient
+    refs: int = 0
+    retired: bool = False
+
+
+class NativeTransport:
+    """
+    OpenAI 兼容供应商原生传输
+
+    每个供应商保持一个长连接 httpx.AsyncClient（连接池 + HTTP/2），启动及路由表重建时预热连接，
+    流式响应按行增量解析；其他供应商仍通过 LiteLLM 调用。
+    供应商地址变更或被移除时客户端先退役，进行中的请求全部结束后再关闭
+    """
+
+    def __init__(self) -> None:
+        self._clients: dict[int, _ClientEntry] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    @staticmethod
+    def supports(route: ModelRoute) -> bool:
+        """
+        路由是否使用原生传输
+
+        :param route: 模型路由
+        :return:
+        """
+        return (
+            settings.LLM_NATIVE_TRANSPORT_ENABLED
+            and bool(route.provider.api_base_url)
+            and route.provider.provider_type in settings.LLM_NATIVE_TRANSPORT_PROVIDER_TYPES
+        )
+
+    def _close_later(self, client: httpx.AsyncClient) -> None:
+        """
+        后台关闭客户端
+
+        :param client: 客户端
+        :return:
+        """
+        task = asyncio.create_task(client.aclose())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _retire(self, entry: _ClientEntry) -> None:
+        """
+        退役客户端，无进行中的请求时立即关闭
+
+        :param entry: 客户端
+        :return:
+        """
+        entry.retired = True
+        if entry.refs == 0:
+            self._close_later(entry.client)
+
+    @contextlib.asynccontextmanager
+    async def _lease(self, provider: ModelProvider) -> AsyncGenerator[httpx.AsyncClient, None]:
+        """
+        借用供应商客户端，归还前客户端不会被关闭
+
+        :param provider: 供应商
+        :return:
+        """
+        entry = self._get_entry(provider)
+        entry.refs += 1
+        try:
+            yield entry.client
+        finally:
+            entry.refs -= 1
+            if entry.retired and entry.refs == 0:
+                self._close_later(entry.client)
+
+    def _get_entry(self, provider: ModelProvider) -> _ClientEntry:
+        """
+        获取供应商客户端，地址变更时重建
+
+        :param provider: 供应商
+        :return:
+        """
+        base_url = provider.api_base_url.rstrip('/')
+        entry = self._clients.get(provider.id)
+        if entry is not None:
+            if entry.base_url == base_url:
+                return entry
+            self._retire(entry)
+
+        client = httpx.AsyncClient(
+            base_url=base_url,
+            http2=settings.LLM_NATIVE_TRANSPORT_HTTP2 and _HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=settings.LLM_NATIVE_TRANSPORT_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_NATIVE_TRANSPORT_MAX_KEEPALIVE,
+                keepalive_expiry=settings.LLM_NATIVE_TRANSPORT_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                settings.LLM_NATIVE_TRANSPORT_READ_TIMEOUT, connect=settings.LLM_NATIVE_TRANSPORT_CONNECT_TIMEOUT
+            ),
+        )
+        entry = self._clients[provider.id] = _ClientEntry(base_url=base_url, client=client)
+        return entry
+
+    @staticmethod
+    def _headers(route: ModelRoute) -> dict[str, str]:
+        """
+        构建请求头
+
+        :param route: 模型路由
+        :return:
+        """
+        headers = {'Content-Type': 'application/json'}
+        if route.api_key:
+            headers['Authorization'] = f'Bearer {route.api_key}'
+        return headers
+
+    @staticmethod
+    def _payload(route: ModelRoute, params: dict[str, Any]) -> bytes:
+        """
+        构建请求体
+
+        :param route: 模型路由
+        :param params: LiteLLM 调用参数
+        :return:
+        """
+        payload = {k: v for k, v in params.items() if k not in _LITELLM_ONLY_PARAMS}
+        # LiteLLM 参数中的模型名称可能带有供应商前缀
+        payload['model'] = route.model_config.model_name
+        return json.encode(payload)
+
+    @staticmethod
+    @contextlib.asynccontextmanager
+    async def _translate_errors() -> AsyncGenerator[None, None]:
+        """将 httpx 异常转换为调度器可识别的超时及上游错误"""
+        try:
+            yield
+        except httpx.TimeoutException as e:
+            raise TimeoutError(f'Upstream timed out: {e}') from e
+        except httpx.HTTPError as e:
+            raise NativeTransportError(502, str(e) or type(e).__name__) from e
+
+    @staticmethod
+    async def _raise_for_status(response: httpx.Response) -> None:
+        """
+        检查响应状态
+
+        :param response: 响应
+        :return:
+        """
+        if response.is_success:
+            return
+        await response.aread()
+        try:
+            message = json.decode(response.content)['error']['message']
+        except Exception:
+            message = response.text[:500]
+        raise NativeTransportError(response.status_code, message)
+
+    async def _post(self, route: ModelRoute, path: str, params: dict[str, Any]) -> dict[str, Any]:
+        """
+        发送非流式请求
+
+        :param route: 模型路由
+        :param path: 请求路径
+        :param params: LiteLLM 调用参数
+        :return:
+        """
+        async with self._lease(route.provider) as client, self._translate_errors():
+            response = await client.post(path, content=self._payload(route, params), headers=self._headers(route))
+            await self._raise_for_status(response)
+        return json.decode(response.content)
+
+    async def completion(self, route: ModelRoute, params: dict[str, Any]) -> dict[str, Any]:
+        """
+        聊天补全（非流式）
+
+        :param route: 模型路由
+        :param params: LiteLLM 调用参数
+        :return: OpenAI 格式响应
+        """
+        return await self._post(route, '/chat/completions', params)
+
+    async def embedding(self, route: ModelRoute, params: dict[str, Any]) -> dict[str, Any]:
+        """
+        文本向量化
+
+        :param route: 模型路由
+        :param params: LiteLLM 调用参数
+        :return: OpenAI 格式响应
+        """
+        return await self._post(route, '/embeddings', params)
+
+    async def stream(self, route: ModelRoute, params: dict[str, Any]) -> AsyncIterator[dict[str, Any]]:
+        """
+        聊天补全（流式），首次迭代时发起请求
+
+        :param route: 模型路由
+        :param params: LiteLLM 调用参数
+        :return: OpenAI 格式响应块
+        """
+        async with self._lease(route.provider) as client, self._translate_errors():
+            request = client.build_request(
+                'POST', '/chat/completions', content=self._payload(route, params), headers=self._headers(route)
+            )
+            response = await client.send(request, stream=True)
+            try:
+                await self._raise_for_status(response)
+                async for line in response.aiter_lines():
+                    if not line.startswith('data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == '[DONE]':
+                        return
+                    yield json.decode(data)
+            finally:
+                await response.aclose()
+
+    async def _warm(self, route: ModelRoute) -> None:
+        """
+        预热供应商连接
+
+        :param route: 模型路由
+        :return:
+        """
+        try:
+            async with self._lease(route.provider) as client:
+                await client.get(
+                    '/models', headers=self._headers(route), timeout=settings.LLM_NATIVE_TRANSPORT_CONNECT_TIMEOUT
+                )
+        except Exception as e:
+            log.warning(f'[LLM Transport] {route.provider.name} 连接预热失败: {e}')
+
+    async def sync(self, routes: list[ModelRoute]) -> None:
+        """
+        按路由表同步客户端：关闭已移除供应商的客户端，预热其余供应商连接
+
+        :param routes: 路由列表
+        :return:
+        """
+        targets = {route.provider.id: route for route in routes if self.supports(route)}
+        for provider_id in list(self._clients):
+            if provider_id not in targets:
+                self._retire(self._clients.pop(provider_id))
+        await asyncio.gather(*(self._warm(route) for route in targets.values()))
+
+    def on_routes_changed(self, routes: list[ModelRoute]) -> None:
+        """
+        路由表重建回调，后台同步客户端
+
+        :param routes: 路由列表
+        :return:
+        """
+        task = asyncio.create_task(self.sync(routes))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self) -> None:
+        """关闭所有客户端"""
+        clients = [entry.client for entry in self._clients.values()]
+        self._clients.clear()
+        for client in clients:
+            with contextlib.suppress(Exception):
+                await client.aclose()
+
+
+# 创建全局原生传输实例
+native_transport = NativeTransport()
@@ -0,0 +1,403 @@
+"""用量日志分区管理"""
+
+import zlib
+
+from datetime import datetime
+from pathlib import Path
+
+from anyio import Path as AsyncPath
+from anyio import open_file
+from msgspec import json
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.app.llm.core.usage_rollup import usage_rollup
+from backend.app.llm.crud.crud_usage_log import usage_log_dao
+from backend.app.llm.model.usage_log import UsageLog
+from backend.common.enums import DataBaseType, PrimaryKeyType
+from backend.common.log import log
+from backend.core.conf import settings
+from backend.core.path_conf import LLM_USAGE_ARCHIVE_DIR
+from backend.database.db import async_db_session
+from backend.utils.timezone import timezone
+
+_TABLE = UsageLog.__tablename__
+
+# MySQL 兜底分区，存放超出已创建分区范围的数据
+_MYSQL_MAX_PARTITION = 'p_max'
+
+
+class UsageLogPartitioner:
+    """
+    用量日志分区管理
+
+    按月创建 created_time 范围分区并预创建未来分区；超过保留期且已汇总的分区导出为 gzip 压缩的 JSONL 文件后整体删除，
+    无需大批量 DELETE。PostgreSQL 通过 DEFAULT 分区、MySQL 通过 MAXVALUE 分区兜底未预创建月份的数据。
+    启动及定时任务只创建缺失的月份分区，已有的普通表需通过 `fba usage-partition` 命令一次性转换（见 migrate）
+    """
+
+    @staticmethod
+    def _month_start(t: datetime) -> datetime:
+        return timezone.from_datetime(t).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def _add_months(t: datetime, months: int) -> datetime:
+        index = t.year * 12 + t.month - 1 + months
+        return t.replace(year=index // 12, month=index % 12 + 1)
+
+    @staticmethod
+    def _is_mysql() -> bool:
+        return DataBaseType.mysql == settings.DATABASE_TYPE
+
+    @staticmethod
+    def _bound(t: datetime) -> str:
+        """
+        分区边界值，MySQL DATETIME 不带时区
+
+        :param t: 时间
+        :return:
+        """
+        if UsageLogPartitioner._is_mysql():
+            return t.strftime('%Y-%m-%d %H:%M:%S')
+        return t.isoformat(sep=' ')
+
+    @staticmethod
+    async def _partitions(db: AsyncSession) -> dict[datetime, str]:
+        """
+        获取已创建的月份分区
+
+        :param db: 数据库会话
+        :return: 月份到分区名称的映射
+        """
+        if UsageLogPartitioner._is_mysql():
+            stmt = text(
+                'SELECT partition_name FROM information_schema.partitions '
+                'WHERE table_schema = DATABASE() AND table_name = :table AND partition_name IS NOT NULL'
+            )
+        else:
+            stmt = text(
+                'SELECT child.relname FROM pg_inherits '
+                'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+                'WHERE pg_inherits.inhparent = to_regclass(:table)'
+            )
+        names = (await db.execute(stmt, {'table': _TABLE})).scalars().all()
+        partitions = {}
+        for name in names:
+            suffix = name.rsplit('p', 1)[-1]
+            if suffix.isdigit() and len(suffix) == 6:
+                month = datetime(int(suffix[:4]), int(suffix[4:]), 1, tzinfo=timezone.tz_info)
+                partitions[month] = name
+        return partitions
+
+    def _months(self, first: datetime | None = None) -> list[datetime]:
+        """
+        需要存在的月份：从 first 所在月份（默认当月）到预创建的最后一个月
+
+        :param first: 最早数据时间
+        :return:
+        """
+        current = self._month_start(timezone.now())
+        month = current if first is None else min(self._month_start(first), current)
+        last = self._add_months(current, settings.LLM_USAGE_LOG_PARTITION_PRECREATE_MONTHS)
+        months = []
+        while month <= last:
+            months.append(month)
+            month = self._add_months(month, 1)
+        return months
+
+    @staticmethod
+    async def _table_kind(db: AsyncSession) -> str | None:
+        """
+        获取 PostgreSQL 表类型，p 为分区表，r 为普通表，表不存在时为空
+
+        :param db: 数据库会话
+        :return:
+        """
+        stmt = text('SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)')
+        return (await db.execute(stmt, {'table': _TABLE})).scalar()
+
+    def _postgresql_bounds(self, month: datetime) -> str:
+        return f"FOR VALUES FROM ('{self._bound(month)}') TO ('{self._bound(self._add_months(month, 1))}')"
+
+    async def _create_postgresql_partition(self, db: AsyncSession, month: datetime) -> None:
+        """
+        创建 PostgreSQL 月份分区
+
+        DEFAULT 分区中已有该月数据时无法直接创建分区，先创建独立表并将数据从 DEFAULT 分区迁入，再挂载为分区
+
+        :param db: 数据库会话
+        :param month: 月份
+        :return:
+        """
+        name = f'{_TABLE}_p{month:%Y%m}'
+        bounds = self._postgresql_bounds(month)
+        params = {'start': month, 'end': self._add_months(month, 1)}
+        condition = 'created_time >= :start AND created_time < :end'
+        stmt = text(f'SELECT EXISTS (SELECT 1 FROM {_TABLE}_default WHERE {condition})')
+        if not (await db.execute(stmt, params)).scalar():
+            await db.execute(text(f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {_TABLE} {bounds}'))
+            return
+        await db.execute(text(f'CREATE TABLE {name} (LIKE {_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+        await db.execute(
+            text(
+                f'WITH moved AS (DELETE FROM {_TABLE}_default WHERE {condition} RETURNING *) '
+                f'INSERT INTO {name} SELECT * FROM moved'
+            ),
+            params,
+        )
+        await db.execute(text(f'ALTER TABLE {_TABLE} ATTACH PARTITION {name} {bounds}'))
+
+    async def _try_create_postgresql_partition(self, month: datetime) -> bool:
+        """
+        在独立事务中创建 PostgreSQL 月份分区，单个月份失败不影响其他月份
+
+        :param month: 月份
+        :return: 是否创建成功
+        """
+        try:
+            async with async_db_session.begin() as db:
+                await self._create_postgresql_partition(db, month)
+        except Exception as e:
+            log.error(f'[LLM Usage] 用量日志分区 {month:%Y%m} 创建失败: {e}')
+            return False
+        return True
+
+    async def _ensure_postgresql(self, months: list[datetime]) -> list[str]:
+        """
+        创建 PostgreSQL 分区，每个分区单独提交
+
+        :param months: 需要存在的月份
+        :return: 新建的分区
+        """
+        async with async_db_session.begin() as db:
+            if await self._table_kind(db) != 'p':
+                log.warning(f'[LLM Usage] {_TABLE} 不是分区表，请执行 `fba usage-partition` 迁移')
+                return []
+            existing = await self._partitions(db)
+            await db.execute(text(f'CREATE TABLE IF NOT EXISTS {_TABLE}_default PARTITION OF {_TABLE} DEFAULT'))
+        return [
+            f'{_TABLE}_p{month:%Y%m}'
+            for month in months
+            if month not in existing and await self._try_create_postgresql_partition(month)
+        ]
+
+    async def _ensure_mysql(self, months: list[datetime]) -> list[str]:
+        """
+        创建 MySQL 分区，MAXVALUE 分区中已有的数据由 REORGANIZE 迁入新分区
+
+        :param months: 需要存在的月份
+        :return: 新建的分区
+        """
+        async with async_db_session() as db:
+            existing = await self._partitions(db)
+            if not existing:
+                log.warning(f'[LLM Usage] {_TABLE} 不是分区表，请执行 `fba usage-partition` 迁移')
+                return []
+            last = max(existing)
+            months = [month for month in months if month > last]
+            if not months:
+                return []
+            clause = self._mysql_partitions(months)
+            await db.execute(text(f'ALTER TABLE {_TABLE} REORGANIZE PARTITION {_MYSQL_MAX_PARTITION} INTO ({clause})'))
+        return [f'p{month:%Y%m}' for month in months]
+
+    def _mysql_partitions(self, months: list[datetime]) -> str:
+        definitions = [
+            f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{self._bound(self._add_months(month, 1))}')"
+            for month in months
+        ]
+        definitions.append(f'PARTITION {_MYSQL_MAX_PARTITION} VALUES LESS THAN (MAXVALUE)')
+        return ', '.join(definitions)
+
+    async def ensure(self) -> list[str]:
+        """
+        创建当月及未来分区，不转换未分区的表（见 migrate）
+
+        :return: 新建的分区
+        """
+        months = self._months()
+        try:
+            if self._is_mysql():
+                created = await self._ensure_mysql(months)
+            else:
+                created = await self._ensure_postgresql(months)
+        except Exception as e:
+            log.error(f'[LLM Usage] 用量日志分区创建失败: {e}')
+            return []
+        if created:
+            log.info(f'[LLM Usage] 已创建用量日志分区: {", ".join(created)}')
+        return created
+
+    async def _migrate_postgresql(self, db: AsyncSession) -> list[str]:
+        """
+        将 PostgreSQL 普通表转换为分区表：重命名原表，创建分区表及分区后复制数据，再删除原表
+
+        :param db: 数据库会话
+        :return: 新建的分区
+        """
+        kind = await self._table_kind(db)
+        if kind == 'p':
+            return []
+        conn = await db.connection()
+        months = self._months()
+        legacy = f'{_TABLE}_legacy'
+        if kind is not None:
+            await db.execute(text(f'ALTER TABLE {_TABLE} RENAME TO {legacy}'))
+            # 索引、主键约束及自增序列名称会与新表冲突
+            stmt = text('SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :table')
+            for name in (await db.execute(stmt, {'table': legacy})).scalars().all():
+                await db.execute(text(f'ALTER INDEX "{name}" RENAME TO "{name}_legacy"'))
+            stmt = text("SELECT pg_get_serial_sequence(:table, 'id')")
+            if sequence := (await db.execute(stmt, {'table': legacy})).scalar():
+                await db.execute(text(f'ALTER SEQUENCE {sequence} RENAME TO {legacy}_id_seq'))
+            first_time = (await db.execute(text(f'SELECT MIN(created_time) FROM {legacy}'))).scalar()
+            months = self._months(first_time)
+
+        await conn.run_sync(UsageLog.__table__.create)
+        await db.execute(text(f'CREATE TABLE {_TABLE}_default PARTITION OF {_TABLE} DEFAULT'))
+        for month in months:
+            await self._create_postgresql_partition(db, month)
+
+        if kind is not None:
+            columns = ', '.join(column.name for column in UsageLog.__table__.columns)
+            await db.execute(text(f'INSERT INTO {_TABLE} ({columns}) SELECT {columns} FROM {legacy}'))
+            if PrimaryKeyType.autoincrement == settings.DATABASE_PK_MODE:
+                await db.execute(
+                    text(
+                        f"SELECT setval(pg_get_serial_sequence('{_TABLE}', 'id'), "
+                        f'(SELECT COALESCE(MAX(id), 0) + 1 FROM {_TABLE}), false)'
+                    )
+                )
+            await db.execute(text(f'DROP TABLE {legacy}'))
+        return [f'{_TABLE}_p{month:%Y%m}' for month in months]
+
+    async def _migrate_mysql(self, db: AsyncSession) -> list[str]:
+        """
+        将 MySQL 普通表转换为分区表：主键改为 (id, created_time)，删除唯一索引及模型中已移除的索引，再按月分区
+
+        :param db: 数据库会话
+        :return: 新建的分区
+        """
+        if await self._partitions(db):
+            return []
+        stmt = text(
+            'SELECT index_name, MIN(non_unique) FROM information_schema.statistics '
+            'WHERE table_schema = DATABASE() AND table_name = :table GROUP BY index_name'
+        )
+        indexes = dict((await db.execute(stmt, {'table': _TABLE})).all())
+        model_indexes = {index.name: index for index in UsageLog.__table__.indexes}
+        # 分区表的唯一索引必须包含分区键，request_id 改为普通索引
+        for name, non_unique in list(indexes.items()):
+            if name != 'PRIMARY' and (name not in model_indexes or not non_unique):
+                await db.execute(text(f'ALTER TABLE {_TABLE} DROP INDEX `{name}`'))
+                indexes.pop(name)
+        stmt = text(
+            'SELECT column_name FROM information_schema.statistics '
+            "WHERE table_schema = DATABASE() AND table_name = :table AND index_name = 'PRIMARY' ORDER BY seq_in_index"
+        )
+        if (await db.execute(stmt, {'table': _TABLE})).scalars().all() != ['id', 'created_time']:
+            await db.execute(text(f'ALTER TABLE {_TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_time)'))
+        conn = await db.connection()
+        for name, index in model_indexes.items():
+            if name not in indexes:
+                await conn.run_sync(index.create)
+
+        months = self._months(await usage_log_dao.get_first_time(db))
+        clause = self._mysql_partitions(months)
+        await db.execute(text(f'ALTER TABLE {_TABLE} PARTITION BY RANGE COLUMNS(created_time) ({clause})'))
+        return [f'p{month:%Y%m}' for month in months]
+
+    async def migrate(self) -> list[str]:
+        """
+        将未分区的用量日志表转换为按月分区表（一次性迁移，由 `fba usage-partition` 命令执行）
+
+        需要重写整张表，数据量较大时耗时较长，建议在停机窗口执行；转换后 request_id 不再唯一，
+        且只保留模型中定义的索引（见 UsageLog）
+
+        :return: 新建的分区
+        """
+        log.warning(f'[LLM Usage] 正在将 {_TABLE} 转换为分区表，数据量较大时耗时较长')
+        async with async_db_session.begin() as db:
+            if self._is_mysql():
+                created = await self._migrate_mysql(db)
+            else:
+                created = await self._migrate_postgresql(db)
+        if created:
+            log.info(f'[LLM Usage] {_TABLE} 已转换为分区表，分区: {", ".join(created)}')
+        else:
+            log.info(f'[LLM Usage] {_TABLE} 已是分区表，无需转换')
+        return created
+
+    @staticmethod
+    async def _export(month: datetime) -> Path:
+        """
+        导出月份数据为 gzip 压缩的 JSONL 文件
+
+        :param month: 月份
+        :return: 归档文件路径
+        """
+        path = LLM_USAGE_ARCHIVE_DIR / f'{_TABLE}_{month:%Y%m}.jsonl.gz'
+        tmp_path = AsyncPath(f'{path}.part')
+        await AsyncPath(LLM_USAGE_ARCHIVE_DIR).mkdir(parents=True, exist_ok=True)
+
+        stmt = (
+            select(UsageLog.__table__)
+            .where(
+                UsageLog.created_time >= month,
+                UsageLog.created_time < UsageLogPartitioner._add_months(month, 1),
+            )
+            .execution_options(yield_per=settings.LLM_USAGE_LOG_ARCHIVE_BATCH_SIZE)
+        )
+        # wbits=31 输出 gzip 格式
+        compressor = zlib.compressobj(wbits=31)
+        async with async_db_session() as db, await open_file(tmp_path, 'wb') as f:
+            result = await db.stream(stmt)
+            async for rows in result.mappings().partitions():
+                await f.write(compressor.compress(b''.join(json.encode(dict(row)) + b'\n' for row in rows)))
+            await f.write(compressor.flush())
+        await tmp_path.rename(path)
+        return path
+
+    async def _drop(self, name: str) -> None:
+        """
+        删除分区
+
+        :param name: 分区名称
+        :return:
+        """
+        async with async_db_session.begin() as db:
+            if self._is_mysql():
+                await db.execute(text(f'ALTER TABLE {_TABLE} DROP PARTITION {name}'))
+            else:
+                await db.execute(text(f'DROP TABLE {name}'))
+
+    async def archive(self) -> list[str]:
+        """
+        归档并删除超过保留期的分区，仅处理已完成用量汇总的月份
+
+        :return: 已归档的分区
+        """
+        if settings.LLM_USAGE_LOG_RETENTION_MONTHS <= 0:
+            return []
+        watermark = await usage_rollup.watermark()
+        if watermark is None:
+            return []
+        cutoff = min(
+            self._add_months(self._month_start(timezone.now()), -settings.LLM_USAGE_LOG_RETENTION_MONTHS), watermark
+        )
+
+        async with async_db_session() as db:
+            partitions = await self._partitions(db)
+        archived = []
+        for month, name in sorted(partitions.items()):
+            if self._add_months(month, 1) > cutoff:
+                break
+            path = await self._export(month)
+            await self._drop(name)
+            archived.append(name)
+            log.info(f'[LLM Usage] 用量日志分区 {name} 已归档至 {path} 并删除')
+        return archived
+
+
+# 创建全局用量日志分区管理实例
+usage_log_partitioner = UsageLogPartitioner()
@@ -0,0 +1,100 @@
+"""用量汇总"""
+
+from datetime import datetime, timedelta
+
+from backend.app.llm.crud.crud_usage_log import usage_log_dao
+from backend.app.llm.crud.crud_usage_rollup import ROLLUP_DIMENSIONS, usage_daily_dao, usage_hourly_dao
+from backend.common.log import log
+from backend.core.conf import settings
+from backend.database.db import async_db_session
+from backend.database.redis import redis_client
+from backend.utils.timezone import timezone
+
+_HOUR = timedelta(hours=1)
+
+
+class UsageRollup:
+    """
+    用量汇总
+
+    按小时将用量日志汇总到小时表，并同步重建所在日期的日汇总，汇总结果以 upsert 写入，多个进程并发汇总同一时段互不冲突；
+    时段与日期均按应用时区划分，汇总进度（水位）记录在 Redis 中；水位之前的用量从汇总表读取，之后的部分从用量日志表读取
+    """
+
+    @staticmethod
+    def floor_hour(t: datetime) -> datetime:
+        """
+        向下取整到小时
+
+        :param t: 时间
+        :return:
+        """
+        return timezone.from_datetime(t).replace(minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def floor_day(t: datetime) -> datetime:
+        """
+        向下取整到日期
+
+        :param t: 时间
+        :return:
+        """
+        return timezone.from_datetime(t).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    async def watermark() -> datetime | None:
+        """获取汇总水位，该时间之前的用量已全部汇总"""
+        value = await redis_client.get(settings.LLM_USAGE_ROLLUP_WATERMARK_KEY)
+        if value:
+            return timezone.from_datetime(datetime.fromisoformat(value))
+        # Redis 数据丢失时，小时表中最新时段之前的用量必然已汇总
+        async with async_db_session() as db:
+            last_bucket = await usage_hourly_dao.get_last_bucket(db)
+        return None if last_bucket is None else timezone.from_datetime(last_bucket) + _HOUR
+
+    async def _rollup_hour(self, bucket: datetime) -> None:
+        """
+        汇总单个小时，并重建所在日期的日汇总
+
+        :param bucket: 小时起始时间
+        :return:
+        """
+        day = self.floor_day(bucket)
+        async with async_db_session.begin() as db:
+            rows = await usage_log_dao.aggregate(db, start=bucket, end=bucket + _HOUR, group_by=ROLLUP_DIMENSIONS)
+            await usage_hourly_dao.upsert(db, bucket, rows)
+            rows = await usage_hourly_dao.aggregate(
+                db, start=day, end=day + timedelta(days=1), group_by=ROLLUP_DIMENSIONS
+            )
+            await usage_daily_dao.upsert(db, day, rows)
+
+    async def run(self) -> int:
+        """
+        汇总水位之后已结束的小时
+
+        :return: 汇总的小时数
+        """
+        target = self.floor_hour(timezone.now() - timedelta(seconds=settings.LLM_USAGE_ROLLUP_DELAY))
+        start = await self.watermark()
+        if start is None:
+            async with async_db_session() as db:
+                first_time = await usage_log_dao.get_first_time(db)
+            if first_time is None:
+                return 0
+            start = self.floor_hour(first_time)
+
+        end = min(target, start + timedelta(hours=settings.LLM_USAGE_ROLLUP_MAX_HOURS))
+        bucket = start
+        while bucket < end:
+            await self._rollup_hour(bucket)
+            bucket += _HOUR
+            await redis_client.set(settings.LLM_USAGE_ROLLUP_WATERMARK_KEY, bucket.isoformat())
+
+        hours = int((bucket - start) / _HOUR)
+        if hours:
+            log.info(f'[LLM Usage] 已汇总 {hours} 小时用量，水位 {bucket.isoformat()}')
+        return hours
+
+
+# 创建全局用量汇总实例
+usage_rollup = UsageRollup()
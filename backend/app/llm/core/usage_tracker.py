@@ -5,9 +5,7 @@ import uuid
 
 from decimal import Decimal
 
-from sqlalchemy.ext.asyncio import AsyncSession
-
-from backend.app.llm.crud.crud_usage_log import usage_log_dao
+from backend.app.llm.core.usage_writer import usage_log_writer
 from backend.app.llm.enums import UsageLogStatus
 
 
@@ -42,7 +40,6 @@ class UsageTracker:
 
     async def track_success(
         self,
-        db: AsyncSession,
         *,
         user_id: int,
         api_key_id: int,
@@ -57,11 +54,12 @@ class UsageTracker:
         latency_ms: int,
         is_streaming: bool = False,
         ip_address: str | None = None,
+        cache_hit: bool = False,
+        status: str = UsageLogStatus.SUCCESS,
     ) -> None:
         """
         记录成功调用
 
-        :param db: 数据库会话
         :param user_id: 用户 ID
         :param api_key_id: API Key ID
         :param model_id: 模型 ID
@@ -75,13 +73,16 @@ class UsageTracker:
         :param latency_ms: 延迟(毫秒)
         :param is_streaming: 是否流式
         :param ip_address: IP 地址
+        :param cache_hit: 是否命中响应缓存，命中时不计成本
+        :param status: 状态，客户端中途断开的流式请求为 CANCELLED
         """
+        if cache_hit:
+            input_cost_per_1k = output_cost_per_1k = Decimal(0)
         input_cost, output_cost, total_cost = self.calculate_cost(
             input_tokens, output_tokens, input_cost_per_1k, output_cost_per_1k
         )
 
-        await usage_log_dao.create(
-            db,
+        await usage_log_writer.enqueue(
             {
                 'user_id': user_id,
                 'api_key_id': api_key_id,
@@ -96,15 +97,15 @@ class UsageTracker:
                 'output_cost': output_cost,
                 'total_cost': total_cost,
                 'latency_ms': latency_ms,
-                'status': UsageLogStatus.SUCCESS,
+                'status': status,
                 'is_streaming': is_streaming,
+                'cache_hit': cache_hit,
                 'ip_address': ip_address,
             },
         )
 
     async def track_error(
         self,
-        db: AsyncSession,
         *,
         user_id: int,
         api_key_id: int,
@@ -120,7 +121,6 @@ class UsageTracker:
         """
         记录失败调用
 
-        :param db: 数据库会话
         :param user_id: 用户 ID
         :param api_key_id: API Key ID
         :param model_id: 模型 ID
@@ -132,8 +132,7 @@ class UsageTracker:
         :param is_streaming: 是否流式
         :param ip_address: IP 地址
         """
-        await usage_log_dao.create(
-            db,
+        await usage_log_writer.enqueue(
             {
                 'user_id': user_id,
                 'api_key_id': api_key_id,
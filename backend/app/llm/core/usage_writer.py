@@ -0,0 +1,186 @@
+"""用量日志异步批量写入器"""
+
+import asyncio
+
+from asyncio import Queue
+
+from backend.app.llm.model.usage_log import UsageLog
+from backend.common.log import log
+from backend.common.prometheus.instruments import (
+    PROMETHEUS_APP_NAME,
+    PROMETHEUS_LLM_USAGE_LOG_DROPPED_COUNTER,
+    PROMETHEUS_LLM_USAGE_LOG_OVERFLOW_COUNTER,
+    PROMETHEUS_LLM_USAGE_LOG_QUEUE_GAUGE,
+)
+from backend.common.queue import batch_dequeue
+from backend.core.conf import settings
+from backend.database.db import async_db_session, is_data_error
+
+
+class UsageLogWriter:
+    """
+    用量日志写入器
+
+    请求路径只负责入队，由后台消费者批量写入数据库；队列满时退化为直接写入。
+    数据库不可用时按指数退避重试同一批日志，仅丢弃因数据异常或违反约束被拒绝的日志；
+    停止时等待进行中的写入完成，超时后不再重试
+    """
+
+    def __init__(self) -> None:
+        self._queue: Queue[dict | None] = Queue(maxsize=settings.LLM_USAGE_LOG_QUEUE_MAXSIZE)
+        self._consumer_task: asyncio.Task | None = None
+        self._aborted = False
+
+    @property
+    def pending(self) -> int:
+        """待写入数量"""
+        return self._queue.qsize()
+
+    async def enqueue(self, obj: dict) -> None:
+        """
+        用量日志入队
+
+        :param obj: 用量日志数据
+        :return:
+        """
+        if self._consumer_task is None:
+            await self._write_once([obj])
+            return
+        try:
+            self._queue.put_nowait(obj)
+        except asyncio.QueueFull:
+            PROMETHEUS_LLM_USAGE_LOG_OVERFLOW_COUNTER.labels(app_name=PROMETHEUS_APP_NAME).inc()
+            await self._write_once([obj])
+        else:
+            PROMETHEUS_LLM_USAGE_LOG_QUEUE_GAUGE.labels(app_name=PROMETHEUS_APP_NAME).set(self._queue.qsize())
+
+    @staticmethod
+    def _drop(count: int, reason: str) -> None:
+        PROMETHEUS_LLM_USAGE_LOG_DROPPED_COUNTER.labels(app_name=PROMETHEUS_APP_NAME).inc(count)
+        log.error(f'用量日志入库失败，丢失 {count} 条日志: {reason}')
+
+    @staticmethod
+    async def _insert(rows: list[dict]) -> bool:
+        """
+        写入用量日志，个别数据异常时返回 False，数据库不可用时抛出异常
+
+        :param rows: 用量日志数据列表
+        :return:
+        """
+        try:
+            async with async_db_session.begin() as db:
+                db.add_all([UsageLog(**row) for row in rows])
+        except Exception as e:
+            if not is_data_error(e):
+                raise
+            log.warning(f'用量日志入库失败: {e}')
+            return False
+        return True
+
+    async def _write(self, rows: list[dict]) -> None:
+        """
+        批量写入用量日志，批量写入因个别数据失败时逐条写入，仅丢弃异常数据；数据库不可用时抛出异常
+
+        :param rows: 用量日志数据列表
+        :return:
+        """
+        if await self._insert(rows):
+            return
+        invalid = 0
+        for row in rows:
+            if not await self._insert([row]):
+                invalid += 1
+        if invalid:
+            self._drop(invalid, '数据异常或违反约束')
+
+    async def _try_write(self, rows: list[dict]) -> bool:
+        """
+        写入用量日志，返回数据库是否可用
+
+        :param rows: 用量日志数据列表
+        :return:
+        """
+        try:
+            await self._write(rows)
+        except Exception as e:
+            log.error(f'用量日志入库失败，数据库不可用: {e}')
+            return False
+        return True
+
+    async def _write_once(self, rows: list[dict]) -> None:
+        """
+        直接写入用量日志，不重试（消费者未运行或队列已满时）
+
+        :param rows: 用量日志数据列表
+        :return:
+        """
+        if not await self._try_write(rows):
+            self._drop(len(rows), '数据库不可用')
+
+    async def _write_with_retry(self, rows: list[dict]) -> None:
+        """
+        写入用量日志，数据库不可用时按指数退避重试，停止超时后丢弃
+
+        :param rows: 用量日志数据列表
+        :return:
+        """
+        delay = settings.LLM_USAGE_LOG_FLUSH_INTERVAL
+        while not await self._try_write(rows):
+            if self._aborted:
+                self._drop(len(rows), '停止超时')
+                return
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.LLM_USAGE_LOG_RETRY_MAX_DELAY)
+
+    async def _consume(self) -> None:
+        """用量日志消费者"""
+        while True:
+            items = await batch_dequeue(
+                self._queue,
+                max_items=settings.LLM_USAGE_LOG_FLUSH_SIZE,
+                timeout=settings.LLM_USAGE_LOG_FLUSH_INTERVAL,
+            )
+            stopping = None in items
+            rows = [item for item in items if item is not None]
+            if rows:
+                await self._write_with_retry(rows)
+            for _ in range(len(items)):
+                self._queue.task_done()
+            PROMETHEUS_LLM_USAGE_LOG_QUEUE_GAUGE.labels(app_name=PROMETHEUS_APP_NAME).set(self._queue.qsize())
+            if stopping:
+                break
+
+    def start(self) -> None:
+        """启动消费者"""
+        if self._consumer_task is None or self._consumer_task.done():
+            self._aborted = False
+            self._consumer_task = asyncio.create_task(self._consume())
+
+    async def stop(self) -> None:
+        """停止消费者并写入剩余日志，超时后不取消进行中的写入，仅停止重试"""
+        if self._consumer_task is None:
+            return
+
+        task, self._consumer_task = self._consumer_task, None
+        if not task.done():
+            await self._queue.put(None)
+            _, pending = await asyncio.wait({task}, timeout=settings.LLM_USAGE_LOG_DRAIN_TIMEOUT)
+            if pending:
+                log.warning('用量日志消费者停止超时，等待进行中的写入完成')
+                self._aborted = True
+                await asyncio.shield(task)
+
+        remaining = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                remaining.append(item)
+        if remaining:
+            if self._aborted:
+                self._drop(len(remaining), '停止超时')
+            else:
+                await self._write_once(remaining)
+
+
+# 创建全局用量日志写入器实例
+usage_log_writer = UsageLogWriter()
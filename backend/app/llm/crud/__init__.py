@@ -5,6 +5,7 @@ from backend.app.llm.crud.crud_model_group import model_group_dao
 from backend.app.llm.crud.crud_provider import provider_dao
 from backend.app.llm.crud.crud_rate_limit import rate_limit_dao
 from backend.app.llm.crud.crud_usage_log import usage_log_dao
+from backend.app.llm.crud.crud_usage_rollup import usage_daily_dao, usage_hourly_dao
 from backend.app.llm.crud.crud_user_api_key import user_api_key_dao
 
 __all__ = [
@@ -12,6 +13,8 @@ __all__ = [
     'model_group_dao',
     'provider_dao',
     'rate_limit_dao',
+    'usage_daily_dao',
+    'usage_hourly_dao',
     'usage_log_dao',
     'user_api_key_dao',
 ]
@@ -0,0 +1,67 @@
+"""批处理 CRUD"""
+
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy_crud_plus import CRUDPlus
+
+from backend.app.llm.model.batch import Batch
+from backend.utils.timezone import timezone
+
+
+class CRUDBatch(CRUDPlus[Batch]):
+    """批处理数据库操作类"""
+
+    async def get_by_batch_id(self, db: AsyncSession, batch_id: str) -> Batch | None:
+        return await self.select_model_by_column(db, batch_id=batch_id)
+
+    async def get_user_batches(
+        self, db: AsyncSession, user_id: int, *, limit: int, after: str | None = None
+    ) -> list[Batch]:
+        stmt = select(self.model).where(self.model.user_id == user_id)
+        if after is not None:
+            after_id = select(self.model.id).where(self.model.batch_id == after).scalar_subquery()
+            stmt = stmt.where(self.model.id < after_id)
+        result = await db.execute(stmt.order_by(self.model.id.desc()).limit(limit))
+        return list(result.scalars().all())
+
+    async def create(self, db: AsyncSession, **kwargs: Any) -> Batch:
+        new_obj = Batch(**kwargs)
+        db.add(new_obj)
+        await db.commit()
+        await db.refresh(new_obj)
+        return new_obj
+
+    async def update(self, db: AsyncSession, pk: int, obj: dict[str, Any]) -> int:
+        count = await self.update_model(db, pk, obj)
+        await db.commit()
+        return count
+
+    async def get_stale(self, db: AsyncSession, statuses: list[str], before: datetime) -> list[Batch]:
+        """获取指定状态下最后更新时间早于 before 的批处理"""
+        last_active = func.coalesce(self.model.updated_time, self.model.created_time)
+        stmt = select(self.model).where(self.model.status.in_(statuses), last_active < before)
+        result = await db.execute(stmt.order_by(self.model.id))
+        return list(result.scalars().all())
+
+    async def touch(self, db: AsyncSession, pk: int, before: datetime) -> int:
+        """仅当最后更新时间早于 before 时刷新更新时间（认领中断的批处理）"""
+        last_active = func.coalesce(self.model.updated_time, self.model.created_time)
+        result = await db.execute(
+            update(self.model).where(self.model.id == pk, last_active < before).values(updated_time=timezone.now())
+        )
+        await db.commit()
+        return result.rowcount
+
+    async def transition(self, db: AsyncSession, pk: int, from_status: list[str], obj: dict[str, Any]) -> int:
+        """仅当状态在 from_status 中时更新（状态流转）"""
+        result = await db.execute(
+            update(self.model).where(self.model.id == pk, self.model.status.in_(from_status)).values(**obj)
+        )
+        await db.commit()
+        return result.rowcount
+
+
+batch_dao: CRUDBatch = CRUDBatch(Batch)
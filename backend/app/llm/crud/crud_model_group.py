@@ -43,12 +43,17 @@ class CRUDModelGroup(CRUDPlus[ModelGroup]):
 
     async def create(self, db: AsyncSession, obj: CreateModelGroupParam) -> None:
         await self.create_model(db, obj)
+        await db.commit()
 
     async def update(self, db: AsyncSession, pk: int, obj: UpdateModelGroupParam) -> int:
-        return await self.update_model(db, pk, obj)
+        count = await self.update_model(db, pk, obj)
+        await db.commit()
+        return count
 
     async def delete(self, db: AsyncSession, pk: int) -> int:
-        return await self.delete_model(db, pk)
+        count = await self.delete_model(db, pk)
+        await db.commit()
+        return count
 
 
 model_group_dao: CRUDModelGroup = CRUDModelGroup(ModelGroup)
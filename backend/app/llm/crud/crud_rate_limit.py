@@ -39,10 +39,14 @@ class CRUDRateLimitConfig(CRUDPlus[RateLimitConfig]):
         await self.create_model(db, obj)
 
     async def update(self, db: AsyncSession, pk: int, obj: UpdateRateLimitConfigParam) -> int:
-        return await self.update_model(db, pk, obj)
+        count = await self.update_model(db, pk, obj)
+        await db.commit()
+        return count
 
     async def delete(self, db: AsyncSession, pk: int) -> int:
-        return await self.delete_model(db, pk)
+        count = await self.delete_model(db, pk)
+        await db.commit()
+        return count
 
 
 rate_limit_dao: CRUDRateLimitConfig = CRUDRateLimitConfig(RateLimitConfig)
@@ -1,14 +1,15 @@
 """用量日志 CRUD"""
 
-from datetime import date, datetime, timedelta
+from collections.abc import Sequence
+from datetime import date, datetime
 from decimal import Decimal
 
-from sqlalchemy import Select, func, select
+from sqlalchemy import Row, Select, case, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy_crud_plus import CRUDPlus
 
+from backend.app.llm.enums import UsageLogStatus
 from backend.app.llm.model.usage_log import UsageLog
-from backend.app.llm.schema.usage_log import DailyUsage, ModelUsage, UsageSummary
 
 
 class CRUDUsageLog(CRUDPlus[UsageLog]):
@@ -52,116 +53,60 @@ class CRUDUsageLog(CRUDPlus[UsageLog]):
         await db.refresh(new_obj)
         return new_obj
 
-    async def get_summary(
+    async def aggregate(
         self,
         db: AsyncSession,
         *,
-        user_id: int,
-        start_date: date | None = None,
-        end_date: date | None = None,
-    ) -> UsageSummary:
-        """获取用量汇总"""
+        start: datetime | None = None,
+        end: datetime | None = None,
+        user_id: int | None = None,
+        group_by: Sequence[str] = (),
+    ) -> Sequence[Row]:
+        """
+        聚合用量
+
+        :param db: 数据库会话
+        :param start: 开始时间（包含）
+        :param end: 结束时间（不包含）
+        :param user_id: 用户 ID
+        :param group_by: 分组字段
+        :return:
+        """
+        columns = [getattr(UsageLog, name) for name in group_by]
         stmt = select(
-            func.count(UsageLog.id).label('total_requests'),
-            func.sum(func.if_(UsageLog.status == 'SUCCESS', 1, 0)).label('success_requests'),
-            func.sum(func.if_(UsageLog.status == 'ERROR', 1, 0)).label('error_requests'),
+            *columns,
+            func.count(UsageLog.id).label('requests'),
+            func.coalesce(func.sum(case((UsageLog.status == UsageLogStatus.SUCCESS, 1), else_=0)), 0).label(
+                'success_requests'
+            ),
+            func.coalesce(func.sum(case((UsageLog.status == UsageLogStatus.ERROR, 1), else_=0)), 0).label(
+                'error_requests'
+            ),
+            func.coalesce(func.sum(case((UsageLog.status == UsageLogStatus.CANCELLED, 1), else_=0)), 0).label(
+                'cancelled_requests'
+            ),
+            func.coalesce(func.sum(UsageLog.input_tokens), 0).label('input_tokens'),
+            func.coalesce(func.sum(UsageLog.output_tokens), 0).label('output_tokens'),
             func.coalesce(func.sum(UsageLog.total_tokens), 0).label('total_tokens'),
-            func.coalesce(func.sum(UsageLog.input_tokens), 0).label('total_input_tokens'),
-            func.coalesce(func.sum(UsageLog.output_tokens), 0).label('total_output_tokens'),
             func.coalesce(func.sum(UsageLog.total_cost), Decimal(0)).label('total_cost'),
-            func.coalesce(func.avg(UsageLog.latency_ms), 0).label('avg_latency_ms'),
-        ).where(UsageLog.user_id == user_id)
-
-        if start_date:
-            stmt = stmt.where(UsageLog.created_time >= datetime.combine(start_date, datetime.min.time()))
-        if end_date:
-            stmt = stmt.where(UsageLog.created_time <= datetime.combine(end_date, datetime.max.time()))
-
-        result = await db.execute(stmt)
-        row = result.one()
-
-        return UsageSummary(
-            total_requests=row.total_requests or 0,
-            success_requests=int(row.success_requests or 0),
-            error_requests=int(row.error_requests or 0),
-            total_tokens=int(row.total_tokens or 0),
-            total_input_tokens=int(row.total_input_tokens or 0),
-            total_output_tokens=int(row.total_output_tokens or 0),
-            total_cost=row.total_cost or Decimal(0),
-            avg_latency_ms=int(row.avg_latency_ms or 0),
-        )
-
-    async def get_daily_usage(
-        self,
-        db: AsyncSession,
-        *,
-        user_id: int,
-        days: int = 30,
-    ) -> list[DailyUsage]:
-        """获取每日用量"""
-        start_date = date.today() - timedelta(days=days - 1)
-        stmt = select(
-            func.date(UsageLog.created_time).label('date'),
-            func.count(UsageLog.id).label('requests'),
-            func.coalesce(func.sum(UsageLog.total_tokens), 0).label('tokens'),
-            func.coalesce(func.sum(UsageLog.total_cost), Decimal(0)).label('cost'),
-        ).where(
-            UsageLog.user_id == user_id,
-            UsageLog.created_time >= datetime.combine(start_date, datetime.min.time()),
-        ).group_by(
-            func.date(UsageLog.created_time)
-        ).order_by(
-            func.date(UsageLog.created_time)
+            func.coalesce(func.sum(UsageLog.latency_ms), 0).label('latency_ms'),
         )
+        if user_id is not None:
+            stmt = stmt.where(UsageLog.user_id == user_id)
+        if start is not None:
+            stmt = stmt.where(UsageLog.created_time >= start)
+        if end is not None:
+            stmt = stmt.where(UsageLog.created_time < end)
+        if columns:
+            stmt = stmt.group_by(*columns)
 
         result = await db.execute(stmt)
-        rows = result.all()
-
-        return [
-            DailyUsage(
-                date=str(row.date),
-                requests=row.requests,
-                tokens=int(row.tokens),
-                cost=row.cost,
-            )
-            for row in rows
-        ]
-
-    async def get_model_usage(
-        self,
-        db: AsyncSession,
-        *,
-        user_id: int,
-        start_date: date | None = None,
-        end_date: date | None = None,
-    ) -> list[ModelUsage]:
-        """获取模型用量"""
-        stmt = select(
-            UsageLog.model_name,
-            func.count(UsageLog.id).label('requests'),
-            func.coalesce(func.sum(UsageLog.total_tokens), 0).label('tokens'),
-            func.coalesce(func.sum(UsageLog.total_cost), Decimal(0)).label('cost'),
-        ).where(UsageLog.user_id == user_id)
+        return result.all()
 
-        if start_date:
-            stmt = stmt.where(UsageLog.created_time >= datetime.combine(start_date, datetime.min.time()))
-        if end_date:
-            stmt = stmt.where(UsageLog.created_time <= datetime.combine(end_date, datetime.max.time()))
-
-        stmt = stmt.group_by(UsageLog.model_name).order_by(func.sum(UsageLog.total_tokens).desc())
-
-        result = await db.execute(stmt)
-        rows = result.all()
-
-        return [
-            ModelUsage(
-                model_name=row.model_name,
-                requests=row.requests,
-                tokens=int(row.tokens),
-                cost=row.cost,
-            )
-            for row in rows
-        ]
+    async def get_first_time(self, db: AsyncSession) -> datetime | None:
+        """获取最早的用量日志时间"""
+        result = await db.execute(select(func.min(UsageLog.created_time)))
+        return result.scalar()
 
     async def get_tokens_today(self, db: AsyncSession, *, user_id: int) -> int:
         """获取今日 tokens"""
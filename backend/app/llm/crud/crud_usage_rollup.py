@@ -0,0 +1,123 @@
+"""用量汇总 CRUD"""
+
+from collections.abc import Sequence
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import Row, func, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy_crud_plus import CRUDPlus
+
+from backend.app.llm.model.usage_rollup import UsageDaily, UsageHourly
+from backend.common.enums import DataBaseType, PrimaryKeyType
+from backend.core.conf import settings
+from backend.utils.snowflake import snowflake
+from backend.utils.timezone import timezone
+
+# 汇总维度
+ROLLUP_DIMENSIONS = ('user_id', 'api_key_id', 'model_name', 'provider_id')
+
+# 汇总指标
+ROLLUP_METRICS = (
+    'requests',
+    'success_requests',
+    'error_requests',
+    'cancelled_requests',
+    'input_tokens',
+    'output_tokens',
+    'total_tokens',
+    'total_cost',
+    'latency_ms',
+)
+
+
+class CRUDUsageRollup(CRUDPlus[UsageHourly | UsageDaily]):
+    """用量汇总数据库操作类"""
+
+    async def aggregate(
+        self,
+        db: AsyncSession,
+        *,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        user_id: int | None = None,
+        group_by: Sequence[str] = (),
+    ) -> Sequence[Row]:
+        """
+        聚合用量
+
+        :param db: 数据库会话
+        :param start: 开始时间（包含）
+        :param end: 结束时间（不包含）
+        :param user_id: 用户 ID
+        :param group_by: 分组字段
+        :return:
+        """
+        columns = [getattr(self.model, name) for name in group_by]
+        metrics = [
+            func.coalesce(func.sum(getattr(self.model, name)), Decimal(0) if name == 'total_cost' else 0).label(name)
+            for name in ROLLUP_METRICS
+        ]
+        stmt = select(*columns, *metrics)
+        if user_id is not None:
+            stmt = stmt.where(self.model.user_id == user_id)
+        if start is not None:
+            stmt = stmt.where(self.model.bucket >= start)
+        if end is not None:
+            stmt = stmt.where(self.model.bucket < end)
+        if columns:
+            stmt = stmt.group_by(*columns)
+
+        result = await db.execute(stmt)
+        return result.all()
+
+    async def get_last_bucket(self, db: AsyncSession) -> datetime | None:
+        """获取最新统计时段"""
+        result = await db.execute(select(func.max(self.model.bucket)))
+        return result.scalar()
+
+    async def upsert(self, db: AsyncSession, bucket: datetime, rows: Sequence[Row]) -> None:
+        """
+        写入统计时段的汇总数据，已存在的维度以新结果覆盖，并发或重复汇总同一时段时结果一致
+
+        :param db: 数据库会话
+        :param bucket: 统计时段起始时间
+        :param rows: 按汇总维度分组的聚合结果
+        :return:
+        """
+        if not rows:
+            return
+        now = timezone.now()
+        values = [
+            {
+                'bucket': bucket,
+                **{name: getattr(row, name) for name in ROLLUP_DIMENSIONS},
+                **{name: int(getattr(row, name)) for name in ROLLUP_METRICS if name != 'total_cost'},
+                'total_cost': row.total_cost,
+                'created_time': now,
+            }
+            for row in rows
+        ]
+        if PrimaryKeyType.snowflake == settings.DATABASE_PK_MODE:
+            for value in values:
+                value['id'] = snowflake.generate()
+
+        if DataBaseType.mysql == settings.DATABASE_TYPE:
+            stmt = mysql_insert(self.model).values(values)
+            stmt = stmt.on_duplicate_key_update({
+                **{name: stmt.inserted[name] for name in ROLLUP_METRICS},
+                'updated_time': now,
+            })
+        else:
+            stmt = postgresql_insert(self.model).values(values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['bucket', *ROLLUP_DIMENSIONS],
+                set_={**{name: stmt.excluded[name] for name in ROLLUP_METRICS}, 'updated_time': now},
+            )
+        await db.execute(stmt)
+
+
+usage_hourly_dao: CRUDUsageRollup = CRUDUsageRollup(UsageHourly)
+usage_daily_dao: CRUDUsageRollup = CRUDUsageRollup(UsageDaily)
@@ -1,6 +1,8 @@
 """用户 API Key CRUD"""
 
-from sqlalchemy import Select
+from datetime import datetime
+
+from sqlalchemy import Select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy_crud_plus import CRUDPlus
 
@@ -67,13 +69,22 @@ class CRUDUserApiKey(CRUDPlus[UserApiKey]):
         return new_obj
 
     async def update(self, db: AsyncSession, pk: int, obj: UpdateUserApiKeyParam) -> int:
-        return await self.update_model(db, pk, obj)
+        count = await self.update_model(db, pk, obj)
+        await db.commit()
+        return count
 
     async def update_last_used(self, db: AsyncSession, pk: int) -> int:
         return await self.update_model(db, pk, {'last_used_at': timezone.now()})
 
+    async def bulk_update_last_used(self, db: AsyncSession, values: dict[int, datetime]) -> None:
+        if not values:
+            return
+        await db.execute(update(self.model), [{'id': pk, 'last_used_at': t} for pk, t in values.items()])
+
     async def delete(self, db: AsyncSession, pk: int) -> int:
-        return await self.delete_model(db, pk)
+        count = await self.delete_model(db, pk)
+        await db.commit()
+        return count
 
 
 user_api_key_dao: CRUDUserApiKey = CRUDUserApiKey(UserApiKey)
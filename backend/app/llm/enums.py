@@ -54,6 +54,37 @@ class UsageLogStatus(StrEnum):
 
     SUCCESS = 'SUCCESS'
     ERROR = 'ERROR'
+    CANCELLED = 'CANCELLED'  # 客户端断开，按已生成内容计费
+
+
+class BatchStatus(StrEnum):
+    """批处理状态（与 OpenAI Batch API 一致）"""
+
+    VALIDATING = 'validating'  # 校验中
+    FAILED = 'failed'  # 校验失败
+    IN_PROGRESS = 'in_progress'  # 执行中
+    COMPLETED = 'completed'  # 已完成
+    EXPIRED = 'expired'  # 超出完成时间窗口
+    CANCELLING = 'cancelling'  # 取消中
+    CANCELLED = 'cancelled'  # 已取消
+
+
+class RateLimitAlgorithm(StrEnum):
+    """限流算法"""
+
+    FIXED_WINDOW = 'FIXED_WINDOW'  # 固定窗口
+    SLIDING_LOG = 'SLIDING_LOG'  # 滑动日志
+    SLIDING_WINDOW = 'SLIDING_WINDOW'  # 滑动窗口计数
+    TOKEN_BUCKET = 'TOKEN_BUCKET'  # 令牌桶（GCRA）
+
+
+class ModelSelectionStrategy(StrEnum):
+    """模型组选路策略"""
+
+    PRIORITY = 'PRIORITY'  # 按优先级顺序
+    WEIGHTED = 'WEIGHTED'  # 加权随机
+    LEAST_IN_FLIGHT = 'LEAST_IN_FLIGHT'  # 最少进行中请求
+    EWMA_P2C = 'EWMA_P2C'  # EWMA 延迟双随机选择
 
 
 class CircuitState(StrEnum):
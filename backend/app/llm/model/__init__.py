@@ -1,17 +1,22 @@
 """LLM 数据模型模块"""
 
+from backend.app.llm.model.batch import Batch
 from backend.app.llm.model.model_config import ModelConfig
 from backend.app.llm.model.model_group import ModelGroup
 from backend.app.llm.model.provider import ModelProvider
 from backend.app.llm.model.rate_limit import RateLimitConfig
 from backend.app.llm.model.usage_log import UsageLog
+from backend.app.llm.model.usage_rollup import UsageDaily, UsageHourly
 from backend.app.llm.model.user_api_key import UserApiKey
 
 __all__ = [
+    'Batch',
     'ModelConfig',
     'ModelGroup',
     'ModelProvider',
     'RateLimitConfig',
+    'UsageDaily',
+    'UsageHourly',
     'UsageLog',
     'UserApiKey',
 ]
@@ -0,0 +1,34 @@
+"""LLM 批处理任务表"""
+
+from datetime import datetime
+
+import sqlalchemy as sa
+
+from sqlalchemy.orm import Mapped, mapped_column
+
+from backend.common.model import Base, TimeZone, id_key
+
+
+class Batch(Base):
+    """LLM 批处理任务表"""
+
+    __tablename__ = 'llm_batch'
+
+    id: Mapped[id_key] = mapped_column(init=False)
+    batch_id: Mapped[str] = mapped_column(sa.String(64), unique=True, index=True, comment='批处理 ID')
+    user_id: Mapped[int] = mapped_column(sa.BigInteger, index=True, comment='用户 ID')
+    api_key_id: Mapped[int] = mapped_column(sa.BigInteger, index=True, comment='API Key ID')
+    endpoint: Mapped[str] = mapped_column(sa.String(64), comment='请求端点')
+    input_file: Mapped[str] = mapped_column(sa.String(256), comment='输入文件')
+    completion_window: Mapped[str] = mapped_column(sa.String(16), default='24h', comment='完成时间窗口')
+    status: Mapped[str] = mapped_column(sa.String(16), default='validating', index=True, comment='状态')
+    output_file: Mapped[str | None] = mapped_column(sa.String(256), default=None, comment='输出文件')
+    error_file: Mapped[str | None] = mapped_column(sa.String(256), default=None, comment='错误文件')
+    total_count: Mapped[int] = mapped_column(default=0, comment='请求总数')
+    completed_count: Mapped[int] = mapped_column(default=0, comment='成功数')
+    failed_count: Mapped[int] = mapped_column(default=0, comment='失败数')
+    error_message: Mapped[str | None] = mapped_column(sa.Text, default=None, comment='错误信息')
+    metadata_: Mapped[dict | None] = mapped_column('metadata', sa.JSON, default=None, comment='元数据')
+    expires_at: Mapped[datetime | None] = mapped_column(TimeZone, default=None, comment='过期时间')
+    in_progress_at: Mapped[datetime | None] = mapped_column(TimeZone, default=None, comment='开始执行时间')
+    finished_at: Mapped[datetime | None] = mapped_column(TimeZone, default=None, comment='结束时间')
@@ -38,6 +38,7 @@ class ModelConfig(Base):
     )
     rpm_limit: Mapped[int | None] = mapped_column(default=None, comment='模型 RPM 限制')
     tpm_limit: Mapped[int | None] = mapped_column(default=None, comment='模型 TPM 限制')
+    response_cache_ttl: Mapped[int] = mapped_column(default=0, comment='响应缓存秒数(0 不缓存)')
     priority: Mapped[int] = mapped_column(default=0, comment='优先级(越大越优先)')
     enabled: Mapped[bool] = mapped_column(default=True, index=True, comment='是否启用')
 
@@ -19,5 +19,8 @@ class ModelGroup(Base):
     fallback_enabled: Mapped[bool] = mapped_column(default=True, comment='启用故障转移')
     retry_count: Mapped[int] = mapped_column(default=3, comment='重试次数')
     timeout_seconds: Mapped[int] = mapped_column(default=60, comment='超时秒数')
+    hedge_enabled: Mapped[bool] = mapped_column(default=False, comment='启用对冲请求')
+    selection_strategy: Mapped[str] = mapped_column(sa.String(32), default='PRIORITY', comment='选路策略')
+    model_weights: Mapped[dict | None] = mapped_column(sa.JSON, default=None, comment='模型权重(模型 ID -> 权重)')
     enabled: Mapped[bool] = mapped_column(default=True, index=True, comment='是否启用')
     description: Mapped[str | None] = mapped_column(sa.String(256), default=None, comment='描述')
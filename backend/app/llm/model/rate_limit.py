@@ -18,6 +18,7 @@ class RateLimitConfig(Base):
     weekly_token_limit: Mapped[int | None] = mapped_column(default=None, comment='周 Token 限制')
     monthly_token_limit: Mapped[int] = mapped_column(default=10000000, comment='月 Token 限制')
     rpm_limit: Mapped[int] = mapped_column(default=60, comment='RPM 限制')
-    tpm_limit: Mapped[int] = mapped_column(default=100000, comment='TPM 限制')
+    tpm_limit: Mapped[int | None] = mapped_column(default=None, comment='TPM 限制，为空表示不限制')
+    algorithm: Mapped[str] = mapped_column(sa.String(32), default='FIXED_WINDOW', comment='限流算法')
     enabled: Mapped[bool] = mapped_column(default=True, index=True, comment='是否启用')
     description: Mapped[str | None] = mapped_column(sa.String(256), default=None, comment='描述')
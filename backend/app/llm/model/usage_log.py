@@ -1,34 +1,75 @@
 """LLM 用量日志表"""
 
+from datetime import datetime
 from decimal import Decimal
 
 import sqlalchemy as sa
 
 from sqlalchemy.orm import Mapped, mapped_column
 
-from backend.common.model import Base, id_key
+from backend.common.enums import PrimaryKeyType
+from backend.common.model import Base, TimeZone
+from backend.core.conf import settings
+from backend.utils.snowflake import snowflake
+from backend.utils.timezone import timezone
 
 
 class UsageLog(Base):
-    """LLM 用量日志表"""
+    """
+    LLM 用量日志表
+
+    按 created_time 每月分区（PostgreSQL 声明式分区，MySQL RANGE COLUMNS 分区），分区由 UsageLogPartitioner 维护，
+    已有的普通表需执行 `fba usage-partition` 转换；分区表的主键及唯一索引必须包含分区键，因此主键为 (id, created_time)，
+    request_id 不再全局唯一（同一请求重复写入不会被数据库拒绝）。用量统计改为读取汇总表后，仅保留 request_id、
+    (user_id, created_time) 及 created_time 索引，原有的 user_id、api_key_id、model_id、provider_id、model_name、
+    total_tokens 及 status 索引已删除
+    """
 
     __tablename__ = 'llm_usage_log'
+    __table_args__ = (
+        sa.Index('ix_llm_usage_log_user_created_time', 'user_id', 'created_time'),
+        sa.Index('ix_llm_usage_log_created_time', 'created_time'),
+        {'comment': 'LLM 用量日志表', 'postgresql_partition_by': 'RANGE (created_time)'},
+    )
 
-    id: Mapped[id_key] = mapped_column(init=False)
-    user_id: Mapped[int] = mapped_column(sa.BigInteger, index=True, comment='用户 ID')
-    api_key_id: Mapped[int] = mapped_column(sa.BigInteger, index=True, comment='API Key ID')
-    model_id: Mapped[int] = mapped_column(sa.BigInteger, index=True, comment='模型 ID')
-    provider_id: Mapped[int] = mapped_column(sa.BigInteger, index=True, comment='供应商 ID')
-    request_id: Mapped[str] = mapped_column(sa.String(64), unique=True, index=True, comment='请求 ID')
-    model_name: Mapped[str] = mapped_column(sa.String(128), index=True, comment='模型名称')
+    id: Mapped[int] = (
+        mapped_column(
+            sa.BigInteger, primary_key=True, init=False, autoincrement=True, sort_order=-999, comment='主键 ID'
+        )
+        if PrimaryKeyType.autoincrement == settings.DATABASE_PK_MODE
+        else mapped_column(
+            sa.BigInteger,
+            primary_key=True,
+            init=False,
+            autoincrement=False,
+            default=snowflake.generate,
+            sort_order=-999,
+            comment='雪花算法主键 ID',
+        )
+    )
+    created_time: Mapped[datetime] = mapped_column(
+        TimeZone,
+        primary_key=True,
+        init=False,
+        default_factory=timezone.now,
+        sort_order=999,
+        comment='创建时间',
+    )
+    user_id: Mapped[int] = mapped_column(sa.BigInteger, comment='用户 ID')
+    api_key_id: Mapped[int] = mapped_column(sa.BigInteger, comment='API Key ID')
+    model_id: Mapped[int] = mapped_column(sa.BigInteger, comment='模型 ID')
+    provider_id: Mapped[int] = mapped_column(sa.BigInteger, comment='供应商 ID')
+    request_id: Mapped[str] = mapped_column(sa.String(64), index=True, comment='请求 ID')
+    model_name: Mapped[str] = mapped_column(sa.String(128), comment='模型名称')
     input_tokens: Mapped[int] = mapped_column(default=0, comment='输入 tokens')
     output_tokens: Mapped[int] = mapped_column(default=0, comment='输出 tokens')
-    total_tokens: Mapped[int] = mapped_column(default=0, index=True, comment='总 tokens')
+    total_tokens: Mapped[int] = mapped_column(default=0, comment='总 tokens')
     input_cost: Mapped[Decimal] = mapped_column(sa.Numeric(10, 6), default=Decimal(0), comment='输入成本 (USD)')
     output_cost: Mapped[Decimal] = mapped_column(sa.Numeric(10, 6), default=Decimal(0), comment='输出成本 (USD)')
     total_cost: Mapped[Decimal] = mapped_column(sa.Numeric(10, 6), default=Decimal(0), comment='总成本 (USD)')
     latency_ms: Mapped[int] = mapped_column(default=0, comment='延迟(毫秒)')
-    status: Mapped[str] = mapped_column(sa.String(16), default='SUCCESS', index=True, comment='状态(SUCCESS/ERROR)')
+    status: Mapped[str] = mapped_column(sa.String(16), default='SUCCESS', comment='状态(SUCCESS/ERROR/CANCELLED)')
     error_message: Mapped[str | None] = mapped_column(sa.Text, default=None, comment='错误信息')
     is_streaming: Mapped[bool] = mapped_column(default=False, comment='是否流式')
+    cache_hit: Mapped[bool] = mapped_column(default=False, comment='是否命中响应缓存')
     ip_address: Mapped[str | None] = mapped_column(sa.String(64), default=None, comment='IP 地址')
@@ -0,0 +1,55 @@
+"""LLM 用量汇总表"""
+
+from datetime import datetime
+from decimal import Decimal
+
+import sqlalchemy as sa
+
+from sqlalchemy.orm import Mapped, MappedAsDataclass, mapped_column
+
+from backend.common.model import Base, TimeZone, id_key
+
+
+class UsageRollupMixin(MappedAsDataclass):
+    """用量汇总 Mixin 数据类"""
+
+    bucket: Mapped[datetime] = mapped_column(TimeZone, comment='统计时段起始时间')
+    user_id: Mapped[int] = mapped_column(sa.BigInteger, comment='用户 ID')
+    api_key_id: Mapped[int] = mapped_column(sa.BigInteger, comment='API Key ID')
+    model_name: Mapped[str] = mapped_column(sa.String(128), comment='模型名称')
+    provider_id: Mapped[int] = mapped_column(sa.BigInteger, comment='供应商 ID')
+    requests: Mapped[int] = mapped_column(sa.BigInteger, default=0, comment='请求数')
+    success_requests: Mapped[int] = mapped_column(sa.BigInteger, default=0, comment='成功请求数')
+    error_requests: Mapped[int] = mapped_column(sa.BigInteger, default=0, comment='失败请求数')
+    cancelled_requests: Mapped[int] = mapped_column(sa.BigInteger, default=0, comment='客户端取消请求数')
+    input_tokens: Mapped[int] = mapped_column(sa.BigInteger, default=0, comment='输入 tokens')
+    output_tokens: Mapped[int] = mapped_column(sa.BigInteger, default=0, comment='输出 tokens')
+    total_tokens: Mapped[int] = mapped_column(sa.BigInteger, default=0, comment='总 tokens')
+    total_cost: Mapped[Decimal] = mapped_column(sa.Numeric(16, 6), default=Decimal(0), comment='总成本 (USD)')
+    latency_ms: Mapped[int] = mapped_column(sa.BigInteger, default=0, comment='总延迟(毫秒)')
+
+
+class UsageHourly(Base, UsageRollupMixin):
+    """LLM 小时用量汇总表"""
+
+    __tablename__ = 'llm_usage_hourly'
+    __table_args__ = (
+        sa.UniqueConstraint('bucket', 'user_id', 'api_key_id', 'model_name', 'provider_id'),
+        sa.Index('ix_llm_usage_hourly_user_bucket', 'user_id', 'bucket'),
+        {'comment': 'LLM 小时用量汇总表'},
+    )
+
+    id: Mapped[id_key] = mapped_column(init=False)
+
+
+class UsageDaily(Base, UsageRollupMixin):
+    """LLM 每日用量汇总表"""
+
+    __tablename__ = 'llm_usage_daily'
+    __table_args__ = (
+        sa.UniqueConstraint('bucket', 'user_id', 'api_key_id', 'model_name', 'provider_id'),
+        sa.Index('ix_llm_usage_daily_user_bucket', 'user_id', 'bucket'),
+        {'comment': 'LLM 每日用量汇总表'},
+    )
+
+    id: Mapped[id_key] = mapped_column(init=False)
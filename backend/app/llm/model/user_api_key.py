@@ -26,6 +26,9 @@ class UserApiKey(Base):
     custom_daily_tokens: Mapped[int | None] = mapped_column(default=None, comment='自定义日 Token 限制')
     custom_monthly_tokens: Mapped[int | None] = mapped_column(default=None, comment='自定义月 Token 限制')
     custom_rpm_limit: Mapped[int | None] = mapped_column(default=None, comment='自定义 RPM 限制')
+    response_cache_ttl: Mapped[int | None] = mapped_column(
+        default=None, comment='响应缓存秒数(为空沿用模型配置，0 不缓存)'
+    )
     allowed_models: Mapped[list | None] = mapped_column(sa.JSON, default=None, comment='允许的模型列表')
     metadata_: Mapped[dict | None] = mapped_column('metadata', sa.JSON, default=None, comment='元数据')
     last_used_at: Mapped[datetime | None] = mapped_column(TimeZone, init=False, default=None, comment='最后使用时间')
@@ -0,0 +1,72 @@
+"""批处理 Schema - OpenAI Batch API 兼容格式"""
+
+from typing import Literal
+
+from pydantic import Field
+
+from backend.common.schema import SchemaBase
+
+
+class BatchRequestInput(SchemaBase):
+    """批处理输入行"""
+
+    custom_id: str = Field(min_length=1, max_length=64, description='自定义 ID')
+    method: Literal['POST'] = Field(description='请求方法')
+    url: str = Field(description='请求端点')
+    body: dict = Field(description='请求体')
+
+
+class BatchRequestCounts(SchemaBase):
+    """批处理请求计数"""
+
+    total: int = 0
+    completed: int = 0
+    failed: int = 0
+
+
+class BatchError(SchemaBase):
+    """批处理错误"""
+
+    code: str
+    message: str
+    line: int | None = None
+
+
+class BatchErrors(SchemaBase):
+    """批处理错误列表"""
+
+    object: Literal['list'] = 'list'
+    data: list[BatchError] = Field(default_factory=list)
+
+
+class GetBatchDetail(SchemaBase):
+    """批处理详情"""
+
+    id: str
+    object: Literal['batch'] = 'batch'
+    endpoint: str
+    errors: BatchErrors | None = None
+    input_file_id: str
+    completion_window: str
+    status: str
+    output_file_id: str | None = None
+    error_file_id: str | None = None
+    created_at: int
+    in_progress_at: int | None = None
+    expires_at: int | None = None
+    completed_at: int | None = None
+    failed_at: int | None = None
+    expired_at: int | None = None
+    cancelled_at: int | None = None
+    request_counts: BatchRequestCounts
+    metadata: dict | None = None
+
+
+class GetBatchList(SchemaBase):
+    """批处理列表"""
+
+    object: Literal['list'] = 'list'
+    data: list[GetBatchDetail]
+    first_id: str | None = None
+    last_id: str | None = None
+    has_more: bool = False
@@ -24,6 +24,7 @@ class ModelConfigBase(SchemaBase):
     output_cost_per_1k: Decimal = Field(default=Decimal(0), description='输出成本/1K tokens (USD)')
     rpm_limit: int | None = Field(default=None, description='模型 RPM 限制')
     tpm_limit: int | None = Field(default=None, description='模型 TPM 限制')
+    response_cache_ttl: int = Field(default=0, ge=0, description='响应缓存秒数(0 不缓存)')
     priority: int = Field(default=0, description='优先级(越大越优先)')
     enabled: bool = Field(default=True, description='是否启用')
 
@@ -48,6 +49,7 @@ class UpdateModelConfigParam(SchemaBase):
     output_cost_per_1k: Decimal | None = Field(default=None, description='输出成本/1K tokens (USD)')
     rpm_limit: int | None = Field(default=None, description='模型 RPM 限制')
     tpm_limit: int | None = Field(default=None, description='模型 TPM 限制')
+    response_cache_ttl: int | None = Field(default=None, ge=0, description='响应缓存秒数(0 不缓存)')
     priority: int | None = Field(default=None, description='优先级(越大越优先)')
     enabled: bool | None = Field(default=None, description='是否启用')
 
@@ -77,6 +79,7 @@ class GetModelConfigList(SchemaBase):
     supports_vision: bool
     input_cost_per_1k: Decimal = Decimal(0)
     output_cost_per_1k: Decimal = Decimal(0)
+    response_cache_ttl: int = 0
     priority: int
     enabled: bool
 
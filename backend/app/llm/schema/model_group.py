@@ -2,7 +2,7 @@
 
 from pydantic import Field, computed_field
 
-from backend.app.llm.enums import ModelType
+from backend.app.llm.enums import ModelSelectionStrategy, ModelType
 from backend.common.schema import SchemaBase
 
 
@@ -15,6 +15,9 @@ class ModelGroupBase(SchemaBase):
     fallback_enabled: bool = Field(default=True, description='启用故障转移')
     retry_count: int = Field(default=3, description='重试次数')
     timeout_seconds: int = Field(default=60, description='超时秒数')
+    hedge_enabled: bool = Field(default=False, description='启用对冲请求')
+    selection_strategy: ModelSelectionStrategy = Field(default=ModelSelectionStrategy.PRIORITY, description='选路策略')
+    model_weights: dict[int, int] | None = Field(default=None, description='模型权重(模型 ID -> 权重)')
     enabled: bool = Field(default=True, description='是否启用')
     description: str | None = Field(default=None, description='描述')
 
@@ -32,6 +35,9 @@ class UpdateModelGroupParam(SchemaBase):
     fallback_enabled: bool | None = Field(default=None, description='启用故障转移')
     retry_count: int | None = Field(default=None, description='重试次数')
     timeout_seconds: int | None = Field(default=None, description='超时秒数')
+    hedge_enabled: bool | None = Field(default=None, description='启用对冲请求')
+    selection_strategy: ModelSelectionStrategy | None = Field(default=None, description='选路策略')
+    model_weights: dict[int, int] | None = Field(default=None, description='模型权重(模型 ID -> 权重)')
     enabled: bool | None = Field(default=None, description='是否启用')
     description: str | None = Field(default=None, description='描述')
 
@@ -54,6 +60,7 @@ class GetModelGroupList(SchemaBase):
     model_type: str
     model_ids: list[int] = Field(default_factory=list, exclude=True)
     fallback_enabled: bool
+    selection_strategy: str
     enabled: bool
     description: str | None = None
 
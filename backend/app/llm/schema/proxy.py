@@ -28,6 +28,7 @@ class ChatCompletionRequest(SchemaBase):
     top_p: float | None = Field(default=None, ge=0, le=1, description='Top P')
     n: int | None = Field(default=1, ge=1, le=10, description='生成数量')
     stream: bool = Field(default=False, description='是否流式')
+    stream_options: dict | None = Field(default=None, description='流式选项')
     stop: str | list[str] | None = Field(default=None, description='停止词')
     max_tokens: int | None = Field(default=None, description='最大 tokens')
     presence_penalty: float | None = Field(default=None, ge=-2, le=2, description='存在惩罚')
@@ -95,6 +96,40 @@ class ChatCompletionChunk(SchemaBase):
     system_fingerprint: str | None = None
 
 
+class EmbeddingRequest(SchemaBase):
+    """OpenAI Embeddings 请求"""
+
+    model: str = Field(description='模型名称')
+    input: str | list[str] = Field(description='输入文本')
+    encoding_format: Literal['float', 'base64'] = Field(default='float', description='向量编码格式')
+    dimensions: int | None = Field(default=None, ge=1, description='向量维度')
+    user: str | None = Field(default=None, description='用户标识')
+
+
+class EmbeddingData(SchemaBase):
+    """Embedding 向量"""
+
+    object: str = 'embedding'
+    index: int
+    embedding: list[float] | str
+
+
+class EmbeddingUsage(SchemaBase):
+    """Embedding 用量"""
+
+    prompt_tokens: int
+    total_tokens: int
+
+
+class EmbeddingResponse(SchemaBase):
+    """OpenAI Embeddings 响应"""
+
+    object: str = 'list'
+    data: list[EmbeddingData]
+    model: str
+    usage: EmbeddingUsage
+
+
 # ==================== Anthropic 兼容格式 ====================
 
 
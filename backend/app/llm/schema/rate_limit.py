@@ -2,6 +2,7 @@
 
 from pydantic import Field
 
+from backend.app.llm.enums import RateLimitAlgorithm
 from backend.common.schema import SchemaBase
 
 
@@ -13,7 +14,8 @@ class RateLimitConfigBase(SchemaBase):
     weekly_token_limit: int | None = Field(default=None, description='周 Token 限制')
     monthly_token_limit: int = Field(default=10000000, description='月 Token 限制')
     rpm_limit: int = Field(default=60, description='RPM 限制')
-    tpm_limit: int = Field(default=100000, description='TPM 限制')
+    tpm_limit: int | None = Field(default=None, description='TPM 限制，为空表示不限制')
+    algorithm: RateLimitAlgorithm = Field(default=RateLimitAlgorithm.FIXED_WINDOW, description='限流算法')
     enabled: bool = Field(default=True, description='是否启用')
     description: str | None = Field(default=None, description='描述')
 
@@ -31,6 +33,7 @@ class UpdateRateLimitConfigParam(SchemaBase):
     monthly_token_limit: int | None = Field(default=None, description='月 Token 限制')
     rpm_limit: int | None = Field(default=None, description='RPM 限制')
     tpm_limit: int | None = Field(default=None, description='TPM 限制')
+    algorithm: RateLimitAlgorithm | None = Field(default=None, description='限流算法')
     enabled: bool | None = Field(default=None, description='是否启用')
     description: str | None = Field(default=None, description='描述')
 
@@ -53,5 +56,7 @@ class GetRateLimitConfigList(SchemaBase):
     daily_token_limit: int
     monthly_token_limit: int
     rpm_limit: int
+    tpm_limit: int | None = None
+    algorithm: str
     enabled: bool
     description: str | None = None
@@ -27,6 +27,7 @@ class UsageLogBase(SchemaBase):
     status: str
     error_message: str | None = None
     is_streaming: bool = False
+    cache_hit: bool = False
     ip_address: str | None = None
 
 
@@ -51,6 +52,7 @@ class GetUsageLogList(SchemaBase):
     latency_ms: int
     status: str
     is_streaming: bool
+    cache_hit: bool
     created_time: datetime
 
 
@@ -60,6 +62,7 @@ class UsageSummary(SchemaBase):
     total_requests: int = Field(description='总请求数')
     success_requests: int = Field(description='成功请求数')
     error_requests: int = Field(description='失败请求数')
+    cancelled_requests: int = Field(description='客户端取消请求数')
     total_tokens: int = Field(description='总 tokens')
     total_input_tokens: int = Field(description='总输入 tokens')
     total_output_tokens: int = Field(description='总输出 tokens')
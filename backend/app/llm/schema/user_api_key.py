@@ -17,6 +17,7 @@ class UserApiKeyBase(SchemaBase):
     custom_daily_tokens: int | None = Field(default=None, description='自定义日 Token 限制')
     custom_monthly_tokens: int | None = Field(default=None, description='自定义月 Token 限制')
     custom_rpm_limit: int | None = Field(default=None, description='自定义 RPM 限制')
+    response_cache_ttl: int | None = Field(default=None, ge=0, description='响应缓存秒数(为空沿用模型配置，0 不缓存)')
     allowed_models: list[int] | None = Field(default=None, description='允许的模型 ID 列表')
     metadata_: dict | None = Field(default=None, alias='metadata', description='元数据')
 
@@ -45,6 +46,7 @@ class UpdateUserApiKeyParam(SchemaBase):
     custom_daily_tokens: int | None = Field(default=None, description='自定义日 Token 限制')
     custom_monthly_tokens: int | None = Field(default=None, description='自定义月 Token 限制')
     custom_rpm_limit: int | None = Field(default=None, description='自定义 RPM 限制')
+    response_cache_ttl: int | None = Field(default=None, ge=0, description='响应缓存秒数(为空沿用模型配置，0 不缓存)')
     allowed_models: list[int] | None = Field(default=None, description='允许的模型 ID 列表')
     metadata_: dict | None = Field(default=None, alias='metadata', description='元数据')
 
@@ -62,6 +64,7 @@ class GetUserApiKeyDetail(SchemaBase):
     custom_daily_tokens: int | None = None
     custom_monthly_tokens: int | None = None
     custom_rpm_limit: int | None = None
+    response_cache_ttl: int | None = None
     allowed_models: list[int] | None = None
     metadata_: dict | None = Field(default=None, alias='metadata')
     last_used_at: datetime | None = None
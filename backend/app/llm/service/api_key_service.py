@@ -4,10 +4,11 @@ from typing import Any
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.app.llm.core.api_key_cache import ApiKeyCacheMarker, CachedApiKey, api_key_cache
 from backend.app.llm.core.encryption import key_encryption
 from backend.app.llm.crud.crud_rate_limit import rate_limit_dao
 from backend.app.llm.crud.crud_user_api_key import user_api_key_dao
-from backend.app.llm.enums import ApiKeyStatus
+from backend.app.llm.enums import ApiKeyStatus, RateLimitAlgorithm
 from backend.app.llm.model.user_api_key import UserApiKey
 from backend.app.llm.schema.user_api_key import (
     CreateUserApiKeyParam,
@@ -135,7 +136,9 @@ class ApiKeyService:
             if not config:
                 raise errors.NotFoundError(msg='速率限制配置不存在')
 
-        return await user_api_key_dao.update(db, pk, obj)
+        count = await user_api_key_dao.update(db, pk, obj)
+        await api_key_cache.invalidate(api_key.key_hash)
+        return count
 
     @staticmethod
     async def delete(db: AsyncSession, pk: int, user_id: int) -> int:
@@ -145,26 +148,36 @@ class ApiKeyService:
             raise errors.NotFoundError(msg='API Key 不存在')
         if api_key.user_id != user_id:
             raise errors.ForbiddenError(msg='无权删除此 API Key')
-        return await user_api_key_dao.delete(db, pk)
+        count = await user_api_key_dao.delete(db, pk)
+        await api_key_cache.invalidate(api_key.key_hash)
+        return count
 
     @staticmethod
-    async def verify_api_key(db: AsyncSession, api_key: str) -> UserApiKey:
+    async def verify_api_key(db: AsyncSession, api_key: str) -> CachedApiKey:
         """
         验证 API Key
 
         :param db: 数据库会话
         :param api_key: API Key
-        :return: API Key 记录
+        :return: API Key 及其生效限制
         :raises: 验证失败时抛出异常
         """
         # 计算哈希
         key_hash = key_encryption.hash_key(api_key)
 
-        # 查找记录
-        record = await user_api_key_dao.get_by_hash(db, key_hash)
-        if not record:
+        # 优先查缓存
+        record = await api_key_cache.get(key_hash)
+        if record is ApiKeyCacheMarker.INVALID:
             raise errors.AuthorizationError(msg='Invalid API Key')
 
+        if record is None:
+            api_key_record = await user_api_key_dao.get_by_hash(db, key_hash)
+            if not api_key_record:
+                await api_key_cache.set_negative(key_hash)
+                raise errors.AuthorizationError(msg='Invalid API Key')
+            record = await ApiKeyService._build_cached(db, api_key_record)
+            await api_key_cache.set(record)
+
         # 检查状态
         if record.status != ApiKeyStatus.ACTIVE:
             raise errors.AuthorizationError(msg=f'API Key is {record.status.lower()}')
@@ -173,13 +186,53 @@ class ApiKeyService:
         if record.expires_at and record.expires_at < timezone.now():
             # 更新状态为过期
             await user_api_key_dao.update(db, record.id, UpdateUserApiKeyParam(status=ApiKeyStatus.EXPIRED))
+            await api_key_cache.invalidate(key_hash)
             raise errors.AuthorizationError(msg='API Key has expired')
 
-        # 更新最后使用时间
-        await user_api_key_dao.update_last_used(db, record.id)
+        # 更新最后使用时间（Redis 合并，定时批量入库）
+        await api_key_cache.touch(record.id)
 
         return record
 
+    @staticmethod
+    async def load_api_key(db: AsyncSession, pk: int) -> CachedApiKey:
+        """
+        按 ID 加载 API Key 及其生效限制（用于后台任务，不经过缓存）
+
+        :param db: 数据库会话
+        :param pk: API Key ID
+        :return: API Key 及其生效限制
+        :raises: API Key 不可用时抛出异常
+        """
+        api_key_record = await user_api_key_dao.get(db, pk)
+        if not api_key_record:
+            raise errors.AuthorizationError(msg='Invalid API Key')
+        if api_key_record.status != ApiKeyStatus.ACTIVE:
+            raise errors.AuthorizationError(msg=f'API Key is {api_key_record.status.lower()}')
+        if api_key_record.expires_at and api_key_record.expires_at < timezone.now():
+            raise errors.AuthorizationError(msg='API Key has expired')
+        return await ApiKeyService._build_cached(db, api_key_record)
+
+    @staticmethod
+    async def _build_cached(db: AsyncSession, api_key_record: UserApiKey) -> CachedApiKey:
+        """
+        构建可缓存的 API Key
+
+        :param db: 数据库会话
+        :param api_key_record: API Key 记录
+        :return:
+        """
+        return CachedApiKey(
+            id=api_key_record.id,
+            user_id=api_key_record.user_id,
+            key_hash=api_key_record.key_hash,
+            status=api_key_record.status,
+            expires_at=api_key_record.expires_at,
+            allowed_models=api_key_record.allowed_models,
+            rate_limits=await ApiKeyService._resolve_rate_limits(db, api_key_record),
+            response_cache_ttl=api_key_record.response_cache_ttl,
+        )
+
     @staticmethod
     async def create_default_key(db: AsyncSession, user_id: int) -> UserApiKey:
         """
@@ -252,10 +305,20 @@ class ApiKeyService:
         return await ApiKeyService.create_default_key(db, user_id)
 
     @staticmethod
-    async def get_rate_limits(db: AsyncSession, api_key: UserApiKey) -> dict:
+    def get_rate_limits(api_key: CachedApiKey) -> dict:
         """
         获取 API Key 的速率限制配置
 
+        :param api_key: 已验证的 API Key
+        :return: 速率限制配置
+        """
+        return dict(api_key.rate_limits)
+
+    @staticmethod
+    async def _resolve_rate_limits(db: AsyncSession, api_key: UserApiKey) -> dict:
+        """
+        解析 API Key 的速率限制配置
+
         :param db: 数据库会话
         :param api_key: API Key 记录
         :return: 速率限制配置
@@ -265,6 +328,8 @@ class ApiKeyService:
             'rpm_limit': 60,
             'daily_token_limit': 1000000,
             'monthly_token_limit': 10000000,
+            'tpm_limit': 0,
+            'algorithm': RateLimitAlgorithm.FIXED_WINDOW,
         }
 
         # 如果有自定义限制，使用自定义限制
@@ -282,6 +347,8 @@ class ApiKeyService:
                 default_limits['rpm_limit'] = config.rpm_limit
                 default_limits['daily_token_limit'] = config.daily_token_limit
                 default_limits['monthly_token_limit'] = config.monthly_token_limit
+                default_limits['tpm_limit'] = config.tpm_limit or 0
+                default_limits['algorithm'] = config.algorithm
 
         return default_limits
 
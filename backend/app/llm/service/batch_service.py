@@ -0,0 +1,219 @@
+"""批处理 Service"""
+
+import uuid
+
+from datetime import timedelta
+from pathlib import Path
+
+from anyio import Path as AsyncPath
+from anyio import open_file
+from fastapi import UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.app.llm.core.batch_runner import BATCH_STORAGE_DIR
+from backend.app.llm.crud.crud_batch import batch_dao
+from backend.app.llm.enums import BatchStatus
+from backend.app.llm.model.batch import Batch
+from backend.app.llm.schema.batch import BatchError, BatchErrors, BatchRequestCounts, GetBatchDetail, GetBatchList
+from backend.app.llm.service.api_key_service import api_key_service
+from backend.app.task.celery import celery_app
+from backend.common.exception import errors
+from backend.core.conf import settings
+from backend.utils.timezone import timezone
+
+# 支持的批处理端点
+BATCH_ENDPOINTS = ('/v1/chat/completions',)
+
+# 上传文件读取块大小
+_UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# 结束状态对应的时间字段
+_FINISHED_FIELDS = {
+    BatchStatus.COMPLETED: 'completed_at',
+    BatchStatus.FAILED: 'failed_at',
+    BatchStatus.EXPIRED: 'expired_at',
+    BatchStatus.CANCELLED: 'cancelled_at',
+}
+
+
+class BatchService:
+    """批处理服务"""
+
+    @staticmethod
+    async def _save_input(file: UploadFile, path: Path) -> None:
+        """
+        分块保存输入文件
+
+        :param file: 上传文件
+        :param path: 保存路径
+        :return:
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        size = 0
+        async with await open_file(path, 'wb') as fb:
+            while chunk := await file.read(_UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > settings.LLM_BATCH_MAX_FILE_SIZE:
+                    break
+                await fb.write(chunk)
+        if size > settings.LLM_BATCH_MAX_FILE_SIZE:
+            await AsyncPath(path).unlink(missing_ok=True)
+            raise errors.RequestError(msg=f'文件超出最大限制 {settings.LLM_BATCH_MAX_FILE_SIZE // 1024 // 1024}MB')
+
+    @staticmethod
+    def _to_detail(batch: Batch) -> GetBatchDetail:
+        """
+        转换为 OpenAI 批处理对象
+
+        :param batch: 批处理
+        :return:
+        """
+        detail = GetBatchDetail(
+            id=batch.batch_id,
+            endpoint=batch.endpoint,
+            errors=BatchErrors(data=[BatchError(code='invalid_file', message=batch.error_message)])
+            if batch.error_message
+            else None,
+            input_file_id=batch.input_file,
+            completion_window=batch.completion_window,
+            status=batch.status,
+            output_file_id=batch.output_file,
+            error_file_id=batch.error_file,
+            created_at=int(batch.created_time.timestamp()),
+            in_progress_at=int(batch.in_progress_at.timestamp()) if batch.in_progress_at else None,
+            expires_at=int(batch.expires_at.timestamp()) if batch.expires_at else None,
+            request_counts=BatchRequestCounts(
+                total=batch.total_count, completed=batch.completed_count, failed=batch.failed_count
+            ),
+            metadata=batch.metadata_,
+        )
+        field = _FINISHED_FIELDS.get(batch.status)
+        if field and batch.finished_at:
+            setattr(detail, field, int(batch.finished_at.timestamp()))
+        return detail
+
+    @staticmethod
+    async def _get_owned(db: AsyncSession, user_id: int, batch_id: str) -> Batch:
+        """
+        获取当前用户的批处理
+
+        :param db: 数据库会话
+        :param user_id: 用户 ID
+        :param batch_id: 批处理 ID
+        :return:
+        """
+        batch = await batch_dao.get_by_batch_id(db, batch_id)
+        if not batch or batch.user_id != user_id:
+            raise errors.NotFoundError(msg='批处理不存在')
+        return batch
+
+    async def create(
+        self,
+        db: AsyncSession,
+        *,
+        api_key: str,
+        file: UploadFile,
+        endpoint: str,
+        completion_window: str,
+    ) -> GetBatchDetail:
+        """
+        创建批处理
+
+        :param db: 数据库会话
+        :param api_key: API Key
+        :param file: JSONL 输入文件
+        :param endpoint: 请求端点
+        :param completion_window: 完成时间窗口
+        :return:
+        """
+        if endpoint not in BATCH_ENDPOINTS:
+            raise errors.RequestError(msg=f'不支持的批处理端点: {endpoint}')
+        if completion_window not in settings.LLM_BATCH_COMPLETION_WINDOWS:
+            raise errors.RequestError(msg=f'不支持的完成时间窗口: {completion_window}')
+        api_key_record = await api_key_service.verify_api_key(db, api_key)
+
+        batch_id = f'batch_{uuid.uuid4().hex}'
+        input_file = f'{batch_id}_input.jsonl'
+        await self._save_input(file, BATCH_STORAGE_DIR / input_file)
+
+        batch = await batch_dao.create(
+            db,
+            batch_id=batch_id,
+            user_id=api_key_record.user_id,
+            api_key_id=api_key_record.id,
+            endpoint=endpoint,
+            input_file=input_file,
+            completion_window=completion_window,
+            status=BatchStatus.VALIDATING,
+            expires_at=timezone.now() + timedelta(hours=int(completion_window.removesuffix('h'))),
+        )
+        celery_app.send_task(name='backend.app.task.tasks.llm.tasks.process_llm_batch', args=[batch_id])
+        return self._to_detail(batch)
+
+    async def get(self, db: AsyncSession, user_id: int, batch_id: str) -> GetBatchDetail:
+        """
+        获取批处理
+
+        :param db: 数据库会话
+        :param user_id: 用户 ID
+        :param batch_id: 批处理 ID
+        :return:
+        """
+        return self._to_detail(await self._get_owned(db, user_id, batch_id))
+
+    async def get_list(self, db: AsyncSession, user_id: int, *, limit: int, after: str | None = None) -> GetBatchList:
+        """
+        获取批处理列表
+
+        :param db: 数据库会话
+        :param user_id: 用户 ID
+        :param limit: 返回数量
+        :param after: 分页游标（上一页最后一个批处理 ID）
+        :return:
+        """
+        batches = await batch_dao.get_user_batches(db, user_id, limit=limit + 1, after=after)
+        data = [self._to_detail(batch) for batch in batches[:limit]]
+        return GetBatchList(
+            data=data,
+            first_id=data[0].id if data else None,
+            last_id=data[-1].id if data else None,
+            has_more=len(batches) > limit,
+        )
+
+    async def cancel(self, db: AsyncSession, user_id: int, batch_id: str) -> GetBatchDetail:
+        """
+        取消批处理，执行中的请求完成后停止
+
+        :param db: 数据库会话
+        :param user_id: 用户 ID
+        :param batch_id: 批处理 ID
+        :return:
+        """
+        batch = await self._get_owned(db, user_id, batch_id)
+        count = await batch_dao.transition(
+            db, batch.id, [BatchStatus.VALIDATING, BatchStatus.IN_PROGRESS], {'status': BatchStatus.CANCELLING}
+        )
+        if not count:
+            raise errors.RequestError(msg=f'批处理状态为 {batch.status}，无法取消')
+        await db.refresh(batch)
+        return self._to_detail(batch)
+
+    async def get_result_file(self, db: AsyncSession, user_id: int, batch_id: str, *, error: bool = False) -> Path:
+        """
+        获取批处理结果文件
+
+        :param db: 数据库会话
+        :param user_id: 用户 ID
+        :param batch_id: 批处理 ID
+        :param error: 是否获取错误文件
+        :return:
+        """
+        batch = await self._get_owned(db, user_id, batch_id)
+        filename = batch.error_file if error else batch.output_file
+        path = BATCH_STORAGE_DIR / filename if filename else None
+        if path is None or not path.exists():
+            raise errors.NotFoundError(msg='结果文件不存在')
+        return path
+
+
+batch_service = BatchService()
@@ -1,10 +1,14 @@
 """网关 Service"""
 
-from collections.abc import AsyncIterator
+import contextlib
 
-from sqlalchemy.ext.asyncio import AsyncSession
+from collections.abc import AsyncIterator
 
+from backend.app.llm.core.api_key_cache import CachedApiKey
 from backend.app.llm.core.gateway import llm_gateway
+from backend.app.llm.core.routing import ModelRoute
+from backend.app.llm.core.sse import ANTHROPIC_STOP_REASONS, AnthropicStreamEncoder, OpenAIStreamEncoder
+from backend.app.llm.core.stream import StreamEvent
 from backend.app.llm.schema.proxy import (
     AnthropicContentBlock,
     AnthropicMessageRequest,
@@ -13,16 +17,35 @@ from backend.app.llm.schema.proxy import (
     ChatCompletionRequest,
     ChatCompletionResponse,
     ChatMessage,
+    EmbeddingRequest,
+    EmbeddingResponse,
 )
 from backend.app.llm.service.api_key_service import api_key_service
+from backend.core.conf import settings
+from backend.database.db import async_db_session
 
 
 class GatewayService:
     """网关服务"""
 
+    @staticmethod
+    async def _prepare(api_key: str, model_name: str) -> tuple[CachedApiKey, ModelRoute]:
+        """
+        验证 API Key 并解析模型路由
+
+        数据库会话仅在此阶段占用，上游调用及流式响应期间不持有连接
+
+        :param api_key: API Key
+        :param model_name: 模型名称
+        :return: API Key 及模型路由
+        """
+        async with async_db_session() as db:
+            api_key_record = await api_key_service.verify_api_key(db, api_key)
+            route = await llm_gateway.resolve_route(db, model_name)
+        return api_key_record, route
+
     @staticmethod
     async def chat_completion(
-        db: AsyncSession,
         *,
         api_key: str,
         request: ChatCompletionRequest,
@@ -31,65 +54,130 @@ class GatewayService:
         """
         聊天补全（非流式）
 
-        :param db: 数据库会话
         :param api_key: API Key
         :param request: 请求参数
         :param ip_address: IP 地址
         :return: 聊天补全响应
         """
-        # 验证 API Key
-        api_key_record = await api_key_service.verify_api_key(db, api_key)
+        # 验证 API Key 并解析路由
+        api_key_record, route = await GatewayService._prepare(api_key, request.model)
 
         # 获取速率限制
-        rate_limits = await api_key_service.get_rate_limits(db, api_key_record)
+        rate_limits = api_key_service.get_rate_limits(api_key_record)
 
         # 调用网关
         return await llm_gateway.chat_completion(
-            db,
+            route,
             request=request,
             user_id=api_key_record.user_id,
             api_key_id=api_key_record.id,
             rpm_limit=rate_limits['rpm_limit'],
             daily_limit=rate_limits['daily_token_limit'],
             monthly_limit=rate_limits['monthly_token_limit'],
+            tpm_limit=rate_limits['tpm_limit'],
+            rate_limit_algorithm=rate_limits['algorithm'],
             ip_address=ip_address,
+            response_cache_ttl=api_key_record.response_cache_ttl,
         )
 
     @staticmethod
-    async def chat_completion_stream(
-        db: AsyncSession,
+    async def embedding(
         *,
         api_key: str,
-        request: ChatCompletionRequest,
+        request: EmbeddingRequest,
         ip_address: str | None = None,
-    ) -> AsyncIterator[str]:
+    ) -> EmbeddingResponse:
         """
-        聊天补全（流式）
+        文本向量化
 
-        :param db: 数据库会话
         :param api_key: API Key
         :param request: 请求参数
         :param ip_address: IP 地址
-        :return: SSE 流
+        :return: Embedding 响应
         """
-        # 验证 API Key
-        api_key_record = await api_key_service.verify_api_key(db, api_key)
+        # 验证 API Key 并解析路由
+        api_key_record, route = await GatewayService._prepare(api_key, request.model)
 
         # 获取速率限制
-        rate_limits = await api_key_service.get_rate_limits(db, api_key_record)
+        rate_limits = api_key_service.get_rate_limits(api_key_record)
 
         # 调用网关
-        async for chunk in llm_gateway.chat_completion_stream(
-            db,
+        return await llm_gateway.embedding(
+            route,
             request=request,
             user_id=api_key_record.user_id,
             api_key_id=api_key_record.id,
             rpm_limit=rate_limits['rpm_limit'],
             daily_limit=rate_limits['daily_token_limit'],
             monthly_limit=rate_limits['monthly_token_limit'],
+            tpm_limit=rate_limits['tpm_limit'],
+            rate_limit_algorithm=rate_limits['algorithm'],
             ip_address=ip_address,
-        ):
-            yield chunk
+        )
+
+    @staticmethod
+    async def _stream_events(
+        *,
+        api_key: str,
+        request: ChatCompletionRequest,
+        ip_address: str | None = None,
+    ) -> AsyncIterator[StreamEvent]:
+        """
+        聊天补全流式事件
+
+        :param api_key: API Key
+        :param request: 请求参数
+        :param ip_address: IP 地址
+        :return: 流式事件
+        """
+        # 验证 API Key 并解析路由
+        api_key_record, route = await GatewayService._prepare(api_key, request.model)
+
+        # 获取速率限制
+        rate_limits = api_key_service.get_rate_limits(api_key_record)
+
+        # 调用网关，客户端断开时逐层关闭至上游
+        events = llm_gateway.chat_completion_events(
+            route,
+            request=request,
+            user_id=api_key_record.user_id,
+            api_key_id=api_key_record.id,
+            rpm_limit=rate_limits['rpm_limit'],
+            daily_limit=rate_limits['daily_token_limit'],
+            monthly_limit=rate_limits['monthly_token_limit'],
+            tpm_limit=rate_limits['tpm_limit'],
+            rate_limit_algorithm=rate_limits['algorithm'],
+            ip_address=ip_address,
+            response_cache_ttl=api_key_record.response_cache_ttl,
+        )
+        async with contextlib.aclosing(events):
+            async for event in events:
+                yield event
+
+    async def chat_completion_stream(
+        self,
+        *,
+        api_key: str,
+        request: ChatCompletionRequest,
+        ip_address: str | None = None,
+    ) -> AsyncIterator[str]:
+        """
+        聊天补全（流式）
+
+        :param api_key: API Key
+        :param request: 请求参数
+        :param ip_address: IP 地址
+        :return: SSE 流
+        """
+        encoder = OpenAIStreamEncoder(
+            include_usage=bool((request.stream_options or {}).get('include_usage')),
+            passthrough=settings.LLM_STREAM_PASSTHROUGH,
+        )
+        events = self._stream_events(api_key=api_key, request=request, ip_address=ip_address)
+        async with contextlib.aclosing(events):
+            async for event in events:
+                if data := encoder.encode(event):
+                    yield data
 
     @staticmethod
     def _convert_anthropic_to_openai(request: AnthropicMessageRequest) -> ChatCompletionRequest:
@@ -133,7 +221,8 @@ class GatewayService:
             choice = response.choices[0]
             if choice.message.content:
                 content.append(AnthropicContentBlock(type='text', text=choice.message.content))
-            stop_reason = choice.finish_reason
+            if choice.finish_reason:
+                stop_reason = ANTHROPIC_STOP_REASONS.get(choice.finish_reason, 'end_turn')
 
         usage = AnthropicUsage(
             input_tokens=response.usage.prompt_tokens if response.usage else 0,
@@ -150,7 +239,6 @@ class GatewayService:
 
     async def anthropic_messages(
         self,
-        db: AsyncSession,
         *,
         api_key: str,
         request: AnthropicMessageRequest,
@@ -159,7 +247,6 @@ class GatewayService:
         """
         Anthropic Messages API（非流式）
 
-        :param db: 数据库会话
         :param api_key: API Key
         :param request: 请求参数
         :param ip_address: IP 地址
@@ -170,7 +257,6 @@ class GatewayService:
 
         # 调用 OpenAI 兼容接口
         openai_response = await self.chat_completion(
-            db,
             api_key=api_key,
             request=openai_request,
             ip_address=ip_address,
@@ -181,7 +267,6 @@ class GatewayService:
 
     async def anthropic_messages_stream(
         self,
-        db: AsyncSession,
         *,
         api_key: str,
         request: AnthropicMessageRequest,
@@ -190,58 +275,21 @@ class GatewayService:
         """
         Anthropic Messages API（流式）
 
-        :param db: 数据库会话
         :param api_key: API Key
         :param request: 请求参数
         :param ip_address: IP 地址
         :return: SSE 流
         """
-        import json
-
         # 转换为 OpenAI 格式
         openai_request = self._convert_anthropic_to_openai(request)
         openai_request.stream = True
 
-        # 发送 message_start 事件
-        yield f'event: message_start\ndata: {{"type": "message_start", "message": {{"id": "msg_temp", "type": "message", "role": "assistant", "content": [], "model": "{request.model}"}}}}\n\n'
-
-        # 发送 content_block_start 事件
-        yield 'event: content_block_start\ndata: {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}\n\n'
-
-        # 流式转发
-        async for chunk in self.chat_completion_stream(
-            db,
-            api_key=api_key,
-            request=openai_request,
-            ip_address=ip_address,
-        ):
-            if chunk.startswith('data: [DONE]'):
-                break
-            if chunk.startswith('data: '):
-                try:
-                    data = json.loads(chunk[6:])
-                    if data.get('choices'):
-                        delta = data['choices'][0].get('delta', {})
-                        content = delta.get('content', '')
-                        if content:
-                            # 转换为 Anthropic 格式
-                            anthropic_chunk = {
-                                'type': 'content_block_delta',
-                                'index': 0,
-                                'delta': {'type': 'text_delta', 'text': content},
-                            }
-                            yield f'event: content_block_delta\ndata: {json.dumps(anthropic_chunk)}\n\n'
-                except json.JSONDecodeError:
-                    pass
-
-        # 发送 content_block_stop 事件
-        yield 'event: content_block_stop\ndata: {"type": "content_block_stop", "index": 0}\n\n'
-
-        # 发送 message_delta 事件
-        yield 'event: message_delta\ndata: {"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": 0}}\n\n'
-
-        # 发送 message_stop 事件
-        yield 'event: message_stop\ndata: {"type": "message_stop"}\n\n'
+        encoder = AnthropicStreamEncoder()
+        events = self._stream_events(api_key=api_key, request=openai_request, ip_address=ip_address)
+        async with contextlib.aclosing(events):
+            async for event in events:
+                if data := encoder.encode(event):
+                    yield data
 
 
 gateway_service = GatewayService()
@@ -8,6 +8,7 @@ from typing import Any
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.app.llm.core.routing import llm_routing_table
 from backend.app.llm.crud.crud_model_group import model_group_dao
 from backend.app.llm.model.model_group import ModelGroup
 from backend.app.llm.schema.model_group import (
@@ -58,6 +59,7 @@ class ModelGroupService:
         if existing:
             raise errors.ForbiddenError(msg='模型组名称已存在')
         await model_group_dao.create(db, obj)
+        await llm_routing_table.invalidate()
 
     @staticmethod
     async def update(db: AsyncSession, pk: int, obj: UpdateModelGroupParam) -> int:
@@ -69,7 +71,9 @@ class ModelGroupService:
             existing = await model_group_dao.get_by_name(db, obj.name)
             if existing:
                 raise errors.ForbiddenError(msg='模型组名称已存在')
-        return await model_group_dao.update(db, pk, obj)
+        count = await model_group_dao.update(db, pk, obj)
+        await llm_routing_table.invalidate()
+        return count
 
     @staticmethod
     async def delete(db: AsyncSession, pk: int) -> int:
@@ -77,7 +81,9 @@ class ModelGroupService:
         group = await model_group_dao.get(db, pk)
         if not group:
             raise errors.NotFoundError(msg='模型组不存在')
-        return await model_group_dao.delete(db, pk)
+        count = await model_group_dao.delete(db, pk)
+        await llm_routing_table.invalidate()
+        return count
 
 
 model_group_service = ModelGroupService()
@@ -4,6 +4,7 @@ from typing import Any
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.app.llm.core.routing import llm_routing_table
 from backend.app.llm.crud.crud_model_config import model_config_dao
 from backend.app.llm.crud.crud_provider import provider_dao
 from backend.app.llm.model.model_config import ModelConfig
@@ -115,6 +116,7 @@ class ModelService:
             raise errors.ForbiddenError(msg='模型名称已存在')
 
         await model_config_dao.create(db, obj)
+        await llm_routing_table.invalidate()
 
     @staticmethod
     async def update(db: AsyncSession, pk: int, obj: UpdateModelConfigParam) -> int:
@@ -135,7 +137,9 @@ class ModelService:
             if existing:
                 raise errors.ForbiddenError(msg='模型名称已存在')
 
-        return await model_config_dao.update(db, pk, obj)
+        count = await model_config_dao.update(db, pk, obj)
+        await llm_routing_table.invalidate()
+        return count
 
     @staticmethod
     async def delete(db: AsyncSession, pk: int) -> int:
@@ -143,7 +147,9 @@ class ModelService:
         model = await model_config_dao.get(db, pk)
         if not model:
             raise errors.NotFoundError(msg='模型不存在')
-        return await model_config_dao.delete(db, pk)
+        count = await model_config_dao.delete(db, pk)
+        await llm_routing_table.invalidate()
+        return count
 
 
 model_service = ModelService()
@@ -5,6 +5,7 @@ from typing import Any
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.app.llm.core.encryption import key_encryption
+from backend.app.llm.core.routing import llm_routing_table
 from backend.app.llm.crud.crud_provider import provider_dao
 from backend.app.llm.model.provider import ModelProvider
 from backend.app.llm.schema.provider import (
@@ -66,6 +67,7 @@ class ProviderService:
             api_key_encrypted = key_encryption.encrypt(obj.api_key)
 
         await provider_dao.create(db, obj, api_key_encrypted)
+        await llm_routing_table.invalidate()
 
     @staticmethod
     async def update(db: AsyncSession, pk: int, obj: UpdateProviderParam) -> int:
@@ -85,7 +87,9 @@ class ProviderService:
         if obj.api_key:
             api_key_encrypted = key_encryption.encrypt(obj.api_key)
 
-        return await provider_dao.update(db, pk, obj, api_key_encrypted)
+        count = await provider_dao.update(db, pk, obj, api_key_encrypted)
+        await llm_routing_table.invalidate()
+        return count
 
     @staticmethod
     async def delete(db: AsyncSession, pk: int) -> int:
@@ -93,7 +97,9 @@ class ProviderService:
         provider = await provider_dao.get(db, pk)
         if not provider:
             raise errors.NotFoundError(msg='供应商不存在')
-        return await provider_dao.delete(db, pk)
+        count = await provider_dao.delete(db, pk)
+        await llm_routing_table.invalidate()
+        return count
 
 
 provider_service = ProviderService()
@@ -8,6 +8,7 @@ from typing import Any
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.app.llm.core.api_key_cache import api_key_cache
 from backend.app.llm.crud.crud_rate_limit import rate_limit_dao
 from backend.app.llm.model.rate_limit import RateLimitConfig
 from backend.app.llm.schema.rate_limit import (
@@ -68,7 +69,9 @@ class RateLimitService:
             existing = await rate_limit_dao.get_by_name(db, obj.name)
             if existing:
                 raise errors.ForbiddenError(msg='配置名称已存在')
-        return await rate_limit_dao.update(db, pk, obj)
+        count = await rate_limit_dao.update(db, pk, obj)
+        await api_key_cache.invalidate()
+        return count
 
     @staticmethod
     async def delete(db: AsyncSession, pk: int) -> int:
@@ -76,7 +79,9 @@ class RateLimitService:
         config = await rate_limit_dao.get(db, pk)
         if not config:
             raise errors.NotFoundError(msg='速率限制配置不存在')
-        return await rate_limit_dao.delete(db, pk)
+        count = await rate_limit_dao.delete(db, pk)
+        await api_key_cache.invalidate()
+        return count
 
 
 rate_limit_service = RateLimitService()
@@ -1,12 +1,17 @@
 """用量统计 Service"""
 
-from datetime import date
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
 from typing import Any
 
+from sqlalchemy import Row
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.app.llm.core.rate_limiter import rate_limiter
+from backend.app.llm.core.usage_rollup import usage_rollup
 from backend.app.llm.crud.crud_usage_log import usage_log_dao
+from backend.app.llm.crud.crud_usage_rollup import ROLLUP_METRICS, usage_daily_dao, usage_hourly_dao
+from backend.app.llm.enums import RateLimitAlgorithm
 from backend.app.llm.schema.usage_log import (
     DailyUsage,
     ModelUsage,
@@ -14,11 +19,105 @@ from backend.app.llm.schema.usage_log import (
     UsageSummary,
 )
 from backend.common.pagination import paging_data
+from backend.utils.timezone import timezone
 
 
 class UsageService:
     """用量统计服务"""
 
+    @staticmethod
+    async def _aggregate(
+        db: AsyncSession,
+        *,
+        user_id: int,
+        start_date: date | None = None,
+        end_date: date | None = None,
+        group_by: str | None = None,
+    ) -> dict[Any, dict[str, Any]]:
+        """
+        聚合用量：水位所在日期之前读取日汇总，水位所在日期内读取小时汇总，水位之后读取用量日志
+
+        :param db: 数据库会话
+        :param user_id: 用户 ID
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :param group_by: 分组方式，day 或 model_name，为空时不分组
+        :return: 分组键到汇总指标的映射
+        """
+        start = None if start_date is None else datetime.combine(start_date, time.min, tzinfo=timezone.tz_info)
+        end = (
+            None
+            if end_date is None
+            else datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=timezone.tz_info)
+        )
+        watermark = await usage_rollup.watermark()
+        if watermark is None:
+            segments = [(usage_log_dao, start, end)]
+        else:
+            day = usage_rollup.floor_day(watermark)
+            segments = [
+                (usage_daily_dao, start, day),
+                (usage_hourly_dao, day, watermark),
+                (usage_log_dao, watermark, end),
+            ]
+
+        result: dict[Any, dict[str, Any]] = {}
+        for dao, lo, hi in segments:
+            lo = max((t for t in (lo, start) if t is not None), default=None)
+            hi = min((t for t in (hi, end) if t is not None), default=None)
+            if lo is not None and hi is not None and lo >= hi:
+                continue
+            if group_by == 'day' and dao is usage_log_dao:
+                rows = await UsageService._aggregate_log_days(db, user_id=user_id, start=lo, end=hi)
+            elif group_by == 'day':
+                rows = [
+                    (str(timezone.from_datetime(row.bucket).date()), row)
+                    for row in await dao.aggregate(db, start=lo, end=hi, user_id=user_id, group_by=('bucket',))
+                ]
+            else:
+                fields = () if group_by is None else (group_by,)
+                rows = [
+                    (None if group_by is None else getattr(row, group_by), row)
+                    for row in await dao.aggregate(db, start=lo, end=hi, user_id=user_id, group_by=fields)
+                ]
+            for key, row in rows:
+                metrics = result.setdefault(key, dict.fromkeys(ROLLUP_METRICS, 0))
+                for name in ROLLUP_METRICS:
+                    metrics[name] += getattr(row, name) or 0
+        return result
+
+    @staticmethod
+    async def _aggregate_log_days(
+        db: AsyncSession,
+        *,
+        user_id: int,
+        start: datetime | None,
+        end: datetime | None,
+    ) -> list[tuple[str, Row]]:
+        """
+        按应用时区逐日聚合用量日志，日期口径与汇总表一致（数据库的日期函数按会话时区取日期）
+
+        :param db: 数据库会话
+        :param user_id: 用户 ID
+        :param start: 开始时间（包含）
+        :param end: 结束时间（不包含）
+        :return: 日期与聚合结果列表
+        """
+        if start is None:
+            start = await usage_log_dao.get_first_time(db)
+            if start is None:
+                return []
+        end = end or timezone.now()
+        rows = []
+        day = usage_rollup.floor_day(start)
+        while day < end:
+            next_day = day + timedelta(days=1)
+            row = (await usage_log_dao.aggregate(db, start=max(day, start), end=min(next_day, end), user_id=user_id))[0]
+            if row.requests:
+                rows.append((str(day.date()), row))
+            day = next_day
+        return rows
+
     @staticmethod
     async def get_summary(
         db: AsyncSession,
@@ -28,11 +127,19 @@ class UsageService:
         end_date: date | None = None,
     ) -> UsageSummary:
         """获取用量汇总"""
-        return await usage_log_dao.get_summary(
-            db,
-            user_id=user_id,
-            start_date=start_date,
-            end_date=end_date,
+        result = await UsageService._aggregate(db, user_id=user_id, start_date=start_date, end_date=end_date)
+        metrics = result.get(None) or dict.fromkeys(ROLLUP_METRICS, 0)
+        requests = int(metrics['requests'])
+        return UsageSummary(
+            total_requests=requests,
+            success_requests=int(metrics['success_requests']),
+            error_requests=int(metrics['error_requests']),
+            cancelled_requests=int(metrics['cancelled_requests']),
+            total_tokens=int(metrics['total_tokens']),
+            total_input_tokens=int(metrics['input_tokens']),
+            total_output_tokens=int(metrics['output_tokens']),
+            total_cost=Decimal(metrics['total_cost']),
+            avg_latency_ms=int(metrics['latency_ms']) // requests if requests else 0,
         )
 
     @staticmethod
@@ -43,7 +150,17 @@ class UsageService:
         days: int = 30,
     ) -> list[DailyUsage]:
         """获取每日用量"""
-        return await usage_log_dao.get_daily_usage(db, user_id=user_id, days=days)
+        start_date = timezone.now().date() - timedelta(days=days - 1)
+        result = await UsageService._aggregate(db, user_id=user_id, start_date=start_date, group_by='day')
+        return [
+            DailyUsage(
+                date=day,
+                requests=int(metrics['requests']),
+                tokens=int(metrics['total_tokens']),
+                cost=Decimal(metrics['total_cost']),
+            )
+            for day, metrics in sorted(result.items())
+        ]
 
     @staticmethod
     async def get_model_usage(
@@ -54,12 +171,18 @@ class UsageService:
         end_date: date | None = None,
     ) -> list[ModelUsage]:
         """获取模型用量"""
-        return await usage_log_dao.get_model_usage(
-            db,
-            user_id=user_id,
-            start_date=start_date,
-            end_date=end_date,
+        result = await UsageService._aggregate(
+            db, user_id=user_id, start_date=start_date, end_date=end_date, group_by='model_name'
         )
+        return [
+            ModelUsage(
+                model_name=model_name,
+                requests=int(metrics['requests']),
+                tokens=int(metrics['total_tokens']),
+                cost=Decimal(metrics['total_cost']),
+            )
+            for model_name, metrics in sorted(result.items(), key=lambda item: item[1]['total_tokens'], reverse=True)
+        ]
 
     @staticmethod
     async def get_usage_logs(
@@ -91,6 +214,7 @@ class UsageService:
         rpm_limit: int,
         daily_limit: int,
         monthly_limit: int,
+        algorithm: str = RateLimitAlgorithm.FIXED_WINDOW,
     ) -> QuotaInfo:
         """获取配额信息"""
         usage_info = await rate_limiter.get_usage_info(
@@ -98,6 +222,7 @@ class UsageService:
             rpm_limit=rpm_limit,
             daily_limit=daily_limit,
             monthly_limit=monthly_limit,
+            algorithm=algorithm,
         )
 
         return QuotaInfo(
@@ -1,4 +1,5 @@
 import os
+import threading
 import urllib.parse
 
 import celery
@@ -7,6 +8,7 @@ import celery_aio_pool
 from celery.signals import worker_process_init
 from opentelemetry.instrumentation.celery import CeleryInstrumentor
 
+from backend.app.llm.core.tokenizer import preload_encodings
 from backend.app.task.tasks.beat import LOCAL_BEAT_SCHEDULE
 from backend.common.enums import DataBaseType
 from backend.core.conf import settings
@@ -23,6 +25,12 @@ def init_celery_worker_tracing(*args, **kwargs) -> None:
         CeleryInstrumentor().instrument()
 
 
+@worker_process_init.connect(weak=False)
+def init_celery_worker_tokenizer(*args, **kwargs) -> None:
+    """后台预加载 tiktoken 编码"""
+    threading.Thread(target=preload_encodings, daemon=True).start()
+
+
 def find_task_packages() -> list[str]:
     packages = []
     task_dir = BASE_PATH / 'app' / 'task' / 'tasks'
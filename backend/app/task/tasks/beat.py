@@ -1,6 +1,7 @@
 from celery.schedules import schedule
 
 from backend.app.task.utils.tzcrontab import TzAwareCrontab
+from backend.core.conf import settings
 
 # 参考：https://docs.celeryq.dev/en/stable/userguide/periodic-tasks.html
 LOCAL_BEAT_SCHEDULE = {
@@ -26,4 +27,20 @@ LOCAL_BEAT_SCHEDULE = {
         'task': 'backend.app.task.tasks.db_log.tasks.delete_db_login_log',
         'schedule': TzAwareCrontab('0', '0', day_of_month='15'),
     },
+    '写入 API Key 最后使用时间': {
+        'task': 'backend.app.task.tasks.llm.tasks.flush_api_key_last_used',
+        'schedule': schedule(settings.LLM_API_KEY_LAST_USED_FLUSH_INTERVAL),
+    },
+    '重新投递中断的 LLM 批处理': {
+        'task': 'backend.app.task.tasks.llm.tasks.recover_llm_batches',
+        'schedule': schedule(settings.LLM_BATCH_RECOVER_INTERVAL),
+    },
+    '汇总 LLM 用量': {
+        'task': 'backend.app.task.tasks.llm.tasks.rollup_llm_usage',
+        'schedule': schedule(settings.LLM_USAGE_ROLLUP_INTERVAL),
+    },
+    '维护 LLM 用量日志分区': {
+        'task': 'backend.app.task.tasks.llm.tasks.manage_llm_usage_partitions',
+        'schedule': TzAwareCrontab('30', '3'),
+    },
 }
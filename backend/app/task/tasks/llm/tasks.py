@@ -0,0 +1,44 @@
+from celery import shared_task
+
+from backend.app.llm.core.api_key_cache import api_key_cache
+from backend.app.llm.core.batch_runner import batch_runner
+from backend.app.llm.core.usage_partition import usage_log_partitioner
+from backend.app.llm.core.usage_rollup import usage_rollup
+from backend.core.conf import settings
+
+
+@shared_task
+async def flush_api_key_last_used() -> str:
+    """批量写入 API Key 最后使用时间"""
+    count = await api_key_cache.flush_last_used()
+    return f'Flushed {count}'
+
+
+@shared_task(soft_time_limit=settings.LLM_BATCH_SOFT_TIME_LIMIT, time_limit=settings.LLM_BATCH_TIME_LIMIT)
+async def process_llm_batch(batch_id: str) -> str:
+    """执行 LLM 批处理"""
+    return await batch_runner.run(batch_id)
+
+
+@shared_task
+async def recover_llm_batches() -> str:
+    """重新投递中断的 LLM 批处理"""
+    batch_ids = await batch_runner.recover_stale()
+    for batch_id in batch_ids:
+        process_llm_batch.delay(batch_id)
+    return f'Recovered {len(batch_ids)}'
+
+
+@shared_task
+async def rollup_llm_usage() -> str:
+    """汇总 LLM 用量"""
+    hours = await usage_rollup.run()
+    return f'Rolled up {hours} hours'
+
+
+@shared_task
+async def manage_llm_usage_partitions() -> str:
+    """维护 LLM 用量日志分区"""
+    created = await usage_log_partitioner.ensure()
+    archived = await usage_log_partitioner.archive()
+    return f'Created {len(created)}, archived {len(archived)}'
@@ -22,6 +22,7 @@ from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
 from watchfiles import Change, PythonFilter
 
 from backend import __version__
+from backend.app.llm.core.usage_partition import usage_log_partitioner
 from backend.common.enums import DataBaseType, PrimaryKeyType
 from backend.common.exception.errors import BaseExceptionError
 from backend.common.model import MappedBase
@@ -773,6 +774,21 @@ class Alembic:
     subcmd: cappa.Subcommands[Revision | Upgrade | Downgrade | Current | History | Heads]
 
 
+@cappa.command(
+    name='usage-partition',
+    help='将 LLM 用量日志表转换为按月分区表（一次性迁移，建议在停机窗口执行）',
+    default_long=True,
+)
+@dataclass
+class UsagePartition:
+    async def __call__(self) -> None:
+        created = await usage_log_partitioner.migrate()
+        if created:
+            console.print(f'用量日志表已转换为分区表，共 {len(created)} 个分区', style='bold green')
+        else:
+            console.print('用量日志表已是分区表，无需转换', style='bold green')
+
+
 @cappa.command(help='一个高效的 fba 命令行界面', default_long=True)
 @dataclass
 class FbaCli:
@@ -780,7 +796,7 @@ class FbaCli:
         str,
         cappa.Arg(value_name='PATH', default='', show_default=False, help='在事务中执行 SQL 脚本'),
     ]
-    subcmd: cappa.Subcommands[Init | Run | Add | Alembic | Celery | CodeGenerator | None] = None
+    subcmd: cappa.Subcommands[Init | Run | Add | Alembic | Celery | CodeGenerator | UsagePartition | None] = None
 
     async def __call__(self) -> None:
         if self.sql:
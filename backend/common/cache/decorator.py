@@ -205,7 +205,7 @@ def cache_invalidate(  # noqa: C901
                 # 广播失效消息（通知其他节点清除本地缓存）
                 if settings.CACHE_LOCAL_ENABLED:
                     if invalidate_key == name:
-                        await cache_pubsub_manager.publish_invalidation(invalidate_key)
+                        await cache_pubsub_manager.publish_invalidation(invalidate_key, is_delete_prefix=False)
                     else:
                         await cache_pubsub_manager.publish_invalidation(invalidate_key, is_delete_prefix=True)
 
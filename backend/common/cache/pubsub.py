@@ -1,5 +1,9 @@
 import asyncio
 import json
+import os
+import uuid
+
+from collections.abc import Awaitable, Callable
 
 from backend.common.cache.local import local_cache_manager
 from backend.common.log import log
@@ -11,24 +15,73 @@ class CachePubSubManager:
     """缓存 Pub/Sub 管理器"""
 
     _pubsub_task: asyncio.Task | None = None
+    _handlers: dict[str, Callable[[], Awaitable[None]]] = {}
+    # 运行中的失效回调，保留引用避免任务在执行期间被回收
+    _handler_tasks: set[asyncio.Task] = set()
+    # 进程标识，用于忽略本进程发布的通知（发布方已在本地完成失效），fork 后重新生成
+    _origin: tuple[int, str] | None = None
+
+    @classmethod
+    def _get_origin(cls) -> str:
+        pid = os.getpid()
+        if cls._origin is None or cls._origin[0] != pid:
+            cls._origin = (pid, f'{pid}:{uuid.uuid4().hex}')
+        return cls._origin[1]
+
+    @classmethod
+    def register_handler(cls, key: str, handler: Callable[[], Awaitable[None]]) -> None:
+        """
+        注册缓存失效回调，收到匹配键的失效通知时执行
+
+        :param key: 缓存键（前缀匹配）
+        :param handler: 异步回调函数
+        :return:
+        """
+        cls._handlers[key] = handler
+
+    @classmethod
+    def _dispatch_handlers(cls, key: str) -> None:
+        """
+        调度匹配的失效回调
 
-    @staticmethod
-    async def publish_invalidation(key: str, *, is_delete_prefix: bool) -> None:
+        :param key: 缓存键
+        :return:
+        """
+        for prefix, handler in cls._handlers.items():
+            if key.startswith(prefix):
+                task = asyncio.create_task(handler())
+                cls._handler_tasks.add(task)
+                task.add_done_callback(cls._on_handler_done)
+
+    @classmethod
+    def _on_handler_done(cls, task: asyncio.Task) -> None:
+        """
+        失效回调结束
+
+        :param task: 回调任务
+        :return:
+        """
+        cls._handler_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error(f'[CachePubSub] 失效回调执行失败: {task.exception()}')
+
+    @classmethod
+    async def publish_invalidation(cls, key: str, *, is_delete_prefix: bool) -> None:
         """
-        发布缓存失效通知
+        发布缓存失效通知，发布方需自行完成本地失效，本进程不会处理自己发布的通知
 
         :param key: 缓存键
         :param is_delete_prefix: 是否删除符合前缀的所有缓存
         :return:
         """
         try:
-            message = json.dumps({'key': key, 'is_delete_prefix': is_delete_prefix})
+            message = json.dumps({'key': key, 'is_delete_prefix': is_delete_prefix, 'origin': cls._get_origin()})
             await redis_client.publish(settings.CACHE_PUBSUB_CHANNEL, message)
         except Exception as e:
             log.warning(f'[CachePubSub] 发布通知失败: {e}')
 
-    @staticmethod
-    async def subscribe_and_listen() -> None:  # noqa: C901
+    @classmethod
+    async def subscribe_and_listen(cls) -> None:  # noqa: C901
         """订阅并监听缓存失效通知"""
         reconnect_attempts = 0
 
@@ -49,11 +102,14 @@ class CachePubSubManager:
                     if message['type'] == 'message':
                         try:
                             data = json.loads(message['data'])
+                            if data.get('origin') == cls._get_origin():
+                                continue
                             key = data['key']
                             if not data['is_delete_prefix']:
                                 local_cache_manager.delete(key)
                             else:
                                 local_cache_manager.delete_prefix(key)
+                            cls._dispatch_handlers(key)
                         except json.JSONDecodeError as e:
                             log.warning(f'[CachePubSub] 消息格式错误 {e}')
                         except Exception as e:
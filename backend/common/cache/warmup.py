@@ -7,6 +7,8 @@ async def cache_warmup() -> None:
     """缓存预热"""
     await _warmup_config()
     await _warmup_dict()
+    await _warmup_llm_routing()
+    await _warmup_llm_transport()
 
 
 async def _warmup_config() -> None:
@@ -34,3 +36,37 @@ async def _warmup_dict() -> None:
         pass
     except Exception as e:
         log.warning(f'[Warmup] 数据字典缓存预热失败: {e}')
+
+
+async def _warmup_llm_routing() -> None:
+    """预热 LLM 路由表"""
+    try:
+        from backend.app.llm.core.routing import llm_routing_table
+
+        llm_routing_table.register()
+        await llm_routing_table.refresh()
+    except ImportError:
+        pass
+    except Exception as e:
+        log.warning(f'[Warmup] LLM 路由表预热失败: {e}')
+
+
+async def _warmup_llm_transport() -> None:
+    """预热 LLM 上游连接"""
+    try:
+        from backend.app.llm.core.gateway import llm_gateway
+        from backend.app.llm.core.routing import llm_routing_table
+        from backend.app.llm.core.transport import native_transport
+
+        # 先注册回调，预热失败时仍可随路由表重建同步客户端
+        llm_routing_table.add_listener(native_transport.on_routes_changed)
+        routes = llm_routing_table.routes()
+        await native_transport.sync(routes)
+
+        # 仍有供应商经由 LiteLLM 调用时提前加载，避免首个请求承担导入开销
+        if any(not native_transport.supports(route) for route in routes):
+            _ = llm_gateway.litellm
+    except ImportError:
+        pass
+    except Exception as e:
+        log.warning(f'[Warmup] LLM 上游连接预热失败: {e}')
@@ -3,26 +3,23 @@ from typing import Any, Protocol
 
 from starlette_context.ctx import _Context, context
 
+from backend.common.prometheus.route_metrics import RouteMetricChildren
+
 
 class TypedContextProtocol(Protocol):
     perf_time: float
     start_time: datetime
 
     ip: str
-    country: str | None
-    region: str | None
-    city: str | None
-
     user_agent: str | None
-    os: str | None
-    browser: str | None
-    device: str | None
 
     permission: str | None
     language: str
 
     user_id: int | None
 
+    route_metrics: RouteMetricChildren | None
+
 
 class TypedContext(TypedContextProtocol, _Context):
     def __getattr__(self, name: str) -> Any:
@@ -35,3 +35,77 @@ PROMETHEUS_RESPONSE_COUNTER = Counter(
     documentation='按方法、路径和状态码统计响应总数',
     labelnames=['app_name', 'method', 'path', 'status_code'],
 )
+
+
+PROMETHEUS_LLM_USAGE_LOG_QUEUE_GAUGE = Gauge(
+    name='fba_llm_usage_log_queue_size',
+    documentation='LLM 用量日志待写入队列长度',
+    labelnames=['app_name'],
+)
+
+PROMETHEUS_LLM_USAGE_LOG_OVERFLOW_COUNTER = Counter(
+    name='fba_llm_usage_log_overflow_total',
+    documentation='LLM 用量日志队列已满时退化为直接写入的次数',
+    labelnames=['app_name'],
+)
+
+PROMETHEUS_LLM_USAGE_LOG_DROPPED_COUNTER = Counter(
+    name='fba_llm_usage_log_dropped_total',
+    documentation='LLM 用量日志写入失败丢弃总数',
+    labelnames=['app_name'],
+)
+
+PROMETHEUS_LLM_RESPONSE_CACHE_COUNTER = Counter(
+    name='fba_llm_response_cache_total',
+    documentation='按模型和结果（hit/miss）统计 LLM 响应缓存查询总数',
+    labelnames=['app_name', 'model', 'result'],
+)
+
+PROMETHEUS_LLM_RESPONSE_CACHE_BYTES_SAVED_COUNTER = Counter(
+    name='fba_llm_response_cache_bytes_saved_total',
+    documentation='按模型统计 LLM 响应缓存命中节省的响应字节数',
+    labelnames=['app_name', 'model'],
+)
+
+PROMETHEUS_LLM_EMBEDDING_BATCH_SIZE_HISTOGRAM = Histogram(
+    name='fba_llm_embedding_batch_size',
+    documentation='LLM Embedding 微批处理每次上游调用的输入数',
+    labelnames=['app_name'],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048),
+)
+
+PROMETHEUS_LLM_STREAM_ABANDONED_COUNTER = Counter(
+    name='fba_llm_stream_abandoned_total',
+    documentation='按模型统计客户端中途断开的 LLM 流式请求总数',
+    labelnames=['app_name', 'model'],
+)
+
+PROMETHEUS_LLM_STREAM_ABANDONED_TOKENS_COUNTER = Counter(
+    name='fba_llm_stream_abandoned_output_tokens_total',
+    documentation='按模型统计客户端断开前已生成的 LLM 输出 tokens',
+    labelnames=['app_name', 'model'],
+)
+
+PROMETHEUS_SPOOL_BACKLOG_GAUGE = Gauge(
+    name='fba_spool_backlog',
+    documentation='按缓冲名称统计待消费的积压数量',
+    labelnames=['app_name', 'spool'],
+)
+
+PROMETHEUS_SPOOL_LAG_GAUGE = Gauge(
+    name='fba_spool_lag_seconds',
+    documentation='按缓冲名称统计最近一批数据从产生到写入完成的延迟（秒）',
+    labelnames=['app_name', 'spool'],
+)
+
+PROMETHEUS_SPOOL_BLOCKED_COUNTER = Counter(
+    name='fba_spool_blocked_total',
+    documentation='按缓冲名称统计积压达到上限时写入阻塞的次数',
+    labelnames=['app_name', 'spool'],
+)
+
+PROMETHEUS_SPOOL_DROPPED_COUNTER = Counter(
+    name='fba_spool_dropped_total',
+    documentation='按缓冲名称和原因统计丢弃的数据总数',
+    labelnames=['app_name', 'spool', 'reason'],
+)
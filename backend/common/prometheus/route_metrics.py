@@ -0,0 +1,141 @@
+import cachebox
+
+from fastapi import FastAPI
+from prometheus_client import Counter, Gauge, Histogram
+from starlette.routing import Match, Route
+from starlette.types import Scope
+
+from backend.common.prometheus.instruments import (
+    PROMETHEUS_APP_NAME,
+    PROMETHEUS_EXCEPTION_COUNTER,
+    PROMETHEUS_REQUEST_COST_TIME_HISTOGRAM,
+    PROMETHEUS_REQUEST_COUNTER,
+    PROMETHEUS_REQUEST_IN_PROGRESS_GAUGE,
+    PROMETHEUS_RESPONSE_COUNTER,
+)
+from backend.core.conf import settings
+
+# 未匹配任何路由的请求统一使用的 path 标签
+UNMATCHED_PATH = '__unmatched__'
+
+# 非标准请求方法统一使用的 method 标签
+OTHER_METHOD = 'OTHER'
+
+_METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'})
+
+
+class RouteMetricChildren:
+    """单个路由模板及请求方法的指标子项"""
+
+    __slots__ = ('_responses', 'cost_time', 'in_progress', 'method', 'path', 'requests')
+
+    def __init__(self, method: str, path: str) -> None:
+        self.method = method
+        self.path = path
+        self.in_progress: Gauge = PROMETHEUS_REQUEST_IN_PROGRESS_GAUGE.labels(
+            app_name=PROMETHEUS_APP_NAME, method=method, path=path
+        )
+        self.requests: Counter = PROMETHEUS_REQUEST_COUNTER.labels(
+            app_name=PROMETHEUS_APP_NAME, method=method, path=path
+        )
+        self.cost_time: Histogram = PROMETHEUS_REQUEST_COST_TIME_HISTOGRAM.labels(
+            app_name=PROMETHEUS_APP_NAME, method=method, path=path
+        )
+        self._responses: dict[str, Counter] = {}
+
+    def response(self, status_code: int | str) -> Counter:
+        """
+        获取响应计数子项
+
+        :param status_code: 响应状态码
+        :return:
+        """
+        key = str(status_code)
+        counter = self._responses.get(key)
+        if counter is None:
+            counter = PROMETHEUS_RESPONSE_COUNTER.labels(
+                app_name=PROMETHEUS_APP_NAME, method=self.method, path=self.path, status_code=key
+            )
+            self._responses[key] = counter
+        return counter
+
+    def exception(self, exception_type: str) -> Counter:
+        """
+        获取异常计数子项
+
+        :param exception_type: 异常类型
+        :return:
+        """
+        return PROMETHEUS_EXCEPTION_COUNTER.labels(
+            app_name=PROMETHEUS_APP_NAME, method=self.method, path=self.path, exception_type=exception_type
+        )
+
+
+class RouteMetrics:
+    """
+    路由请求指标
+
+    以路由模板（如 /api/v1/sys/users/{pk}）代替原始请求路径作为 path 标签，启动时为每个路由及方法预绑定指标子项，
+    请求时按方法和路径缓存匹配结果；未匹配任何路由的路径及非标准方法各自归入同一标签，避免时间序列随请求路径无限增长
+    """
+
+    def __init__(self) -> None:
+        self._routes: list[Route] = []
+        self._children: dict[tuple[str, str], RouteMetricChildren] = {}
+        self._resolved: cachebox.LRUCache = cachebox.LRUCache(maxsize=settings.PROMETHEUS_ROUTE_CACHE_SIZE)
+
+    def _get(self, method: str, path: str) -> RouteMetricChildren:
+        key = (method, path)
+        children = self._children.get(key)
+        if children is None:
+            children = RouteMetricChildren(method, path)
+            self._children[key] = children
+        return children
+
+    def bind(self, app: FastAPI) -> None:
+        """
+        收集接口路由并预绑定指标子项，需在路由注册完成后调用
+
+        :param app: FastAPI 应用实例
+        :return:
+        """
+        self._routes = [
+            route
+            for route in app.routes
+            if isinstance(route, Route) and route.path.startswith(settings.FASTAPI_API_V1_PATH)
+        ]
+        self._resolved.clear()
+        for route in self._routes:
+            for method in route.methods or ():
+                self._get(method, route.path)
+
+    def resolve(self, scope: Scope) -> RouteMetricChildren:
+        """
+        解析请求对应的指标子项
+
+        :param scope: ASGI 请求作用域
+        :return:
+        """
+        method = scope['method'] if scope['method'] in _METHODS else OTHER_METHOD
+        key = (method, scope['path'])
+        children = self._resolved.get(key)
+        if children is not None:
+            return children
+
+        # 与路由分发一致：优先完全匹配，否则取首个路径匹配但方法不匹配的路由
+        path = UNMATCHED_PATH
+        for route in self._routes:
+            match, _ = route.matches(scope)
+            if match is Match.FULL:
+                path = route.path
+                break
+            if match is Match.PARTIAL and path == UNMATCHED_PATH:
+                path = route.path
+
+        children = self._get(method, path)
+        self._resolved[key] = children
+        return children
+
+
+# 创建全局路由请求指标实例
+route_metrics = RouteMetrics()
@@ -0,0 +1,521 @@
+"""持久化缓冲"""
+
+import asyncio
+import contextlib
+import os
+import socket
+import time
+import zlib
+
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import BinaryIO, Literal
+
+import psutil
+
+from redis.exceptions import ResponseError
+
+from backend.common.log import log
+from backend.common.prometheus.instruments import (
+    PROMETHEUS_APP_NAME,
+    PROMETHEUS_SPOOL_BACKLOG_GAUGE,
+    PROMETHEUS_SPOOL_BLOCKED_COUNTER,
+    PROMETHEUS_SPOOL_DROPPED_COUNTER,
+)
+from backend.database.redis import redis_client
+
+# 缓冲条目：(条目 ID, 数据)
+SpoolEntry = tuple[str, str]
+
+
+class Spool(ABC):
+    """
+    持久化缓冲
+
+    写入端只追加数据，消费者批量读取并在处理完成后确认，未确认的数据在进程重启后重新投递；
+    积压达到上限时按策略直接丢弃（drop）或阻塞等待（block），阻塞超时后丢弃，写入方可通过 wait_available 提前等待
+    """
+
+    backend: str
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        maxsize: int,
+        policy: Literal['block', 'drop'],
+        block_timeout: float,
+    ) -> None:
+        """
+        初始化缓冲
+
+        :param name: 缓冲名称
+        :param maxsize: 积压上限
+        :param policy: 积压达到上限时的策略
+        :param block_timeout: 阻塞等待超时时间（秒）
+        :return:
+        """
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self._backlog = 0
+
+    @property
+    def backlog(self) -> int:
+        """积压数量（近似值，消费者每轮处理后刷新）"""
+        return self._backlog
+
+    async def wait_available(self) -> bool:
+        """
+        积压达到上限时按策略等待（block 策略），返回是否有空余
+
+        应在处理请求前调用，使阻塞发生在请求开始时而不是响应结束后
+
+        :return:
+        """
+        return self._backlog < self.maxsize or await self._wait()
+
+    def record_drop(self, reason: str, count: int = 1) -> None:
+        """
+        记录丢弃的数据
+
+        :param reason: 丢弃原因
+        :param count: 丢弃数量
+        :return:
+        """
+        PROMETHEUS_SPOOL_DROPPED_COUNTER.labels(app_name=PROMETHEUS_APP_NAME, spool=self.name, reason=reason).inc(count)
+
+    async def _wait(self) -> bool:
+        """等待积压低于上限，返回是否等待成功"""
+        if self.policy == 'drop':
+            return False
+        PROMETHEUS_SPOOL_BLOCKED_COUNTER.labels(app_name=PROMETHEUS_APP_NAME, spool=self.name).inc()
+        deadline = time.monotonic() + self.block_timeout
+        while self._backlog >= self.maxsize:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    async def put(self, data: str, *, wait: bool = True) -> bool:
+        """
+        写入数据
+
+        :param data: 数据，不能包含换行符
+        :param wait: 积压达到上限时是否按策略等待，为 False 时直接丢弃
+        :return: 是否写入成功
+        """
+        if self._backlog >= self.maxsize and not (wait and await self._wait()):
+            log.warning(f'[{self.name}] 缓冲积压已达上限 {self.maxsize}，数据已丢弃')
+            self.record_drop('full')
+            return False
+        try:
+            await self._append(data)
+        except Exception as e:
+            log.error(f'[{self.name}] 缓冲写入失败，数据已丢弃: {e}')
+            self.record_drop('error')
+            return False
+        self._backlog += 1
+        return True
+
+    async def ack(self, ids: list[str]) -> None:
+        """
+        确认已处理的条目
+
+        :param ids: 条目 ID 列表，需按读取顺序传入
+        :return:
+        """
+        if ids:
+            await self._ack(ids)
+            self._backlog = max(self._backlog - len(ids), 0)
+
+    async def refresh(self) -> int:
+        """刷新积压数量"""
+        self._backlog = await self._size()
+        PROMETHEUS_SPOOL_BACKLOG_GAUGE.labels(app_name=PROMETHEUS_APP_NAME, spool=self.name).set(self._backlog)
+        return self._backlog
+
+    @abstractmethod
+    async def open(self) -> None:
+        """打开缓冲并恢复未处理的数据"""
+
+    @abstractmethod
+    async def close(self) -> None:
+        """关闭缓冲"""
+
+    @abstractmethod
+    async def read(self, count: int, timeout: float) -> list[SpoolEntry]:
+        """
+        读取未确认的条目，无数据时最多等待 timeout 秒
+
+        :param count: 最大读取数量
+        :param timeout: 等待超时时间（秒）
+        :return:
+        """
+
+    @abstractmethod
+    async def _append(self, data: str) -> None:
+        """追加数据"""
+
+    @abstractmethod
+    async def _ack(self, ids: list[str]) -> None:
+        """确认条目"""
+
+    @abstractmethod
+    async def _size(self) -> int:
+        """获取积压数量"""
+
+
+class RedisStreamSpool(Spool):
+    """
+    Redis Stream 缓冲
+
+    通过消费者组读取，处理完成后确认并删除条目；消费者（包括已退出的进程）超时未确认的条目由其他消费者接管，
+    适用于多进程及多实例部署
+    """
+
+    backend = 'redis'
+
+    def __init__(self, name: str, *, key: str, group: str, claim_idle: int, **kwargs) -> None:
+        """
+        初始化 Redis Stream 缓冲
+
+        :param name: 缓冲名称
+        :param key: Stream 键
+        :param group: 消费者组
+        :param claim_idle: 接管未确认条目的空闲时间（毫秒）
+        :return:
+        """
+        super().__init__(name, **kwargs)
+        self.key = key
+        self.group = group
+        self.claim_idle = claim_idle
+        self.consumer = f'{socket.gethostname()}:{os.getpid()}'
+        self._claim_id = '0-0'
+
+    async def open(self) -> None:
+        self.consumer = f'{socket.gethostname()}:{os.getpid()}'
+        try:
+            await redis_client.xgroup_create(self.key, self.group, id='0', mkstream=True)
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        await self.refresh()
+
+    async def close(self) -> None:
+        pass
+
+    async def read(self, count: int, timeout: float) -> list[SpoolEntry]:
+        # 优先接管超时未确认的条目
+        response = await redis_client.xautoclaim(
+            self.key, self.group, self.consumer, self.claim_idle, start_id=self._claim_id, count=count
+        )
+        self._claim_id, entries = response[0], response[1]
+        if not entries:
+            response = await redis_client.xreadgroup(
+                self.group, self.consumer, {self.key: '>'}, count=count, block=int(timeout * 1000)
+            )
+            entries = response[0][1] if response else []
+
+        # 已被删除的条目仅保留 ID
+        deleted = [entry_id for entry_id, fields in entries if not fields]
+        if deleted:
+            await self.ack(deleted)
+        return [(entry_id, fields['data']) for entry_id, fields in entries if fields]
+
+    async def _append(self, data: str) -> None:
+        await redis_client.xadd(self.key, {'data': data})
+
+    async def _ack(self, ids: list[str]) -> None:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.xack(self.key, self.group, *ids)
+            pipe.xdel(self.key, *ids)
+            await pipe.execute()
+
+    async def _size(self) -> int:
+        return await redis_client.xlen(self.key)
+
+
+class FileSpool(Spool):
+    """
+    本地文件缓冲
+
+    数据逐行追加到当前分段文件（{时间戳}-{进程标识}.open），分段写满或消费者读取时封存为 .log 文件；
+    消费者重命名认领封存的分段，确认进度记录在 .offset 文件中，分段处理完成后删除。
+    并发的追加合并为一次写入并在线程池中执行，不阻塞事件循环，写入操作系统缓冲后才返回，进程崩溃不丢失数据；
+    进程标识由主机、进程 ID 及进程启动时间组成，认领分段的进程退出（包括 PID 被复用、重启及容器重建）后，
+    分段在其他进程启动时被恢复。同一目录可由同一主机的多个进程共享，积压数量按目录中所有分段的未确认行数统计
+    """
+
+    backend = 'file'
+
+    def __init__(self, name: str, *, directory: Path, segment_size: int, **kwargs) -> None:
+        """
+        初始化本地文件缓冲
+
+        :param name: 缓冲名称
+        :param directory: 分段文件目录
+        :param segment_size: 分段文件大小（字节）
+        :return:
+        """
+        super().__init__(name, **kwargs)
+        self.directory = directory
+        self.segment_size = segment_size
+        self._host = f'{zlib.crc32(socket.gethostname().encode()):08x}'
+        self._owner = self._create_owner()
+        self._active: BinaryIO | None = None
+        self._active_stem = ''
+        self._active_size = 0
+        self._reading: Path | None = None
+        self._offset = 0
+        self._rotated = asyncio.Event()
+        # 待写入的行及等待本批写入完成的 Future
+        self._pending: list[bytes] = []
+        self._batch: asyncio.Future | None = None
+        self._writer: asyncio.Task | None = None
+        # 串行化分段文件的写入与封存
+        self._lock = asyncio.Lock()
+        # 分段文件名 -> (起始偏移, 结束偏移, 行数)，刷新积压时只读取变化的部分
+        self._line_counts: dict[str, tuple[int, int, int]] = {}
+
+    def _create_owner(self) -> str:
+        """生成进程标识：{主机}_{进程 ID}_{进程启动时间}"""
+        pid = os.getpid()
+        return f'{self._host}_{pid}_{int(psutil.Process(pid).create_time() * 100)}'
+
+    def _stale(self, owner: str) -> bool:
+        """
+        分段所属进程是否已退出
+
+        主机不同（重启后主机名变化或容器重建）、本进程 ID 遗留的分段或同一 PID 已属于其他进程时均视为已退出
+
+        :param owner: 进程标识
+        :return:
+        """
+        host, _, rest = owner.partition('_')
+        pid, _, started = rest.partition('_')
+        if host != self._host or not pid.isdigit() or not started.isdigit() or int(pid) == os.getpid():
+            return True
+        try:
+            return abs(psutil.Process(int(pid)).create_time() * 100 - int(started)) > 1
+        except psutil.Error:
+            return True
+
+    def _offset_path(self, stem: str) -> Path:
+        return self.directory / f'{stem}.offset'
+
+    def _read_offset(self, stem: str) -> int:
+        path = self._offset_path(stem)
+        return int(path.read_text() or 0) if path.exists() else 0
+
+    def _write_offset(self, stem: str, offset: int) -> None:
+        path = self._offset_path(stem)
+        tmp_path = path.with_suffix('.offset.tmp')
+        tmp_path.write_text(str(offset))
+        tmp_path.replace(path)
+
+    def _seal(self) -> None:
+        """封存当前分段"""
+        if self._active is None:
+            return
+        self._active.close()
+        self._active = None
+        (self.directory / f'{self._active_stem}.open').rename(self.directory / f'{self._active_stem}.log')
+        self._active_size = 0
+
+    def _claim(self) -> Path | None:
+        """认领最早封存的分段"""
+        for path in sorted(self.directory.glob('*.log')):
+            claimed = path.with_name(f'{path.stem}.{self._owner}.work')
+            try:
+                path.rename(claimed)
+            except FileNotFoundError:
+                # 已被其他进程认领
+                continue
+            self._offset = self._read_offset(path.stem)
+            return claimed
+        return None
+
+    async def open(self) -> None:
+        self._owner = self._create_owner()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for path in self.directory.iterdir():
+            stem, _, suffix = path.name.partition('.')
+            # 恢复已退出进程写入中及认领中的分段
+            if (suffix == 'open' and self._stale(stem.partition('-')[2])) or (
+                suffix.endswith('.work') and self._stale(suffix.split('.')[0])
+            ):
+                path.rename(path.with_name(f'{stem}.log'))
+        await self.refresh()
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            await asyncio.shield(self._writer)
+        async with self._lock:
+            self._seal()
+
+    async def read(self, count: int, timeout: float) -> list[SpoolEntry]:
+        if self._reading is None:
+            self._reading = self._claim()
+        if self._reading is None:
+            # 等待当前分段写满，超时后封存已写入的部分
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._rotated.wait(), timeout=timeout)
+            self._rotated.clear()
+            async with self._lock:
+                self._seal()
+            self._reading = self._claim()
+            if self._reading is None:
+                return []
+
+        entries = []
+        offset = self._offset
+        with self._reading.open('rb') as f:
+            f.seek(offset)
+            for line in f:
+                # 进程崩溃时可能残留不完整的行
+                if not line.endswith(b'\n'):
+                    break
+                offset += len(line)
+                entries.append((str(offset), line[:-1].decode(errors='replace')))
+                if len(entries) >= count:
+                    break
+        if not entries:
+            self._finish()
+        return entries
+
+    def _finish(self) -> None:
+        """删除处理完成的分段"""
+        if self._reading is None:
+            return
+        stem = self._reading.name.partition('.')[0]
+        self._reading.unlink(missing_ok=True)
+        self._offset_path(stem).unlink(missing_ok=True)
+        self._reading = None
+        self._offset = 0
+
+    def _write(self, lines: list[bytes]) -> bool:
+        """
+        写入当前分段，在线程池中执行
+
+        :param lines: 待写入的行
+        :return: 分段是否已写满并封存
+        """
+        if self._active is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._active_stem = f'{time.time_ns()}-{self._owner}'
+            self._active = (self.directory / f'{self._active_stem}.open').open('ab')
+        self._active.writelines(lines)
+        self._active.flush()
+        self._active_size += sum(len(line) for line in lines)
+        if self._active_size >= self.segment_size:
+            self._seal()
+            return True
+        return False
+
+    async def _write_batch(self, lines: list[bytes], batch: asyncio.Future) -> None:
+        """
+        写入一批数据并通知等待方
+
+        :param lines: 待写入的行
+        :param batch: 本批写入完成的 Future
+        :return:
+        """
+        try:
+            async with self._lock:
+                rotated = await asyncio.to_thread(self._write, lines)
+        except Exception as e:
+            batch.set_exception(e)
+            # 等待方可能已取消
+            batch.exception()
+            return
+        batch.set_result(None)
+        if rotated:
+            self._rotated.set()
+
+    async def _flush_pending(self) -> None:
+        """写入等待中的数据，写入期间新追加的数据合并到下一批"""
+        while self._pending:
+            lines, self._pending = self._pending, []
+            batch, self._batch = self._batch, None
+            await self._write_batch(lines, batch)
+
+    async def _append(self, data: str) -> None:
+        self._pending.append(data.encode() + b'\n')
+        if self._batch is None:
+            self._batch = asyncio.get_running_loop().create_future()
+        batch = self._batch
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._flush_pending())
+        await asyncio.shield(batch)
+
+    async def _ack(self, ids: list[str]) -> None:
+        if self._reading is None:
+            return
+        self._offset = int(ids[-1])
+        if self._offset >= self._reading.stat().st_size:
+            self._finish()
+        else:
+            self._write_offset(self._reading.name.partition('.')[0], self._offset)
+
+    @staticmethod
+    def _count_lines(f: BinaryIO, start: int, end: int) -> int:
+        """
+        统计文件指定范围内的行数
+
+        :param f: 文件
+        :param start: 起始偏移
+        :param end: 结束偏移
+        :return:
+        """
+        f.seek(start)
+        count = 0
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(remaining, 1 << 20))
+            if not chunk:
+                break
+            count += chunk.count(b'\n')
+            remaining -= len(chunk)
+        return count
+
+    def _pending_lines(self, path: Path, start: int) -> int:
+        """
+        统计分段中起始偏移之后的行数，基于上次结果增量统计
+
+        :param path: 分段文件
+        :param start: 起始偏移（已确认的位置）
+        :return:
+        """
+        with path.open('rb') as f:
+            end = os.fstat(f.fileno()).st_size
+            cached = self._line_counts.get(path.name)
+            if cached is None or start < cached[0] or end < cached[1]:
+                count = self._count_lines(f, start, end)
+            else:
+                old_start, old_end, count = cached
+                count += self._count_lines(f, old_end, end) - self._count_lines(f, old_start, start)
+        self._line_counts[path.name] = (start, end, count)
+        return count
+
+    def _scan(self) -> int:
+        """统计目录中所有进程的未确认行数"""
+        backlog = 0
+        names = set()
+        for path in self.directory.iterdir():
+            stem, _, suffix = path.name.partition('.')
+            if suffix not in {'open', 'log'} and not suffix.endswith('.work'):
+                continue
+            try:
+                backlog += self._pending_lines(path, 0 if suffix == 'open' else self._read_offset(stem))
+            except (FileNotFoundError, ValueError):
+                # 分段在统计期间被封存、认领或删除
+                continue
+            names.add(path.name)
+        self._line_counts = {name: value for name, value in self._line_counts.items() if name in names}
+        return backlog
+
+    async def _size(self) -> int:
+        # 分段可能由其他进程写入、认领和确认，积压以目录中的分段文件为准
+        return await asyncio.to_thread(self._scan)
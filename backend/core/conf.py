@@ -191,6 +191,9 @@ class Settings(BaseSettings):
     IP_LOCATION_PARSE: Literal['online', 'offline', 'false'] = 'offline'
     IP_LOCATION_REDIS_PREFIX: str = 'fba:ip:location'
     IP_LOCATION_EXPIRE_SECONDS: int = 60 * 60 * 24  # 1 天
+    IP_LOCATION_LOCAL_CACHE_SIZE: int = 10000
+    IP_LOCATION_LOCAL_CACHE_TTL: int = 60 * 60  # 1 小时
+    USER_AGENT_PARSE_CACHE_SIZE: int = 1000
 
     # Trace ID
     TRACE_ID_REQUEST_HEADER_KEY: str = 'X-Request-ID'
@@ -227,9 +230,18 @@ class Settings(BaseSettings):
         'new_password',
         'confirm_password',
     ]
-    OPERA_LOG_QUEUE_MAXSIZE: int = 100000
-    OPERA_LOG_QUEUE_BATCH_CONSUME_SIZE: int = 100
-    OPERA_LOG_QUEUE_TIMEOUT: int = 60  # 1 分钟
+    OPERA_LOG_ARGS_MAX_SIZE: int = 10240  # 请求体最大记录大小（字节）
+    OPERA_LOG_SPOOL_BACKEND: Literal['redis', 'file'] = 'redis'  # 多进程或多实例部署需使用 redis
+    OPERA_LOG_SPOOL_MAXSIZE: int = 100000  # 缓冲积压上限
+    OPERA_LOG_SPOOL_FULL_POLICY: Literal['block', 'drop'] = 'block'  # 积压达到上限时请求开始前等待或直接丢弃
+    OPERA_LOG_SPOOL_BLOCK_TIMEOUT: float = 5  # 秒，阻塞超时后丢弃
+    OPERA_LOG_SPOOL_REDIS_KEY: str = 'fba:opera_log:spool'
+    OPERA_LOG_SPOOL_REDIS_GROUP: str = 'fba:opera_log:writer'
+    OPERA_LOG_SPOOL_CLAIM_IDLE: int = 60000  # 毫秒，超时未确认的日志由其他消费者接管
+    OPERA_LOG_SPOOL_SEGMENT_SIZE: int = 8 * 1024 * 1024  # 文件缓冲分段大小（字节）
+    OPERA_LOG_WRITE_BATCH_SIZE: int = 1000
+    OPERA_LOG_WRITE_INTERVAL: float = 1  # 秒
+    OPERA_LOG_DRAIN_TIMEOUT: int = 30  # 秒
 
     # Plugin 配置
     PLUGIN_PIP_CHINA: bool = True
@@ -244,6 +256,9 @@ class Settings(BaseSettings):
     GRAFANA_METRICS_ENABLE: bool = False
     GRAFANA_OTLP_GRPC_ENDPOINT: str = 'fba_alloy:4317'
 
+    # Prometheus
+    PROMETHEUS_ROUTE_CACHE_SIZE: int = 10000
+
     ##################################################
     # [ App ] task
     ##################################################
@@ -291,6 +306,95 @@ class Settings(BaseSettings):
     # .env LLM 网关加密密钥
     LLM_ENCRYPTION_KEY: str = ''  # Fernet 加密密钥 (可通过 Fernet.generate_key() 生成)
 
+    # 路由表
+    LLM_ROUTING_PUBSUB_KEY: str = 'fba:llm:routing'  # 路由表重建通知键
+
+    # API Key 缓存
+    LLM_API_KEY_CACHE_PREFIX: str = 'fba:llm:api_key'
+    LLM_API_KEY_CACHE_TTL: int = 300  # 秒
+    LLM_API_KEY_CACHE_LOCAL_TTL: int = 60  # 秒
+    LLM_API_KEY_CACHE_LOCAL_MAXSIZE: int = 10000
+    LLM_API_KEY_NEGATIVE_CACHE_TTL: int = 30  # 秒
+    LLM_API_KEY_LAST_USED_KEY: str = 'fba:llm:api_key_last_used'
+    LLM_API_KEY_LAST_USED_FLUSH_INTERVAL: int = 30  # 秒
+
+    # 熔断器
+    LLM_CIRCUIT_BREAKER_THRESHOLD: int = 5  # 连续失败阈值
+    LLM_CIRCUIT_BREAKER_TIMEOUT: int = 30  # 恢复超时（秒）
+    LLM_CIRCUIT_BREAKER_HALF_OPEN_MAX_CALLS: int = 3  # 集群内半开探测名额
+    LLM_CIRCUIT_BREAKER_LOCAL_TTL: float = 1  # 本地状态快照有效期（秒）
+    LLM_CIRCUIT_BREAKER_REDIS_PREFIX: str = 'fba:llm:circuit'
+
+    # 请求调度
+    LLM_DISPATCH_DEADLINE_SECONDS: float = 600  # 单次调度（含重试及对冲）的总时限
+    LLM_HEDGE_DEFAULT_DELAY_MS: int = 2000  # 无延迟样本时的对冲等待时间
+    LLM_HEDGE_LATENCY_WINDOW: int = 200  # 延迟样本窗口大小
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # 计算 P95 所需最少样本数
+    LLM_ROUTE_STATS_EWMA_ALPHA: float = 0.3  # 路由延迟及错误率 EWMA 平滑系数
+
+    # 响应缓存
+    LLM_RESPONSE_CACHE_PREFIX: str = 'fba:llm:response'
+    LLM_RESPONSE_CACHE_MAX_BYTES: int = 256 * 1024  # 压缩后超过该大小不缓存
+    LLM_RESPONSE_CACHE_COMPRESS_LEVEL: int = 6
+    LLM_RESPONSE_CACHE_DETERMINISTIC_ONLY: bool = True  # 仅缓存 temperature=0 或指定 seed 的请求
+
+    # 相同请求合并
+    LLM_SINGLEFLIGHT_ENABLED: bool = False  # 仅合并同一用户的确定性请求（temperature=0 或指定 seed）
+    LLM_SINGLEFLIGHT_CLUSTER_ENABLED: bool = False  # 通过 Redis 在集群内合并
+    LLM_SINGLEFLIGHT_REDIS_PREFIX: str = 'fba:llm:singleflight'
+    LLM_SINGLEFLIGHT_LOCK_TTL_MS: int = 30000  # leader 锁过期时间，每次广播结果时续期
+    LLM_SINGLEFLIGHT_CLUSTER_WAIT_MS: int = 1000  # follower 单次等待时间，需小于 REDIS_TIMEOUT，超时后检查 leader
+
+    # 批处理
+    LLM_BATCH_MAX_FILE_SIZE: int = 100 * 1024 * 1024  # 100 MB
+    LLM_BATCH_MAX_REQUESTS: int = 50000  # 单个批处理最大请求数
+    LLM_BATCH_COMPLETION_WINDOWS: list[str] = ['24h']
+    LLM_BATCH_CONCURRENCY: int = 32  # 单个批处理并发数
+    LLM_BATCH_PROVIDER_CONCURRENCY: int = 8  # 每个 Worker 进程内单个供应商并发数
+    LLM_BATCH_PROGRESS_INTERVAL: float = 5  # 进度写入及取消检查间隔（秒）
+    LLM_BATCH_RETRY_DELAY: float = 5  # 触发限流或供应商不可用时的重试间隔（秒）
+    LLM_BATCH_MAX_RETRIES: int = 60  # 单个请求最大重试次数
+    LLM_BATCH_STORAGE_DIR: str | None = None  # 批处理文件目录，Web 与 Worker 需挂载同一共享存储
+    LLM_BATCH_LOCK_PREFIX: str = 'fba:llm:batch'
+    LLM_BATCH_STALE_SECONDS: int = 300  # 执行中的批处理超过该时间无进度写入视为中断，由定时任务重新投递
+    LLM_BATCH_RECOVER_INTERVAL: int = 60  # 中断批处理检查间隔（秒）
+    LLM_BATCH_SOFT_TIME_LIMIT: int = 25 * 3600  # 单次执行软时限（秒），需大于最长完成时间窗口
+    LLM_BATCH_TIME_LIMIT: int = 25 * 3600 + 600  # 单次执行硬时限（秒）
+
+    # 原生传输（OpenAI 兼容供应商绕过 LiteLLM 直连）
+    LLM_NATIVE_TRANSPORT_ENABLED: bool = False
+    LLM_NATIVE_TRANSPORT_PROVIDER_TYPES: list[str] = ['openai', 'deepseek', 'moonshot']  # 需配置含 /v1 的 API 地址
+    LLM_NATIVE_TRANSPORT_HTTP2: bool = True  # 需安装 h2
+    LLM_NATIVE_TRANSPORT_MAX_CONNECTIONS: int = 200  # 单个供应商最大连接数
+    LLM_NATIVE_TRANSPORT_MAX_KEEPALIVE: int = 50  # 单个供应商最大空闲连接数
+    LLM_NATIVE_TRANSPORT_KEEPALIVE_EXPIRY: float = 120  # 空闲连接保持时间（秒）
+    LLM_NATIVE_TRANSPORT_CONNECT_TIMEOUT: float = 5
+    LLM_NATIVE_TRANSPORT_READ_TIMEOUT: float = 600  # 总超时由模型组策略控制
+
+    # Embedding 微批处理
+    LLM_EMBEDDING_BATCH_ENABLED: bool = True
+    LLM_EMBEDDING_BATCH_WINDOW_MS: float = 5  # 合并等待窗口（毫秒）
+    LLM_EMBEDDING_BATCH_MAX_SIZE: int = 256  # 单次上游调用最大输入数，达到后立即发送
+
+    # 流式响应
+    LLM_STREAM_PASSTHROUGH: bool = False  # 透传供应商响应块，不做格式归一化
+
+    # 用量日志
+    LLM_USAGE_LOG_QUEUE_MAXSIZE: int = 100000
+    LLM_USAGE_LOG_FLUSH_SIZE: int = 500
+    LLM_USAGE_LOG_FLUSH_INTERVAL: float = 1  # 秒
+    LLM_USAGE_LOG_DRAIN_TIMEOUT: int = 30  # 秒
+    LLM_USAGE_LOG_RETRY_MAX_DELAY: float = 30  # 秒，数据库不可用时重试的最大间隔
+    LLM_USAGE_LOG_PARTITION_PRECREATE_MONTHS: int = 2  # 预创建未来分区的月数
+    LLM_USAGE_LOG_RETENTION_MONTHS: int = 6  # 分区保留月数，超过后归档并删除，0 表示永久保留
+    LLM_USAGE_LOG_ARCHIVE_BATCH_SIZE: int = 5000  # 归档导出时单次读取行数
+
+    # 用量汇总
+    LLM_USAGE_ROLLUP_INTERVAL: int = 300  # 秒
+    LLM_USAGE_ROLLUP_DELAY: int = 300  # 小时结束后等待用量日志写入的时间（秒）
+    LLM_USAGE_ROLLUP_MAX_HOURS: int = 168  # 单次最多汇总的小时数
+    LLM_USAGE_ROLLUP_WATERMARK_KEY: str = 'fba:llm:usage_rollup:watermark'
+
     ##################################################
     # [ SMS ] Aliyun
     ##################################################
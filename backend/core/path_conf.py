@@ -21,6 +21,15 @@ STATIC_DIR = BASE_PATH / 'static'
 # 上传文件目录
 UPLOAD_DIR = STATIC_DIR / 'upload'
 
+# LLM 批处理文件默认目录，可通过 LLM_BATCH_STORAGE_DIR 指定共享存储
+LLM_BATCH_DIR = BASE_PATH / 'storage' / 'llm_batch'
+
+# LLM 用量日志归档目录
+LLM_USAGE_ARCHIVE_DIR = BASE_PATH / 'storage' / 'llm_usage_archive'
+
+# 操作日志文件缓冲目录
+OPERA_LOG_SPOOL_DIR = BASE_PATH / 'storage' / 'opera_log_spool'
+
 # 插件目录
 PLUGIN_DIR = BASE_PATH / 'plugin'
 
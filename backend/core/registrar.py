@@ -1,6 +1,5 @@
 import os
 
-from asyncio import create_task
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 
@@ -13,14 +12,20 @@ from prometheus_client import make_asgi_app
 from starlette.middleware.authentication import AuthenticationMiddleware
 from starlette.middleware.cors import CORSMiddleware
 from starlette.staticfiles import StaticFiles
-from starlette_context.middleware import ContextMiddleware
+from starlette_context.middleware import RawContextMiddleware
 from starlette_context.plugins import RequestIdPlugin
 
 from backend import __version__
+from backend.app.llm.core.api_key_cache import api_key_cache
+from backend.app.llm.core.tokenizer import token_counter
+from backend.app.llm.core.transport import native_transport
+from backend.app.llm.core.usage_partition import usage_log_partitioner
+from backend.app.llm.core.usage_writer import usage_log_writer
 from backend.common.cache.pubsub import cache_pubsub_manager
 from backend.common.cache.warmup import cache_warmup
 from backend.common.exception.exception_handler import register_exception
 from backend.common.log import set_custom_logfile, setup_logging
+from backend.common.prometheus.route_metrics import route_metrics
 from backend.common.response.response_code import StandardResponseCode
 from backend.core.conf import settings
 from backend.core.path_conf import STATIC_DIR, UPLOAD_DIR
@@ -36,6 +41,7 @@ from backend.utils.demo_mode import demo_site
 from backend.utils.limiter import http_limit_callback
 from backend.utils.openapi import ensure_unique_route_names, simplify_operation_ids
 from backend.utils.otel import init_otel
+from backend.utils.request_parse import location_client
 from backend.utils.serializers import MsgSpecJSONResponse
 from backend.utils.snowflake import snowflake
 from backend.utils.trace_id import OtelTraceIdPlugin
@@ -52,6 +58,9 @@ async def register_init(app: FastAPI) -> AsyncGenerator[None, None]:
     # 创建数据库表
     await create_tables()
 
+    # 创建 LLM 用量日志分区
+    await usage_log_partitioner.ensure()
+
     # 初始化 redis
     await redis_client.init()
 
@@ -65,8 +74,17 @@ async def register_init(app: FastAPI) -> AsyncGenerator[None, None]:
     # 初始化 snowflake 节点
     await snowflake.init()
 
-    # 创建操作日志任务
-    create_task(OperaLogMiddleware.consumer())
+    # 启动操作日志消费者
+    await OperaLogMiddleware.start()
+
+    # 启动 LLM 用量日志写入器
+    usage_log_writer.start()
+
+    # 预加载 tiktoken 编码
+    await token_counter.preload()
+
+    # 注册 API Key 缓存失效回调
+    api_key_cache.register()
 
     # 缓存预热
     await cache_warmup()
@@ -79,6 +97,18 @@ async def register_init(app: FastAPI) -> AsyncGenerator[None, None]:
     # 停止缓存 Pub/Sub 监听器
     await cache_pubsub_manager.stop_listener()
 
+    # 写入缓冲中的剩余操作日志
+    await OperaLogMiddleware.stop()
+
+    # 写入剩余 LLM 用量日志
+    await usage_log_writer.stop()
+
+    # 关闭 LLM 上游连接
+    await native_transport.close()
+
+    # 关闭 IP 属地查询客户端
+    await location_client.aclose()
+
     # 释放 snowflake 节点
     await snowflake.shutdown()
 
@@ -167,7 +197,7 @@ def register_middleware(app: FastAPI) -> None:
     # ContextVar
     plugins = [OtelTraceIdPlugin()] if settings.GRAFANA_METRICS_ENABLE else [RequestIdPlugin(validate=True)]
     app.add_middleware(
-        ContextMiddleware,
+        RawContextMiddleware,
         plugins=plugins,
         default_error_response=MsgSpecJSONResponse(
             content={'code': StandardResponseCode.HTTP_400, 'msg': 'BAD_REQUEST', 'data': None},
@@ -206,6 +236,9 @@ def register_router(app: FastAPI) -> None:
     ensure_unique_route_names(app)
     simplify_operation_ids(app)
 
+    # Metrics
+    route_metrics.bind(app)
+
 
 def register_page(app: FastAPI) -> None:
     """
@@ -6,6 +6,7 @@ from uuid import uuid4
 
 from fastapi import Depends
 from sqlalchemy import URL
+from sqlalchemy.exc import DataError, IntegrityError
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
@@ -110,6 +111,16 @@ async def drop_tables() -> None:
         await conn.run_sync(MappedBase.metadata.drop_all)
 
 
+def is_data_error(e: Exception) -> bool:
+    """
+    是否为个别数据导致的写入失败（数据异常或违反约束），而非数据库不可用
+
+    :param e: 异常
+    :return:
+    """
+    return isinstance(e, (DataError, IntegrityError)) or str(getattr(e, 'sqlstate', '')).startswith(('22', '23'))
+
+
 def uuid4_str() -> str:
     """数据库引擎 UUID 类型兼容性解决方案"""
     return str(uuid4())
@@ -1,30 +1,35 @@
 import time
 
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.requests import Request
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from backend.common.context import ctx
 from backend.common.log import log
-from backend.common.prometheus.instruments import (
-    PROMETHEUS_APP_NAME,
-    PROMETHEUS_REQUEST_COUNTER,
-    PROMETHEUS_REQUEST_IN_PROGRESS_GAUGE,
-)
+from backend.common.prometheus.route_metrics import route_metrics
 from backend.core.conf import settings
 from backend.utils.timezone import timezone
 
 
-class AccessMiddleware(BaseHTTPMiddleware):
+class AccessMiddleware:
     """访问日志中间件"""
 
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """
         处理请求并记录访问日志
 
-        :param request: FastAPI 请求对象
-        :param call_next: 下一个中间件或路由处理函数
+        :param scope: ASGI 请求作用域
+        :param receive: ASGI 接收通道
+        :param send: ASGI 发送通道
         :return:
         """
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
         path = request.url.path
         method = request.method
 
@@ -38,9 +43,9 @@ class AccessMiddleware(BaseHTTPMiddleware):
         ctx.start_time = start_time
 
         if path.startswith(f'{settings.FASTAPI_API_V1_PATH}'):
-            PROMETHEUS_REQUEST_IN_PROGRESS_GAUGE.labels(app_name=PROMETHEUS_APP_NAME, method=method, path=path).inc()
-            PROMETHEUS_REQUEST_COUNTER.labels(app_name=PROMETHEUS_APP_NAME, method=method, path=path).inc()
-
-        response = await call_next(request)
+            metrics = route_metrics.resolve(scope)
+            ctx.route_metrics = metrics
+            metrics.in_progress.inc()
+            metrics.requests.inc()
 
-        return response
+        await self.app(scope, receive, send)
@@ -1,7 +1,5 @@
-from collections.abc import Callable
-
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import Request
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from backend.common.i18n import i18n
 from backend.core.conf import settings
@@ -33,23 +31,26 @@ def get_current_language(request: Request) -> str | None:
     return lang_mapping.get(lang, lang)
 
 
-class I18nMiddleware(BaseHTTPMiddleware):
+class I18nMiddleware:
     """国际化中间件"""
 
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """
         处理请求并设置国际化语言
 
-        :param request: FastAPI 请求对象
-        :param call_next: 下一个中间件或路由处理函数
+        :param scope: ASGI 请求作用域
+        :param receive: ASGI 接收通道
+        :param send: ASGI 发送通道
         :return:
         """
-        language = get_current_language(request)
-
-        # 设置国际化语言
-        if language and i18n.current_language != language:
-            i18n.current_language = language
+        if scope['type'] == 'http':
+            language = get_current_language(Request(scope))
 
-        response = await call_next(request)
+            # 设置国际化语言
+            if language and i18n.current_language != language:
+                i18n.current_language = language
 
-        return response
+        await self.app(scope, receive, send)
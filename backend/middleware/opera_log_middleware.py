@@ -1,53 +1,114 @@
+import asyncio
 import json
+import re
 import time
 
-from asyncio import Queue
 from typing import Any
+from urllib.parse import parse_qsl
+
+import msgspec
 
-from fastapi import Response
-from starlette.datastructures import UploadFile
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from backend.app.admin.schema.opera_log import CreateOperaLogParam
 from backend.app.admin.service.opera_log_service import opera_log_service
 from backend.common.context import ctx
 from backend.common.enums import StatusType
 from backend.common.log import log
-from backend.common.prometheus.instruments import (
-    PROMETHEUS_APP_NAME,
-    PROMETHEUS_EXCEPTION_COUNTER,
-    PROMETHEUS_REQUEST_COST_TIME_HISTOGRAM,
-    PROMETHEUS_REQUEST_IN_PROGRESS_GAUGE,
-    PROMETHEUS_RESPONSE_COUNTER,
-)
-from backend.common.queue import batch_dequeue
+from backend.common.prometheus.instruments import PROMETHEUS_APP_NAME, PROMETHEUS_SPOOL_LAG_GAUGE
 from backend.common.response.response_code import StandardResponseCode
+from backend.common.spool import FileSpool, RedisStreamSpool, Spool, SpoolEntry
 from backend.core.conf import settings
-from backend.database.db import async_db_session
+from backend.core.path_conf import OPERA_LOG_SPOOL_DIR
+from backend.database.db import async_db_session, is_data_error
+from backend.utils.request_parse import get_ip_info, parse_user_agent_info
+from backend.utils.timezone import timezone
 from backend.utils.trace_id import get_request_trace_id
 
 
-class OperaLogMiddleware(BaseHTTPMiddleware):
-    """操作日志中间件"""
+class RequestBodyCapture:
+    """请求体旁路捕获，在路由读取请求体的同时复制前 limit 字节，不额外缓冲完整请求体"""
+
+    def __init__(self, receive: Receive, limit: int) -> None:
+        self._receive = receive
+        self.limit = limit
+        self.prefix = bytearray()
+        self.size = 0
+
+    @property
+    def truncated(self) -> bool:
+        """请求体是否超出捕获上限"""
+        return self.size > len(self.prefix)
+
+    async def receive(self) -> Message:
+        """ASGI 接收通道"""
+        message = await self._receive()
+        if message['type'] == 'http.request':
+            body = message.get('body', b'')
+            self.size += len(body)
+            remaining = self.limit - len(self.prefix)
+            if body and remaining > 0:
+                self.prefix += body[:remaining]
+        return message
+
+
+def _create_spool() -> Spool:
+    """创建操作日志缓冲"""
+    options = {
+        'maxsize': settings.OPERA_LOG_SPOOL_MAXSIZE,
+        'policy': settings.OPERA_LOG_SPOOL_FULL_POLICY,
+        'block_timeout': settings.OPERA_LOG_SPOOL_BLOCK_TIMEOUT,
+    }
+    if settings.OPERA_LOG_SPOOL_BACKEND == 'file':
+        return FileSpool(
+            'opera_log', directory=OPERA_LOG_SPOOL_DIR, segment_size=settings.OPERA_LOG_SPOOL_SEGMENT_SIZE, **options
+        )
+    return RedisStreamSpool(
+        'opera_log',
+        key=settings.OPERA_LOG_SPOOL_REDIS_KEY,
+        group=settings.OPERA_LOG_SPOOL_REDIS_GROUP,
+        claim_idle=settings.OPERA_LOG_SPOOL_CLAIM_IDLE,
+        **options,
+    )
+
+
+class OperaLogMiddleware:
+    """
+    操作日志中间件
+
+    操作日志先写入持久化缓冲（Redis Stream 或本地文件），由后台消费者批量入库，进程崩溃或重启不会丢失日志
+    """
 
-    opera_log_queue: Queue = Queue(maxsize=settings.OPERA_LOG_QUEUE_MAXSIZE)
+    opera_log_spool: Spool = _create_spool()
+    _consumer_task: asyncio.Task | None = None
+    _stopping: bool = False
 
-    async def dispatch(self, request: Request, call_next: Any) -> Response:  # noqa: C901
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:  # noqa: C901
         """
         处理请求并记录操作日志
 
-        :param request: FastAPI 请求对象
-        :param call_next: 下一个中间件或路由处理函数
+        :param scope: ASGI 请求作用域
+        :param receive: ASGI 接收通道
+        :param send: ASGI 发送通道
         :return:
         """
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope, receive)
         path = request.url.path
         method = request.method
-        args = await self.get_request_args(request)
+        args = None
         code = 200
         msg = 'Success'
         status = StatusType.enable
-        elapsed = 0
+        elapsed = None
+        metrics = ctx.route_metrics
 
         try:
             username = request.user.username
@@ -58,8 +119,22 @@ class OperaLogMiddleware(BaseHTTPMiddleware):
             path.startswith(f'{settings.FASTAPI_API_V1_PATH}') and path not in settings.OPERA_LOG_PATH_EXCLUDE
         )
 
+        # 仅记录操作日志的请求捕获请求体；缓冲积压达到上限时在处理请求前按策略等待，响应结束后写入不再阻塞
+        capture = None
+        if should_log_opera and method != 'OPTIONS':
+            capture = RequestBodyCapture(receive, settings.OPERA_LOG_ARGS_MAX_SIZE)
+            receive = capture.receive
+            await self.opera_log_spool.wait_available()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal elapsed
+            # 耗时统计到响应开始，流式响应不计入传输时间
+            if message['type'] == 'http.response.start':
+                elapsed = round((time.perf_counter() - ctx.perf_time) * 1000, 3)
+            await send(message)
+
         try:
-            response = await call_next(request)
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
             elapsed = round((time.perf_counter() - ctx.perf_time) * 1000, 3)
             log.error(f'请求异常: {e!s}')
@@ -69,17 +144,13 @@ class OperaLogMiddleware(BaseHTTPMiddleware):
                 msg = getattr(e, 'msg', str(e))
                 status = StatusType.disable
 
-            if path.startswith(f'{settings.FASTAPI_API_V1_PATH}'):
-                PROMETHEUS_EXCEPTION_COUNTER.labels(
-                    app_name=PROMETHEUS_APP_NAME,
-                    method=method,
-                    path=path,
-                    exception_type=type(e).__name__,
-                ).inc()
+            if metrics is not None:
+                metrics.exception(type(e).__name__).inc()
 
             raise
         else:
-            elapsed = round((time.perf_counter() - ctx.perf_time) * 1000, 3)
+            if elapsed is None:
+                elapsed = round((time.perf_counter() - ctx.perf_time) * 1000, 3)
 
             if should_log_opera:
                 # 检查上下文中的异常信息
@@ -97,14 +168,17 @@ class OperaLogMiddleware(BaseHTTPMiddleware):
                         log.error(f'请求异常: {msg}')
                         break
 
-            if path.startswith(f'{settings.FASTAPI_API_V1_PATH}'):
-                PROMETHEUS_REQUEST_COST_TIME_HISTOGRAM.labels(
-                    app_name=PROMETHEUS_APP_NAME, method=method, path=path
-                ).observe(amount=elapsed, exemplar={'TraceID': get_request_trace_id()})
+            if metrics is not None:
+                metrics.cost_time.observe(amount=elapsed, exemplar={'TraceID': get_request_trace_id()})
         finally:
-            # summary 只能在请求后获取
-            route = request.scope.get('route')
+            if elapsed is None:
+                elapsed = round((time.perf_counter() - ctx.perf_time) * 1000, 3)
+
+            # summary 及路径参数只能在请求后获取
+            route = scope.get('route')
             summary = route.summary or '' if route else ''
+            if capture is not None:
+                args = self.get_request_args(request, capture)
 
             log.debug(f'接口摘要：[{summary}]')
             log.debug(f'请求地址：[{ctx.ip}]')
@@ -117,6 +191,8 @@ class OperaLogMiddleware(BaseHTTPMiddleware):
                 log.info(f'{ctx.ip: <15} | {method: <8} | {code!s: <6} | {path} | {elapsed:.3f}ms')
 
             if should_log_opera and request.method != 'OPTIONS':
+                ip_info = await get_ip_info(ctx.ip)
+                ua_info = parse_user_agent_info(ctx.user_agent)
                 opera_log_in = CreateOperaLogParam(
                     trace_id=get_request_trace_id(),
                     username=username,
@@ -124,13 +200,13 @@ class OperaLogMiddleware(BaseHTTPMiddleware):
                     title=summary,
                     path=path,
                     ip=ctx.ip,
-                    country=ctx.country,
-                    region=ctx.region,
-                    city=ctx.city,
+                    country=ip_info.country,
+                    region=ip_info.region,
+                    city=ip_info.city,
                     user_agent=ctx.user_agent,
-                    os=ctx.os,
-                    browser=ctx.browser,
-                    device=ctx.device,
+                    os=ua_info.os,
+                    browser=ua_info.browser,
+                    device=ua_info.device,
                     args=args,
                     status=status,
                     code=str(code),
@@ -138,23 +214,18 @@ class OperaLogMiddleware(BaseHTTPMiddleware):
                     cost_time=elapsed,
                     opera_time=ctx.start_time,
                 )
-                await self.opera_log_queue.put(opera_log_in)
+                await self.opera_log_spool.put(msgspec.json.encode(opera_log_in.model_dump()).decode(), wait=False)
 
-            if path.startswith(f'{settings.FASTAPI_API_V1_PATH}'):
-                PROMETHEUS_RESPONSE_COUNTER.labels(
-                    app_name=PROMETHEUS_APP_NAME, method=method, path=path, status_code=code
-                ).inc()
-                PROMETHEUS_REQUEST_IN_PROGRESS_GAUGE.labels(
-                    app_name=PROMETHEUS_APP_NAME, method=method, path=path
-                ).dec()
+            if metrics is not None:
+                metrics.response(code).inc()
+                metrics.in_progress.dec()
 
-        return response
-
-    async def get_request_args(self, request: Request) -> dict[str, Any] | None:  # noqa: C901
+    def get_request_args(self, request: Request, body: RequestBodyCapture) -> dict[str, Any] | None:  # noqa: C901
         """
         获取请求参数
 
         :param request: FastAPI 请求对象
+        :param body: 请求体捕获
         :return:
         """
         args = {}
@@ -165,77 +236,99 @@ class OperaLogMiddleware(BaseHTTPMiddleware):
             args['query_params'] = self.desensitization(query_params)
 
         # 路径参数
-        path_params = request.path_params
+        path_params = dict(request.path_params)
         if path_params:
             args['path_params'] = self.desensitization(path_params)
 
-        # Tip: .body() 必须在 .form() 之前获取
-        # https://github.com/encode/starlette/discussions/1933
-        content_type = request.headers.get('Content-Type', '').split(';')
-
-        # 请求体
-        body_data = await request.body()
-        if body_data:
-            # 注意：非 json 数据默认使用 data 作为键
-            if 'application/json' not in content_type:
-                args['data'] = body_data.decode('utf-8', 'ignore') if isinstance(body_data, bytes) else str(body_data)
-            else:
-                json_data = await request.json()
+        # 请求体，仅包含路由已读取的部分
+        if body.size:
+            content_type = request.headers.get('Content-Type', '')
+            media_type = content_type.split(';')[0].strip().lower()
+            data = bytes(body.prefix)
+            if media_type == 'multipart/form-data':
+                args['form-data'] = self.desensitization(self.parse_multipart(data, content_type))
+            elif media_type == 'application/x-www-form-urlencoded':
+                text = data.decode('utf-8', 'ignore')
+                if body.truncated:
+                    # 丢弃被截断的最后一个参数
+                    text = text.rsplit('&', 1)[0]
+                args['x-www-form-urlencoded'] = self.desensitization(dict(parse_qsl(text)))
+            elif body.truncated:
+                args.update(self.truncate(data.decode('utf-8', 'ignore'), body.size))
+            elif media_type == 'application/json':
+                try:
+                    json_data = json.loads(data)
+                except ValueError:
+                    json_data = data.decode('utf-8', 'ignore')
                 if isinstance(json_data, dict):
                     args['json'] = self.desensitization(json_data)
                 else:
                     args['data'] = str(json_data)
-
-        # 表单参数
-        form_data = await request.form()
-        if len(form_data) > 0:
-            serialized_form = {}
-            for k, v in form_data.items():
-                if isinstance(v, UploadFile):
-                    serialized_form[k] = {
-                        'filename': v.filename,
-                        'content_type': v.content_type,
-                        'size': v.size,
-                    }
-                else:
-                    serialized_form[k] = v
-            if 'multipart/form-data' not in content_type:
-                args['x-www-form-urlencoded'] = self.desensitization(serialized_form)
             else:
-                args['form-data'] = self.desensitization(serialized_form)
-
-        if args:
-            args = self.truncate(args)
+                # 注意：非 json 数据默认使用 data 作为键
+                args['data'] = data.decode('utf-8', 'ignore')
 
         return args or None
 
     @staticmethod
-    def truncate(args: dict[str, Any]) -> dict[str, Any]:
+    def parse_multipart(data: bytes, content_type: str) -> dict[str, Any]:
         """
-        截断处理
+        解析 multipart 请求体前缀，文件仅记录文件名、类型及大小，截断部分的大小记为 None
 
-        :param args: 需要截断的请求参数字典
+        :param data: 请求体前缀
+        :param content_type: 请求内容类型
         :return:
         """
-        max_size = 10240  # 数据最大大小（字节）
-
-        try:
-            args_str = json.dumps(args, ensure_ascii=False)
-            args_size = len(args_str.encode('utf-8'))
-
-            if args_size > max_size:
-                truncated_str = args_str[:max_size]
-                return {
-                    '_truncated': True,
-                    '_original_size': args_size,
-                    '_max_size': max_size,
-                    '_message': f'数据过大已截断：原始大小 {args_size} 字节，限制 {max_size} 字节',
-                    'data_preview': truncated_str,
+        match = re.search(r'boundary="?([^";]+)"?', content_type)
+        if not match:
+            return {}
+
+        form = {}
+        parts = data.split(b'--' + match.group(1).encode('latin-1'))[1:]
+        for index, part in enumerate(parts):
+            if part.startswith(b'--'):
+                break
+            head, sep, value = part.partition(b'\r\n\r\n')
+            header = head.decode('latin-1')
+            name = re.search(r'\bname="([^"]*)"', header)
+            if not sep or not name:
+                break
+            # 后面还有分隔符时该部分完整，去掉结尾的 CRLF
+            complete = index < len(parts) - 1
+            if complete:
+                value = value[:-2]
+            filename = re.search(r'\bfilename="([^"]*)"', header)
+            if filename:
+                file_type = re.search(r'content-type:\s*([^\r\n]+)', header, re.IGNORECASE)
+                form[name.group(1)] = {
+                    'filename': filename.group(1),
+                    'content_type': file_type.group(1).strip() if file_type else None,
+                    'size': len(value) if complete else None,
                 }
-        except Exception as e:
-            log.error(f'请求参数截断处理失败：{e}')
+            else:
+                form[name.group(1)] = value.decode('utf-8', 'ignore')
+        return form
 
-        return args
+    @staticmethod
+    def truncate(text: str, size: int) -> dict[str, Any]:
+        """
+        截断处理，对已捕获的前缀进行脱敏
+
+        :param text: 请求体前缀
+        :param size: 请求体原始大小（字节）
+        :return:
+        """
+        max_size = settings.OPERA_LOG_ARGS_MAX_SIZE
+        if settings.OPERA_LOG_REDACT_KEYS:
+            keys = '|'.join(re.escape(key) for key in settings.OPERA_LOG_REDACT_KEYS)
+            text = re.sub(rf'("(?:{keys})"\s*:\s*)("(?:[^"\\]|\\.)*"?|[^,}}\]\s]*)', r'\1"[REDACTED]"', text)
+        return {
+            '_truncated': True,
+            '_original_size': size,
+            '_max_size': max_size,
+            '_message': f'数据过大已截断：原始大小 {size} 字节，限制 {max_size} 字节',
+            'data_preview': text,
+        }
 
     @staticmethod
     def desensitization(args: dict[str, Any]) -> dict[str, Any]:
@@ -250,23 +343,103 @@ class OperaLogMiddleware(BaseHTTPMiddleware):
                 args[key] = '[REDACTED]'
         return args
 
+    @staticmethod
+    def _decode(data: str) -> CreateOperaLogParam | None:
+        """
+        解析缓冲中的操作日志
+
+        :param data: 缓冲数据
+        :return:
+        """
+        try:
+            return CreateOperaLogParam.model_validate_json(data)
+        except ValueError as e:
+            log.error(f'操作日志解析失败，丢弃日志: {e}')
+            return None
+
+    @classmethod
+    async def _insert(cls, logs: list[CreateOperaLogParam]) -> bool:
+        """
+        写入操作日志，个别数据异常时返回 False，数据库不可用时抛出异常
+
+        :param logs: 操作日志列表
+        :return:
+        """
+        try:
+            async with async_db_session.begin() as db:
+                await opera_log_service.bulk_create(db=db, objs=logs)
+        except Exception as e:
+            if not is_data_error(e):
+                raise
+            log.warning(f'操作日志入库失败: {e}')
+            return False
+        return True
+
+    @classmethod
+    async def _write(cls, entries: list[SpoolEntry]) -> None:
+        """
+        批量写入操作日志并确认，数据库不可用时保留在缓冲中等待重试
+
+        :param entries: 缓冲条目列表
+        :return:
+        """
+        spool = cls.opera_log_spool
+        logs = [opera_log for _, data in entries if (opera_log := cls._decode(data)) is not None]
+        invalid = len(entries) - len(logs)
+
+        if logs:
+            if settings.DATABASE_ECHO:
+                log.info('自动执行【操作日志批量创建】任务...')
+            # 批量写入因个别数据失败时逐条写入，仅丢弃异常数据
+            if not await cls._insert(logs):
+                for opera_log in logs:
+                    if not await cls._insert([opera_log]):
+                        invalid += 1
+            PROMETHEUS_SPOOL_LAG_GAUGE.labels(app_name=PROMETHEUS_APP_NAME, spool=spool.name).set(
+                (timezone.now() - logs[0].opera_time).total_seconds()
+            )
+
+        if invalid:
+            spool.record_drop('invalid', invalid)
+        await spool.ack([entry_id for entry_id, _ in entries])
+
     @classmethod
     async def consumer(cls) -> None:
-        """操作日志消费者"""
+        """操作日志消费者，停止时处理完积压后退出"""
+        spool = cls.opera_log_spool
         while True:
-            logs = await batch_dequeue(
-                cls.opera_log_queue,
-                max_items=settings.OPERA_LOG_QUEUE_BATCH_CONSUME_SIZE,
-                timeout=settings.OPERA_LOG_QUEUE_TIMEOUT,
-            )
-            if logs:
-                try:
-                    if settings.DATABASE_ECHO:
-                        log.info('自动执行【操作日志批量创建】任务...')
-                    async with async_db_session.begin() as db:
-                        await opera_log_service.bulk_create(db=db, objs=logs)
-                except Exception as e:
-                    log.error(f'操作日志入库失败，丢失 {len(logs)} 条日志: {e}')
-                finally:
-                    for _ in range(len(logs)):
-                        cls.opera_log_queue.task_done()
+            entries = []
+            try:
+                entries = await spool.read(settings.OPERA_LOG_WRITE_BATCH_SIZE, settings.OPERA_LOG_WRITE_INTERVAL)
+                if entries:
+                    await cls._write(entries)
+                await spool.refresh()
+            except Exception as e:
+                log.error(f'操作日志入库失败，{len(entries)} 条日志保留在缓冲中等待重试: {e}')
+                if cls._stopping:
+                    break
+                await asyncio.sleep(settings.OPERA_LOG_WRITE_INTERVAL)
+                continue
+            if cls._stopping and not entries:
+                break
+
+    @classmethod
+    async def start(cls) -> None:
+        """打开缓冲并启动消费者"""
+        await cls.opera_log_spool.open()
+        cls._stopping = False
+        cls._consumer_task = asyncio.create_task(cls.consumer())
+
+    @classmethod
+    async def stop(cls) -> None:
+        """写入缓冲中的剩余日志并停止消费者"""
+        if cls._consumer_task is None:
+            return
+
+        task, cls._consumer_task = cls._consumer_task, None
+        cls._stopping = True
+        try:
+            await asyncio.wait_for(task, timeout=settings.OPERA_LOG_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            log.warning(f'操作日志消费者停止超时，剩余 {cls.opera_log_spool.backlog} 条日志将在下次启动后写入')
+        await cls.opera_log_spool.close()
@@ -1,33 +1,32 @@
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from fastapi import Request
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from backend.common.context import ctx
-from backend.utils.request_parse import parse_ip_info, parse_user_agent_info
+from backend.utils.request_parse import get_request_ip
 
 
-class StateMiddleware(BaseHTTPMiddleware):
+class StateMiddleware:
     """请求状态中间件"""
 
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """
         处理请求并设置请求状态信息
 
-        :param request: FastAPI 请求对象
-        :param call_next: 下一个中间件或路由处理函数
+        :param scope: ASGI 请求作用域
+        :param receive: ASGI 接收通道
+        :param send: ASGI 发送通道
         :return:
         """
-        ip_info = await parse_ip_info(request)
-        ctx.ip = ip_info.ip
-        ctx.country = ip_info.country
-        ctx.region = ip_info.region
-        ctx.city = ip_info.city
-
-        ua_info = parse_user_agent_info(request)
-        ctx.user_agent = ua_info.user_agent
-        ctx.os = ua_info.os
-        ctx.browser = ua_info.browser
-        ctx.device = ua_info.device
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
 
-        response = await call_next(request)
+        # IP 属地及用户代理详情按需通过 get_ip_info / parse_user_agent_info 获取
+        request = Request(scope)
+        ctx.ip = get_request_ip(request)
+        ctx.user_agent = request.headers.get('User-Agent')
 
-        return response
+        await self.app(scope, receive, send)
@@ -21,6 +21,7 @@ from backend.plugin.oauth2.crud.crud_user_social import user_social_dao
 from backend.plugin.oauth2.enums import UserSocialAuthType, UserSocialType
 from backend.plugin.oauth2.schema.user_social import CreateUserSocialParam
 from backend.plugin.oauth2.service.user_social_service import user_social_service
+from backend.utils.request_parse import parse_user_agent_info
 from backend.utils.timezone import timezone
 
 
@@ -86,6 +87,7 @@ class OAuth2Service:
             await user_social_dao.create(db, new_user_social)
 
         # 创建 token
+        ua_info = parse_user_agent_info(ctx.user_agent)
         access_token_data = await jwt.create_access_token(
             sys_user.id,
             multi_login=sys_user.is_multi_login,
@@ -94,9 +96,9 @@ class OAuth2Service:
             nickname=sys_user.nickname,
             last_login_time=timezone.to_str(timezone.now()),
             ip=ctx.ip,
-            os=ctx.os,
-            browser=ctx.browser,
-            device=ctx.device,
+            os=ua_info.os,
+            browser=ua_info.browser,
+            device=ua_info.device,
         )
         refresh_token_data = await jwt.create_refresh_token(
             access_token_data.session_uuid,
@@ -0,0 +1,58 @@
+"""
+流式响应块编码微基准
+
+对比 pydantic 模型逐块构建序列化与 ChatChunkEncoder 预编码前缀两种方式的单块编码耗时
+
+用法（项目根目录）：python -m backend.scripts.bench_sse_encoder
+"""
+
+import time
+import timeit
+
+from backend.app.llm.core.sse import ChatChunkEncoder
+from backend.app.llm.schema.proxy import ChatCompletionChunk, ChatCompletionChunkChoice, ChatCompletionChunkDelta
+
+CHUNK_ID = 'chatcmpl-8f14e45fceea167a5a36dedd4bea2543'
+MODEL = 'gpt-4o-mini'
+CONTENT = '流式输出 token'
+NUMBER = 200_000
+
+
+def encode_pydantic(created: int | None = None) -> str:
+    chunk = ChatCompletionChunk(
+        id=CHUNK_ID,
+        created=created or int(time.time()),
+        model=MODEL,
+        choices=[
+            ChatCompletionChunkChoice(
+                index=0,
+                delta=ChatCompletionChunkDelta(role=None, content=CONTENT, tool_calls=None),
+                finish_reason=None,
+            )
+        ],
+    )
+    return f'data: {chunk.model_dump_json()}\n\n'
+
+
+CREATED = int(time.time())
+encoder = ChatChunkEncoder(chunk_id=CHUNK_ID, model=MODEL, created=CREATED)
+
+
+def encode_template() -> str:
+    return encoder.encode(content=CONTENT)
+
+
+def main() -> None:
+    assert encode_pydantic(CREATED) == encode_template()
+
+    results = {}
+    for name, func in (('pydantic', encode_pydantic), ('encoder', encode_template)):
+        seconds = min(timeit.repeat(func, number=NUMBER, repeat=3))
+        results[name] = seconds
+        print(f'{name:<10} {seconds / NUMBER * 1e9:>8.0f} ns/chunk')
+
+    print(f'speedup    {results["pydantic"] / results["encoder"]:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,11 @@
+import asyncio
+
+import cachebox
 import httpx
 
 from fastapi import Request
 from ip2loc import XdbSearcher
+from redis.exceptions import RedisError
 from user_agents import parse
 
 from backend.common.dataclasses import IpInfo, UserAgentInfo
@@ -32,6 +36,21 @@ def get_request_ip(request: Request) -> str:
     return request.client.host
 
 
+# 在线 IP 属地查询共享客户端（复用连接池）
+location_client = httpx.AsyncClient(timeout=3)
+
+# IP 属地本地缓存，过期后重新读取 Redis，使 Redis 中的更新及失效在各进程生效
+__ip_location_cache: cachebox.TTLCache = cachebox.TTLCache(
+    settings.IP_LOCATION_LOCAL_CACHE_SIZE, ttl=settings.IP_LOCATION_LOCAL_CACHE_TTL
+)
+
+# 进行中的 IP 属地查询，相同 IP 的并发查询共享结果
+__ip_location_flights: dict[str, asyncio.Future[tuple[str | None, str | None, str | None]]] = {}
+
+# 用户代理解析结果本地缓存
+__user_agent_cache: cachebox.LRUCache = cachebox.LRUCache(maxsize=settings.USER_AGENT_PARSE_CACHE_SIZE)
+
+
 async def get_location_online(ip: str) -> dict | None:
     """
     在线获取 IP 地址属地，无法保证可用性，准确率较高
@@ -39,14 +58,13 @@ async def get_location_online(ip: str) -> dict | None:
     :param ip: IP 地址
     :return:
     """
-    async with httpx.AsyncClient(timeout=3) as client:
-        try:
-            response = await client.get(f'http://ip-api.com/json/{ip}?lang=zh-CN')
-            if response.status_code == 200:
-                return response.json()
-        except Exception as e:
-            log.error(f'在线获取 IP 地址属地失败，错误信息：{e}')
-            return None
+    try:
+        response = await location_client.get(f'http://ip-api.com/json/{ip}?lang=zh-CN')
+        if response.status_code == 200:
+            return response.json()
+    except Exception as e:
+        log.error(f'在线获取 IP 地址属地失败，错误信息：{e}')
+        return None
 
 
 # 离线 IP 搜索器单例（数据将缓存到内存，缓存大小取决于 IP 数据文件大小）
@@ -73,19 +91,22 @@ def get_location_offline(ip: str) -> dict | None:
         return None
 
 
-async def parse_ip_info(request: Request) -> IpInfo:
+async def _lookup_ip_location(ip: str) -> tuple[str | None, str | None, str | None]:
     """
-    解析请求的 IP 信息
+    查询 IP 属地，优先读取 Redis 缓存；Redis 不可用时直接查询，查询失败时返回未知属地
 
-    :param request: FastAPI 请求对象
-    :return:
+    :param ip: IP 地址
+    :return: (国家, 地区, 城市)
     """
-    country, region, city = None, None, None
-    ip = get_request_ip(request)
-    location = await redis_client.get(f'{settings.IP_LOCATION_REDIS_PREFIX}:{ip}')
+    try:
+        location = await redis_client.get(f'{settings.IP_LOCATION_REDIS_PREFIX}:{ip}')
+    except RedisError as e:
+        log.warning(f'读取 IP 属地缓存失败，错误信息：{e}')
+        location = None
     if location:
         country, region, city = location.split('|')
-        return IpInfo(ip=ip, country=country, region=region, city=city)
+        __ip_location_cache[ip] = (country, region, city)
+        return country, region, city
 
     location_info = None
     if settings.IP_LOCATION_PARSE == 'online':
@@ -93,30 +114,65 @@ async def parse_ip_info(request: Request) -> IpInfo:
     elif settings.IP_LOCATION_PARSE == 'offline':
         location_info = get_location_offline(ip)
 
-    if location_info:
-        country = location_info.get('country')
-        region = location_info.get('regionName')
-        city = location_info.get('city')
+    if not location_info:
+        return None, None, None
+
+    country = location_info.get('country')
+    region = location_info.get('regionName')
+    city = location_info.get('city')
+    try:
         await redis_client.set(
             f'{settings.IP_LOCATION_REDIS_PREFIX}:{ip}',
             f'{country}|{region}|{city}',
             ex=settings.IP_LOCATION_EXPIRE_SECONDS,
         )
+    except RedisError as e:
+        log.warning(f'写入 IP 属地缓存失败，错误信息：{e}')
+    __ip_location_cache[ip] = (country, region, city)
+    return country, region, city
+
+
+async def get_ip_info(ip: str) -> IpInfo:
+    """
+    获取 IP 信息，依次读取本地缓存、Redis 缓存，均未命中时查询属地
+
+    :param ip: IP 地址
+    :return:
+    """
+    if settings.IP_LOCATION_PARSE == 'false':
+        return IpInfo(ip=ip, country=None, region=None, city=None)
+
+    location = __ip_location_cache.get(ip)
+    if location is None:
+        flight = __ip_location_flights.get(ip)
+        if flight is None:
+            flight = asyncio.ensure_future(_lookup_ip_location(ip))
+            __ip_location_flights[ip] = flight
+            flight.add_done_callback(lambda _: __ip_location_flights.pop(ip, None))
+        location = await asyncio.shield(flight)
+
+    country, region, city = location
     return IpInfo(ip=ip, country=country, region=region, city=city)
 
 
-def parse_user_agent_info(request: Request) -> UserAgentInfo:
+def parse_user_agent_info(user_agent: str | None) -> UserAgentInfo:
     """
-    解析请求的用户代理信息
+    解析用户代理信息
 
-    :param request: FastAPI 请求对象
+    :param user_agent: 用户代理
     :return:
     """
-    os, browser, device = None, None, None
-    user_agent = request.headers.get('User-Agent')
-    if user_agent:
+    if not user_agent:
+        return UserAgentInfo(user_agent=user_agent, device=None, os=None, browser=None)
+
+    info = __user_agent_cache.get(user_agent)
+    if info is None:
         user_agent_ = parse(user_agent)
-        os = user_agent_.get_os()
-        browser = user_agent_.get_browser()
-        device = user_agent_.get_device()
-    return UserAgentInfo(user_agent=user_agent, device=device, os=os, browser=browser)
+        info = UserAgentInfo(
+            user_agent=user_agent,
+            device=user_agent_.get_device(),
+            os=user_agent_.get_os(),
+            browser=user_agent_.get_browser(),
+        )
+        __user_agent_cache[user_agent] = info
+    return info